@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def _url(base_url: str, url: str) -> str:
+    return url if url.startswith(("http://", "https://")) else base_url.rstrip("/") + "/" + url.lstrip("/")
+
+
+# ---------------- Sync Client ----------------
+class BackendClient:
+    """
+    Pooled HTTP client for one speech backend (ElevenLabs, Deepgram or a local mock).
+    - keep-alive connection pool shared by all threads
+    - (connect, read) timeouts on every request
+    - retry with exponential backoff on 429/5xx and connection errors (honours Retry-After)
+    - at most `max_concurrency` requests in flight; map() fans out a batch in parallel
+    """
+    def __init__(self, base_url: str, headers: Optional[Dict[str, str]] = None,
+                 timeout: Tuple[float, float] = (3.05, 60.0), max_retries: int = 3,
+                 backoff_factor: float = 0.5, pool_size: int = 10, max_concurrency: int = 4):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=frozenset({"GET", "POST"}),  # both backends are safe to resend
+            respect_retry_after_header=True,
+            raise_on_status=False,  # hand back the last response so callers report the real error
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """POST to an absolute url or a path under base_url."""
+        kwargs.setdefault("timeout", self.timeout)
+        with self._slots:
+            return self.session.post(_url(self.base_url, url), **kwargs)
+
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """Run fn over items with up to max_concurrency in parallel; results keep input order."""
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as pool:
+            return list(pool.map(fn, items))
+
+    def close(self):
+        self.session.close()
+
+
+# ---------------- Async Client ----------------
+class AsyncBackendClient:
+    """
+    asyncio counterpart of BackendClient on httpx (imported on first use).
+    Same pooling, timeouts, retry/backoff and concurrency bound; gather() is the batch API.
+    """
+    def __init__(self, base_url: str, headers: Optional[Dict[str, str]] = None,
+                 timeout: Tuple[float, float] = (3.05, 60.0), max_retries: int = 3,
+                 backoff_factor: float = 0.5, pool_size: int = 10, max_concurrency: int = 4):
+        import httpx
+
+        self._httpx = httpx
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            headers=headers or {},
+            timeout=httpx.Timeout(timeout[1], connect=timeout[0]),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def _delay(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff_factor * (2 ** attempt)
+
+    async def post(self, url: str, **kwargs):
+        url = _url(self.base_url, url)
+        async with self._slots:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self.client.post(url, **kwargs)
+                except self._httpx.TransportError:
+                    if attempt == self.max_retries:
+                        raise
+                    await asyncio.sleep(self._delay(attempt))
+                    continue
+                if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    return response
+                await asyncio.sleep(self._delay(attempt, response))
+
+    async def gather(self, fn, items: Iterable[T]) -> list:
+        """Await fn(item) for every item concurrently (bounded by the semaphore in post)."""
+        return await asyncio.gather(*(fn(item) for item in items))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self) -> "AsyncBackendClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+def loop_client(clients: "weakref.WeakKeyDictionary", factory: Callable[[], AsyncBackendClient]) -> AsyncBackendClient:
+    """
+    The client in `clients` for the running event loop, created on first use.
+    httpx pools and asyncio semaphores belong to the loop that created them, so a
+    single module-level client breaks once a second loop (asyncio.run again) uses it.
+    """
+    loop = asyncio.get_running_loop()
+    client = clients.get(loop)
+    if client is None:
+        client = clients[loop] = factory()
+    return client
@@ -0,0 +1,246 @@
+import argparse
+import json
+import math
+import os
+import platform
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import List, Optional
+
+from STT import transcribe_audio
+from Backend_Client import BackendClient
+from Mock_Server import start_mock_server
+from TTS_Cache import TTSAudioCache
+from TTS import generate_tts, synthesize_many, synthesize_speech
+from Main_UI import evaluate_answer, stream_evaluation
+from Pipeline import TurnPipeline
+
+SAMPLE_ANSWER = (
+    "In my last role I led the migration of our reporting service to a streaming pipeline. "
+    "I started by measuring where the latency came from, then split the work into small releases. "
+    "The biggest challenge was keeping the old and new systems consistent during the switch. "
+    "In the end we cut report delays from hours to minutes and the team owned the new system."
+)
+
+
+# ---------------- Helpers ----------------
+def percentile_ms(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile in milliseconds (no numpy needed)."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return round(ordered[index] * 1000, 2)
+
+
+# ---------------- Offline Stand-Ins ----------------
+class FakeDeepgramClient:
+    """Deepgram /v1/listen stand-in for transcribe_audio(client=...): `latency_s + audio_seconds * realtime_factor`."""
+    def __init__(self, transcript: str = SAMPLE_ANSWER, latency_s: float = 0.3, realtime_factor: float = 0.05,
+                 bytes_per_second: int = 16000):
+        self.transcript = transcript
+        self.latency_s = latency_s
+        self.realtime_factor = realtime_factor
+        self.bytes_per_second = bytes_per_second
+
+    def post(self, url, data=b"", **kwargs):
+        time.sleep(self.latency_s + len(data) / self.bytes_per_second * self.realtime_factor)
+        payload = {"results": {"channels": [{"alternatives": [{"transcript": self.transcript}]}]}}
+        return SimpleNamespace(status_code=200, json=lambda: payload, text="")
+
+    def map(self, fn, items):
+        return [fn(item) for item in items]
+
+
+class FakeChatModel:
+    """Gemini stand-in: a fixed reply, first token after `first_token_s`, then one word every `per_token_s`."""
+    def __init__(self, first_token_s: float = 0.5, per_token_s: float = 0.02, reply: Optional[str] = None):
+        self.first_token_s = first_token_s
+        self.per_token_s = per_token_s
+        words = (reply or ("Clarity: good. Structure: clear situation, action and result. "
+                           "Correctness: sound. Confidence: steady. Tone: professional. "
+                           "Next time quantify the impact earlier and close with what you learned.")).split()
+        self.tokens = [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def __call__(self, messages, **kwargs):
+        time.sleep(self.first_token_s + self.per_token_s * max(len(self.tokens) - 1, 0))
+        return SimpleNamespace(content="".join(self.tokens))
+
+    invoke = __call__
+
+    def stream(self, messages, **kwargs):
+        time.sleep(self.first_token_s)
+        for i, token in enumerate(self.tokens):
+            if i:
+                time.sleep(self.per_token_s)
+            yield SimpleNamespace(content=token)
+
+
+class FakeTTSHttp:
+    """ElevenLabs stand-in for synthesize_speech(http=...): `latency_s + chars * per_char_s`, ~1 KB of audio per 10 chars."""
+    def __init__(self, latency_s: float = 0.4, per_char_s: float = 0.002):
+        self.latency_s = latency_s
+        self.per_char_s = per_char_s
+
+    def post(self, url, headers=None, json=None, **kwargs):
+        text = (json or {}).get("text", "")
+        time.sleep(self.latency_s + len(text) * self.per_char_s)
+        return SimpleNamespace(status_code=200, content=b"\xff\xfb" * (len(text) * 50), text="")
+
+    def map(self, fn, items):
+        return [fn(item) for item in items]
+
+
+# ---------------- Turn Latency ----------------
+def benchmark_turns(n_turns: int = 20, audio_seconds: float = 30.0, stt=None, llm=None, tts_http=None,
+                    workdir: Optional[str] = None) -> dict:
+    """Sequential coach turns: transcribe_audio -> evaluate_answer -> generate_tts, per-stage percentiles."""
+    stt = stt or FakeDeepgramClient()
+    llm = llm or FakeChatModel()
+    tts_http = tts_http or FakeTTSHttp()
+    workdir = workdir or tempfile.mkdtemp(prefix="coach_bench_")
+    audio = b"\x00" * int(audio_seconds * 16000)
+
+    stages = {"stt": [], "llm": [], "tts": [], "turn": []}
+    for i in range(n_turns):
+        turn_start = time.perf_counter()
+        transcript = transcribe_audio(audio, client=stt)
+        stt_done = time.perf_counter()
+        feedback = evaluate_answer(transcript, llm=llm)
+        llm_done = time.perf_counter()
+        generate_tts(feedback, filename=os.path.join(workdir, f"turn_{i}.mp3"), http=tts_http, cache=False)
+        tts_done = time.perf_counter()
+
+        stages["stt"].append(stt_done - turn_start)
+        stages["llm"].append(llm_done - stt_done)
+        stages["tts"].append(tts_done - llm_done)
+        stages["turn"].append(tts_done - turn_start)
+
+    row = {"turns": n_turns, "audio_seconds": audio_seconds}
+    for name, samples in stages.items():
+        for q in (50, 95, 99):
+            row[f"{name}_p{q}_ms"] = percentile_ms(samples, q)
+    print(row)
+    return row
+
+
+def benchmark_pipelined_turns(n_turns: int = 20, audio_seconds: float = 30.0, stt=None, llm=None, tts_http=None,
+                              max_tts_workers: int = 3) -> dict:
+    """Same turn through TurnPipeline: time to first audio vs. time until the last chunk is ready."""
+    stt = stt or FakeDeepgramClient()
+    llm = llm or FakeChatModel()
+    tts_http = tts_http or FakeTTSHttp()
+    audio = b"\x00" * int(audio_seconds * 16000)
+    pipeline = TurnPipeline(
+        transcribe=lambda audio_bytes: transcribe_audio(audio_bytes, client=stt),
+        evaluate_stream=lambda transcript: stream_evaluation(transcript, llm=llm),
+        synthesize=lambda text: synthesize_speech(text, http=tts_http, cache=False),
+        max_tts_workers=max_tts_workers,
+    )
+
+    stages = {"first_audio": [], "turn": []}
+    for _ in range(n_turns):
+        for _chunk in pipeline.run(audio):
+            pass
+        stages["first_audio"].append(pipeline.metrics["first_audio_s"])
+        stages["turn"].append(pipeline.metrics["total_s"])
+
+    row = {"turns": n_turns, "audio_seconds": audio_seconds, "max_tts_workers": max_tts_workers,
+           "chunks_per_turn": pipeline.metrics["chunks"]}
+    for name, samples in stages.items():
+        for q in (50, 95, 99):
+            row[f"{name}_p{q}_ms"] = percentile_ms(samples, q)
+    print(row)
+    return row
+
+
+# ---------------- Batch Fan-Out ----------------
+def benchmark_batch_synthesis(n_items: int = 16, tts_http=None) -> dict:
+    """Wall time of n sentences synthesized one by one vs. through synthesize_many."""
+    tts_http = tts_http or FakeTTSHttp()
+    texts = [f"Sentence {i}: keep answers structured and close with the result." for i in range(n_items)]
+
+    start = time.perf_counter()
+    for text in texts:
+        synthesize_speech(text, http=tts_http, cache=False)
+    sequential_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    synthesize_many(texts, http=tts_http, cache=False)
+    batch_s = time.perf_counter() - start
+
+    row = {"items": n_items, "sequential_ms": round(sequential_s * 1000, 2), "batch_ms": round(batch_s * 1000, 2),
+           "max_concurrency": getattr(tts_http, "max_concurrency", 1)}
+    print(row)
+    return row
+
+
+# ---------------- TTS Cache ----------------
+def benchmark_tts_cache(n_requests: int = 100, repeat_share: float = 0.5, tts_http=None) -> dict:
+    """
+    Mixed workload: `repeat_share` of requests are stock phrases (greetings, rubric lines),
+    the rest unique feedback. Reports hit rate and latency with a fresh on-disk cache.
+    """
+    tts_http = tts_http or FakeTTSHttp()
+    stock = ["Great, let's get started.", "Clarity: good.", "Structure: clear situation, action and result.",
+             "Tone: professional.", "Thanks for your answer."]
+    cache = TTSAudioCache(tempfile.mkdtemp(prefix="tts_cache_bench_"))
+    latencies = []
+    for i in range(n_requests):
+        text = stock[i % len(stock)] if (i % 100) < repeat_share * 100 else f"Unique feedback number {i}."
+        start = time.perf_counter()
+        synthesize_speech(text, http=tts_http, cache=cache)
+        latencies.append(time.perf_counter() - start)
+
+    row = {"requests": n_requests, "repeat_share": repeat_share, **cache.stats(),
+           "p50_ms": percentile_ms(latencies, 50), "p95_ms": percentile_ms(latencies, 95)}
+    print(row)
+    return row
+
+
+def write_results(results: dict, path: str) -> str:
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        **results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interview coach turn-latency benchmark (offline, no API keys).")
+    parser.add_argument("--output", default="coach_benchmark_results.json")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--audio-seconds", type=float, default=30.0)
+    parser.add_argument("--stt-latency", type=float, default=0.3)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake LLM time to first token (s)")
+    parser.add_argument("--tts-latency", type=float, default=0.4)
+    parser.add_argument("--mock-server", action="store_true",
+                        help="go through BackendClient and a local HTTP mock instead of in-process fakes")
+    parser.add_argument("--fail-every", type=int, default=0, help="mock server: every Nth request returns 429")
+    args = parser.parse_args()
+
+    server = None
+    if args.mock_server:
+        server, base_url = start_mock_server(tts_latency_s=args.tts_latency, stt_latency_s=args.stt_latency,
+                                             fail_every=args.fail_every, transcript=SAMPLE_ANSWER)
+        stt_client = BackendClient(base_url, backoff_factor=0.05)
+        tts_client = BackendClient(base_url, backoff_factor=0.05)
+    else:
+        stt_client = FakeDeepgramClient(latency_s=args.stt_latency)
+        tts_client = FakeTTSHttp(latency_s=args.tts_latency)
+
+    backends = dict(stt=stt_client, llm=FakeChatModel(first_token_s=args.llm_latency), tts_http=tts_client)
+    turns = benchmark_turns(n_turns=args.turns, audio_seconds=args.audio_seconds, **backends)
+    pipelined = benchmark_pipelined_turns(n_turns=args.turns, audio_seconds=args.audio_seconds, **backends)
+    batch = benchmark_batch_synthesis(tts_http=tts_client)
+    tts_cache = benchmark_tts_cache(tts_http=tts_client)
+    if server is not None:
+        server.shutdown()
+    write_results({"config": vars(args), "turn": turns, "pipelined_turn": pipelined, "batch_tts": batch,
+                   "tts_cache": tts_cache}, args.output)
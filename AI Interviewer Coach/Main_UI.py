@@ -1,17 +1,14 @@
-import os
+import base64
+import hashlib
 import streamlit as st
+import streamlit.components.v1 as components
 from streamlit_mic_recorder import mic_recorder
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import ChatPromptTemplate
-from STT import transcribe_audio
-from TTS import generate_tts
-
-# Load env vars
-load_dotenv("myenv/.env")
-
-# Initialize LLM
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+from STT import get_client as get_stt_client, transcribe_audio
+from TTS import get_cache, get_client as get_tts_client, synthesize_speech
+from Pipeline import TurnPipeline
 
 # Prompt for evaluation
 prompt_template = """
@@ -28,16 +25,131 @@ Answer in a friendly and professional tone.
 Candidate's answer:
 {answer}
 """
-prompt = ChatPromptTemplate.from_template(prompt_template)
 
-def evaluate_answer(transcript: str) -> str:
-    """Use Gemini to evaluate the transcribed answer."""
+# ---------- Cached Resources (built once per server process, not on every rerun) ----------
+@st.cache_resource
+def get_llm():
+    """Shared Gemini model."""
+    load_dotenv("myenv/.env")
+    return ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+
+@st.cache_resource
+def get_prompt():
+    return ChatPromptTemplate.from_template(prompt_template)
+
+@st.cache_resource
+def get_backends():
+    """Pooled Deepgram / ElevenLabs clients and the TTS audio cache."""
+    return get_stt_client(), get_tts_client(), get_cache()
+
+def evaluate_answer(transcript: str, llm=None) -> str:
+    """Use Gemini (or the given chat model) to evaluate the transcribed answer."""
     if not transcript.strip():
         return "No answer provided."
-    messages = prompt.format_messages(answer=transcript)
-    response = llm(messages)
+    messages = get_prompt().format_messages(answer=transcript)
+    response = (llm or get_llm())(messages)
     return response.content.strip()
 
+def stream_evaluation(transcript: str, llm=None):
+    """Yield Gemini's evaluation text as it is generated."""
+    if not transcript.strip():
+        yield "No answer provided."
+        return
+    messages = get_prompt().format_messages(answer=transcript)
+    for chunk in (llm or get_llm()).stream(messages):
+        content = chunk.content
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+        yield content
+
+def audio_key(audio_bytes: bytes) -> str:
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+# Plays clips back to back in the page itself. The player is created with the parent
+# window's Function so it outlives the (re-rendered) component iframe that queued it.
+AUDIO_QUEUE_JS = """
+<script>
+const page = window.parent;
+if (!page.__coachAudioQueue) {
+  page.__coachAudioQueue = new page.Function(`
+    const queue = [];
+    let playing = false;
+    function next() {
+      if (playing || !queue.length) return;
+      playing = true;
+      const audio = new Audio(queue.shift());
+      audio.onended = audio.onerror = () => { playing = false; next(); };
+      audio.play().catch(() => { playing = false; queue.length = 0; });
+    }
+    return (src) => { queue.push(src); next(); };
+  `)();
+}
+page.__coachAudioQueue("data:audio/mp3;base64,%s");
+</script>
+"""
+
+def queue_audio(audio_bytes: bytes):
+    """Autoplay a clip after the ones already queued, so sentences never talk over each other."""
+    components.html(AUDIO_QUEUE_JS % base64.b64encode(audio_bytes).decode("ascii"), height=0)
+
+def run_pipelined_turn(audio_bytes: bytes) -> dict:
+    """Step 2 + 3 overlapped: feedback text and audio appear sentence by sentence."""
+    stt_client, tts_client, cache = get_backends()
+    pipeline = TurnPipeline(
+        transcribe=lambda data: transcribe_audio(data, client=stt_client),
+        evaluate_stream=stream_evaluation,
+        synthesize=lambda text: synthesize_speech(text, http=tts_client, cache=cache or False),
+    )
+    st.info("⏳ Transcribing and evaluating your answer...")
+    feedback_box = st.empty()
+    shown, clips = [], []
+    for chunk in pipeline.run(audio_bytes):
+        if chunk.index == 0:
+            st.text_area("Your Transcript", pipeline.transcript, height=200)
+            st.subheader("🔊 Spoken feedback")
+        shown.append(chunk.text)
+        feedback_box.markdown("\n\n".join(shown))
+        if chunk.audio is not None:
+            clips.append(chunk.audio)
+            st.audio(chunk.audio, format="audio/mp3")  # kept for replay
+            queue_audio(chunk.audio)
+    if pipeline.metrics["tts_failures"]:
+        st.error(f"TTS Error: {pipeline.metrics['tts_failures']} sentence(s) could not be spoken")
+    st.success(f"✅ Feedback complete (first audio after {pipeline.metrics.get('first_audio_s', 0):.1f}s)")
+    return {"transcript": pipeline.transcript, "feedback": pipeline.feedback, "audio": clips}
+
+def run_sequential_turn(audio_bytes: bytes) -> dict:
+    """Transcribe, then evaluate, then speak the whole feedback."""
+    stt_client, tts_client, cache = get_backends()
+    st.info("⏳ Transcribing your answer...")
+    transcript = transcribe_audio(audio_bytes, client=stt_client)
+    st.success("✅ Transcription complete")
+    st.text_area("Your Transcript", transcript, height=200)
+
+    # Step 2 — Evaluate with LLM
+    st.info("🤖 Evaluating your answer...")
+    feedback = evaluate_answer(transcript)
+    st.success("✅ Evaluation complete")
+    st.text_area("AI Feedback", feedback, height=200)
+
+    # Step 3 — Speak feedback (TTS)
+    st.info("🔊 Generating spoken feedback...")
+    clips = []
+    try:
+        # Bytes straight to the player: no shared output file between sessions
+        clips.append(synthesize_speech(feedback, http=tts_client, cache=cache or False))
+        st.audio(clips[0], format="audio/mp3")
+    except Exception as e:
+        st.error(f"TTS Error: {e}")
+    return {"transcript": transcript, "feedback": feedback, "audio": clips}
+
+def render_turn(turn: dict):
+    """Show an already processed recording again (reruns make no API calls)."""
+    st.text_area("Your Transcript", turn["transcript"], height=200)
+    st.text_area("AI Feedback", turn["feedback"], height=200)
+    for clip in turn["audio"]:
+        st.audio(clip, format="audio/mp3")
+
 # ---------- Streamlit UI ----------
 def main():
     st.title("🎯 AI Interview Coach")
@@ -51,33 +163,30 @@ def main():
         key="recorder"
     )
 
-    transcript = ""
-    feedback = ""
+    pipelined = st.sidebar.checkbox("Stream spoken feedback sentence by sentence", value=True)
+    _, _, cache = get_backends()
+    if cache is not None:
+        stats = cache.stats()
+        st.sidebar.caption(f"TTS cache: {stats['entries']} clips, hit rate {stats['hit_rate']:.0%}")
 
     if audio and audio.get("bytes"):
-        st.info("⏳ Transcribing your answer...")
-        transcript = transcribe_audio(audio["bytes"])
-        st.success("✅ Transcription complete")
-        st.text_area("Your Transcript", transcript, height=200)
-
-        # Step 2 — Evaluate with LLM
-        st.info("🤖 Evaluating your answer...")
-        feedback = evaluate_answer(transcript)
-        st.success("✅ Evaluation complete")
-        st.text_area("AI Feedback", feedback, height=200)
-
-        # Step 3 — Speak feedback (TTS)
-        st.info("🔊 Generating spoken feedback...")
-        try:
-            audio_file = generate_tts(feedback)
-            st.audio(audio_file, format="audio/mp3")
-        except Exception as e:
-            st.error(f"TTS Error: {e}")
-
-        # Optional session history
-        if "history" not in st.session_state:
-            st.session_state.history = []
-        st.session_state.history.append({"answer": transcript, "feedback": feedback})
+        # The recorder keeps returning the last recording on every rerun; process each one once
+        key = audio_key(audio["bytes"])
+        last_turn = st.session_state.get("last_turn")
+        if last_turn and last_turn["key"] == key:
+            render_turn(last_turn)
+        else:
+            try:
+                turn = run_pipelined_turn(audio["bytes"]) if pipelined else run_sequential_turn(audio["bytes"])
+            except Exception as e:
+                st.error(f"Feedback Error: {e}")
+            else:
+                st.session_state.last_turn = {"key": key, **turn}
+
+                # Optional session history
+                if "history" not in st.session_state:
+                    st.session_state.history = []
+                st.session_state.history.append({"answer": turn["transcript"], "feedback": turn["feedback"]})
 
     # Display session history
     if "history" in st.session_state and st.session_state.history:
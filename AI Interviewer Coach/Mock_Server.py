@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+# ---------------- Local Stand-In for ElevenLabs + Deepgram ----------------
+# Point the clients at it with ELEVENLABS_BASE_URL / DEEPGRAM_BASE_URL (or BackendClient(base_url=...)).
+
+
+class MockBackendHandler(BaseHTTPRequestHandler):
+    """
+    POST /v1/text-to-speech/<voice>  -> fake MP3 bytes (size grows with the text)
+    POST /v1/listen                  -> Deepgram-shaped JSON transcript
+    Every `fail_every`-th request answers 429 with Retry-After: 0 to exercise retries.
+    """
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection pooling is visible
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.requests += 1
+            count = server.requests
+        if server.fail_every and count % server.fail_every == 0:
+            self._send(429, b'{"detail": "rate limited"}', "application/json", {"Retry-After": "0"})
+            return
+
+        if self.path.startswith("/v1/text-to-speech/"):
+            text = json.loads(body or b"{}").get("text", "")
+            time.sleep(server.tts_latency_s + len(text) * server.tts_per_char_s)
+            self._send(200, b"\xff\xfb" * (len(text) * 50), "audio/mpeg")
+        elif self.path.startswith("/v1/listen"):
+            time.sleep(server.stt_latency_s)
+            payload = {"results": {"channels": [{"alternatives": [{"transcript": server.transcript}]}]}}
+            self._send(200, json.dumps(payload).encode("utf-8"), "application/json")
+        else:
+            self._send(404, b'{"detail": "not found"}', "application/json")
+
+
+def start_mock_server(port: int = 0, tts_latency_s: float = 0.4, tts_per_char_s: float = 0.002,
+                      stt_latency_s: float = 0.3, fail_every: int = 0,
+                      transcript: str = "This is a mock transcript of the candidate's answer.") -> Tuple[ThreadingHTTPServer, str]:
+    """Serve on a background thread; returns (server, base_url). Call server.shutdown() when done."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockBackendHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.tts_latency_s = tts_latency_s
+    server.tts_per_char_s = tts_per_char_s
+    server.stt_latency_s = stt_latency_s
+    server.fail_every = fail_every
+    server.transcript = transcript
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv("MOCK_PORT", "8765"))
+    server, base_url = start_mock_server(port)
+    print(f"Mock ElevenLabs/Deepgram at {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
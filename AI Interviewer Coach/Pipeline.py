@@ -0,0 +1,127 @@
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+
+# A sentence ends at . ! ? (plus closing quotes/brackets) followed by whitespace, or at a line break
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(?=\s)|\n")
+MARKDOWN = re.compile(r"[*_#`>]+")
+
+
+class AudioChunk(NamedTuple):
+    index: int
+    text: str
+    audio: Optional[bytes]  # None when TTS failed for this sentence: show the text only
+    ready_s: float  # seconds from turn start until this chunk could be played
+
+
+# ---------------- Sentence Splitting ----------------
+def iter_sentences(tokens: Iterable[str], min_chars: int = 20) -> Iterator[str]:
+    """
+    Re-cut a token stream at sentence boundaries.
+    Pieces shorter than `min_chars` are merged with the next sentence so TTS
+    is not called for fragments like "Clarity:" or list numbers.
+    """
+    buffer = ""
+    for token in tokens:
+        buffer += token
+        start = 0
+        for match in SENTENCE_END.finditer(buffer):
+            if len(buffer[start:match.end()].strip()) < min_chars:
+                continue
+            sentence = buffer[start:match.end()].strip()
+            start = match.end()
+            yield sentence
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def speakable(text: str) -> str:
+    """Drop markdown markup the LLM adds so it is not read out."""
+    return " ".join(MARKDOWN.sub("", text).split())
+
+
+# ---------------- Pipelined Turn ----------------
+class TurnPipeline:
+    """
+    STT -> streaming LLM -> per-sentence TTS for one coach turn.
+    Each finished sentence goes to TTS straight away (up to `max_tts_workers` at once)
+    while the LLM keeps generating; audio chunks are handed out in sentence order
+    as soon as the next one is ready, so time-to-first-audio is about one sentence.
+    """
+    def __init__(self, transcribe: Callable[[bytes], str], evaluate_stream: Callable[[str], Iterable[str]],
+                 synthesize: Callable[[str], bytes], max_tts_workers: int = 3, min_sentence_chars: int = 20):
+        self.transcribe = transcribe
+        self.evaluate_stream = evaluate_stream
+        self.synthesize = synthesize
+        self.max_tts_workers = max_tts_workers
+        self.min_sentence_chars = min_sentence_chars
+        self.transcript = ""
+        self.feedback = ""
+        self.metrics: dict = {}
+
+    def run(self, audio_bytes: bytes, transcript: Optional[str] = None) -> Iterator[AudioChunk]:
+        """
+        Yield AudioChunks in order; `transcript` skips STT when it is already known.
+        A sentence whose TTS call fails is still yielded (audio None) so the feedback text is never lost.
+        """
+        start = time.perf_counter()
+        self.transcript = transcript if transcript is not None else self.transcribe(audio_bytes)
+        self.metrics = {"stt_s": time.perf_counter() - start, "tts_failures": 0}
+        self.feedback = ""
+
+        sentences: "queue.Queue" = queue.Queue()
+        parts = []
+
+        def produce(pool: ThreadPoolExecutor):
+            # LLM tokens -> sentences -> TTS futures, on its own thread so audio is never held up by the LLM
+            try:
+                for sentence in iter_sentences(self._tokens(parts, start), self.min_sentence_chars):
+                    text = speakable(sentence)
+                    if text:
+                        sentences.put((sentence, pool.submit(self.synthesize, text)))
+            except BaseException as e:
+                sentences.put(e)
+            finally:
+                sentences.put(None)
+
+        index = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_tts_workers) as pool:
+                producer = threading.Thread(target=produce, args=(pool,), daemon=True)
+                producer.start()
+                while True:
+                    item = sentences.get()
+                    if item is None:
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+                    sentence, future = item
+                    try:
+                        audio = future.result()
+                    except Exception as e:
+                        print(f"⚠️ TTS failed for sentence {index}, showing text only: {e}")
+                        self.metrics["tts_failures"] += 1
+                        audio = None
+                    ready = time.perf_counter() - start
+                    if index == 0:
+                        self.metrics["first_audio_s"] = ready
+                    yield AudioChunk(index, sentence, audio, ready)
+                    index += 1
+                producer.join()
+        finally:
+            # Whatever the LLM produced, even if the turn stopped early
+            self.feedback = "".join(parts).strip()
+            self.metrics["total_s"] = time.perf_counter() - start
+            self.metrics["chunks"] = index
+
+    def _tokens(self, parts: list, start: float) -> Iterator[str]:
+        for token in self.evaluate_stream(self.transcript):
+            if "first_token_s" not in self.metrics:
+                self.metrics["first_token_s"] = time.perf_counter() - start
+            parts.append(token)
+            yield token
+        self.metrics["llm_s"] = time.perf_counter() - start
@@ -1,28 +1,71 @@
 import os
+import weakref
+from typing import Iterable, List, Optional
 from dotenv import load_dotenv
-from deepgram import DeepgramClient
+from Backend_Client import AsyncBackendClient, BackendClient, loop_client
 
 # Load environment variables
 load_dotenv("myenv/.env")
 DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
+# Point at a local mock server for tests / benchmarks
+BASE_URL = os.getenv("DEEPGRAM_BASE_URL", "https://api.deepgram.com")
+LISTEN_PARAMS = {"model": "nova-2-general", "language": "en-US", "smart_format": "true"}
 
-# Initialize client
-dg_client = DeepgramClient(DEEPGRAM_API_KEY)
+# Shared pooled clients (Deepgram's REST API), created on first use
+_client = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncBackendClient
 
-def transcribe_audio(audio_bytes: bytes) -> str:
-    """Transcribe recorded audio using Deepgram."""
-    try:
-        response = dg_client.listen.rest.v("1").transcribe_file(
-            {"buffer": audio_bytes},
-            {"model": "nova-2-general", "language": "en-US", "smart_format": True}
-        )
-        transcript = response.results.channels[0].alternatives[0].transcript
-        transcript = transcript.strip() or "No transcript generated."
+def get_client() -> BackendClient:
+    global _client
+    if _client is None:
+        _client = BackendClient(BASE_URL, headers={"Authorization": f"Token {DEEPGRAM_API_KEY}"})
+    return _client
+
+def get_async_client() -> AsyncBackendClient:
+    """Pooled async client of the running event loop."""
+    return loop_client(_async_clients, lambda: AsyncBackendClient(
+        BASE_URL, headers={"Authorization": f"Token {DEEPGRAM_API_KEY}"}))
+
+def _transcript(response) -> str:
+    if response.status_code != 200:
+        raise Exception(f"{response.status_code} - {response.text}")
+    payload = response.json()
+    transcript = payload["results"]["channels"][0]["alternatives"][0]["transcript"]
+    return transcript.strip() or "No transcript generated."
 
-        # Save for reference
-        with open("transcript.txt", "w") as f:
+def _save(transcript: str, transcript_path: Optional[str]):
+    if transcript_path:
+        with open(transcript_path, "w") as f:
             f.write(transcript)
 
+def transcribe_audio(audio_bytes: bytes, client=None, transcript_path: Optional[str] = None) -> str:
+    """Transcribe recorded audio using Deepgram; optionally save the transcript to `transcript_path`."""
+    try:
+        response = (client or get_client()).post(
+            "/v1/listen", params=LISTEN_PARAMS, data=audio_bytes,
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        transcript = _transcript(response)
+        _save(transcript, transcript_path)
         return transcript
     except Exception as e:
         return f"Transcription error: {e}"
+
+def transcribe_many(audio_items: Iterable[bytes], client=None) -> List[str]:
+    """Transcribe a batch of recordings in parallel, in input order."""
+    client = client or get_client()
+    return client.map(lambda audio: transcribe_audio(audio, client=client), audio_items)
+
+async def atranscribe_audio(audio_bytes: bytes, client=None) -> str:
+    try:
+        response = await (client or get_async_client()).post(
+            "/v1/listen", params=LISTEN_PARAMS, content=audio_bytes,
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        return _transcript(response)
+    except Exception as e:
+        return f"Transcription error: {e}"
+
+async def atranscribe_many(audio_items: Iterable[bytes], client=None) -> List[str]:
+    client = client or get_async_client()
+    return await client.gather(lambda audio: atranscribe_audio(audio, client=client), audio_items)
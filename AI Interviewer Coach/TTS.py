@@ -1,36 +1,99 @@
 import os
-import requests
+import tempfile
+import weakref
+from typing import Iterable, List, Optional
 from dotenv import load_dotenv
+from Backend_Client import AsyncBackendClient, BackendClient, loop_client
+from TTS_Cache import TTSAudioCache
 
 # Load environment variables
 load_dotenv("myenv/.env")
 
 API_KEY = os.getenv("ELEVENLABS_API_KEY") or "your_api_key_here"
 VOICE_ID = "EXAVITQu4vr4xnSDxMaL"
+# Point at a local mock server for tests / benchmarks
+BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
+VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.5}
+# Audio cache location and size (TTS_CACHE_MAX_MB=0 turns it off)
+CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "200"))
 
-def generate_tts(text: str, filename="output.mp3") -> str:
-    """Convert text to speech using Eleven Labs API."""
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}"
+# Shared pooled clients and audio cache, created on first use
+_client = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncBackendClient
+_cache = None
 
-    headers = {
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-        "xi-api-key": API_KEY
-    }
+def get_client() -> BackendClient:
+    global _client
+    if _client is None:
+        _client = BackendClient(BASE_URL, headers={"xi-api-key": API_KEY})
+    return _client
 
-    data = {
-        "text": text,
-        "voice_settings": {
-            "stability": 0.5,
-            "similarity_boost": 0.5
-        }
-    }
+def get_async_client() -> AsyncBackendClient:
+    """Pooled async client of the running event loop."""
+    return loop_client(_async_clients, lambda: AsyncBackendClient(BASE_URL, headers={"xi-api-key": API_KEY}))
 
-    response = requests.post(url, headers=headers, json=data)
+def get_cache() -> Optional[TTSAudioCache]:
+    global _cache
+    if _cache is None and CACHE_MAX_MB > 0:
+        _cache = TTSAudioCache(CACHE_DIR, max_bytes=int(CACHE_MAX_MB * 1024 * 1024))
+    return _cache
+
+def _request(text: str):
+    headers = {"Accept": "audio/mpeg", "Content-Type": "application/json"}
+    data = {"text": text, "voice_settings": VOICE_SETTINGS}
+    return f"/v1/text-to-speech/{VOICE_ID}", headers, data
+
+def _synthesize(text: str, http=None) -> bytes:
+    url, headers, data = _request(text)
+    response = (http or get_client()).post(url, headers=headers, json=data)
 
     if response.status_code == 200:
-        with open(filename, "wb") as f:
-            f.write(response.content)
-        return filename
+        return response.content
     else:
         raise Exception(f"TTS Error: {response.status_code} - {response.text}")
+
+def synthesize_speech(text: str, http=None, cache=None) -> bytes:
+    """
+    Convert text to MP3 bytes using Eleven Labs API (`http` is a BackendClient or anything with its post()).
+    Repeated (text, voice, settings) come from the audio cache; cache=False bypasses it.
+    """
+    cache = get_cache() if cache is None else cache
+    if not cache:
+        return _synthesize(text, http)
+    key = cache.key_for(text, VOICE_ID, VOICE_SETTINGS)
+    return cache.get_or_synthesize(key, lambda: _synthesize(text, http))
+
+def synthesize_many(texts: Iterable[str], http=None, cache=None) -> List[bytes]:
+    """Synthesize a batch in parallel (bounded by the client's max_concurrency), in input order."""
+    client = http or get_client()
+    return client.map(lambda text: synthesize_speech(text, http=client, cache=cache), texts)
+
+async def _asynthesize(text: str, client=None) -> bytes:
+    url, headers, data = _request(text)
+    response = await (client or get_async_client()).post(url, headers=headers, json=data)
+    if response.status_code == 200:
+        return response.content
+    raise Exception(f"TTS Error: {response.status_code} - {response.text}")
+
+async def asynthesize_speech(text: str, client=None, cache=None) -> bytes:
+    """Async synthesize_speech: same audio cache (cache=False bypasses it)."""
+    cache = get_cache() if cache is None else cache
+    if not cache:
+        return await _asynthesize(text, client)
+    key = cache.key_for(text, VOICE_ID, VOICE_SETTINGS)
+    return await cache.aget_or_synthesize(key, lambda: _asynthesize(text, client))
+
+async def asynthesize_many(texts: Iterable[str], client=None, cache=None) -> List[bytes]:
+    client = client or get_async_client()
+    return await client.gather(lambda text: asynthesize_speech(text, client=client, cache=cache), texts)
+
+def generate_tts(text: str, filename: Optional[str] = None, http=None, cache=None) -> str:
+    """Convert text to speech and save it as an MP3 file (a fresh temp file per call unless `filename` is given)."""
+    audio = synthesize_speech(text, http=http, cache=cache)
+    if filename is None:
+        fd, filename = tempfile.mkstemp(prefix="tts_", suffix=".mp3")
+        os.close(fd)
+    with open(filename, "wb") as f:
+        f.write(audio)
+    return filename
@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+
+# ---------------- Content-Addressed TTS Cache ----------------
+class TTSAudioCache:
+    """
+    On-disk MP3 cache keyed by sha256(text, voice id, voice settings).
+    - LRU eviction once the directory exceeds `max_bytes` (recency survives restarts via mtime)
+    - writes are atomic (temp file + rename), so concurrent sessions never see partial audio
+    - concurrent misses for the same key make one backend call; the others wait for it
+    """
+    def __init__(self, cache_dir: str = "tts_cache", max_bytes: int = 200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # key -> size, oldest first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        files = [f for f in os.listdir(cache_dir) if f.endswith(".mp3")]
+        for name in sorted(files, key=lambda f: os.path.getmtime(os.path.join(cache_dir, f))):
+            self._entries[name[:-4]] = os.path.getsize(os.path.join(cache_dir, name))
+        self._bytes = sum(self._entries.values())
+
+    @staticmethod
+    def key_for(text: str, voice_id: str, settings: Optional[dict] = None) -> str:
+        payload = json.dumps({"text": text, "voice_id": voice_id, "settings": settings or {}}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                audio = f.read()
+            os.utime(self._path(key))
+            return audio
+        except OSError:
+            with self._lock:  # removed behind our back
+                self._bytes -= self._entries.pop(key, 0)
+            return None
+
+    def put(self, key: str, audio: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._bytes += len(audio) - self._entries.pop(key, 0)
+            self._entries[key] = len(audio)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def get_or_synthesize(self, key: str, synthesize: Callable[[], bytes]) -> bytes:
+        """Cached audio for `key`, calling `synthesize` at most once across concurrent callers."""
+        while True:
+            audio = self.get(key)
+            if audio is not None:
+                with self._lock:
+                    self.hits += 1
+                return audio
+            with self._lock:
+                event = self._inflight.get(key)
+                if event is None:
+                    self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            event.wait()  # another caller is synthesizing this key; re-check the cache
+
+        try:
+            audio = synthesize()
+            self.put(key, audio)
+            return audio
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    async def aget_or_synthesize(self, key: str, synthesize: Callable[[], Awaitable[bytes]]) -> bytes:
+        """get_or_synthesize for coroutines: disk I/O and waiting on another caller run off the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            audio = await loop.run_in_executor(None, self.get, key)
+            if audio is not None:
+                with self._lock:
+                    self.hits += 1
+                return audio
+            with self._lock:
+                event = self._inflight.get(key)
+                if event is None:
+                    self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            await loop.run_in_executor(None, event.wait)
+
+        try:
+            audio = await synthesize()
+            await loop.run_in_executor(None, self.put, key, audio)
+            return audio
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
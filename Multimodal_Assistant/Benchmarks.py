@@ -0,0 +1,689 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+# ---------------- Helpers ----------------
+def synthetic_texts(n: int, words_per_text: int = 60) -> List[str]:
+    """Deterministic filler chunks so runs are comparable."""
+    vocab = ["retrieval", "vector", "image", "context", "pipeline", "memory",
+             "chunk", "model", "query", "answer", "document", "embedding"]
+    return [
+        " ".join(vocab[(i + j) % len(vocab)] for j in range(words_per_text))
+        for i in range(n)
+    ]
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process (Linux /proc, falls back to peak RSS)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile_ms(samples: List[float], q: float) -> float:
+    return float(np.percentile(np.asarray(samples) * 1000, q))
+
+
+class RandomEmbeddings(Embeddings):
+    """Model-free stand-in: random unit vectors, so benchmarks measure the index only."""
+    def __init__(self, dim: int = 512, seed: int = 0):
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+
+    def embed_documents_array(self, texts) -> np.ndarray:
+        vectors = self.rng.standard_normal((len(texts), self.dim), dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def embed_documents(self, texts):
+        return self.embed_documents_array(texts).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents_array([text])[0].tolist()
+
+
+# ---------------- Embedding Throughput ----------------
+def benchmark_embedding_throughput(batch_sizes: Sequence[int] = (1, 8, 32, 64, 128),
+                                   n_docs: int = 512,
+                                   model_name: str = "openai/clip-vit-base-patch32") -> Dict[int, float]:
+    """Measure CLIP text embedding docs/sec on CPU for each batch size."""
+    from Store_And_Retrive import CLIPEmbeddings  # heavy import, keep it out of other benchmarks
+
+    embedder = CLIPEmbeddings(model_name=model_name, device="cpu")
+    texts = synthetic_texts(n_docs)
+
+    # Warm-up so the first measured batch size does not pay one-time costs
+    embedder.batch_size = max(batch_sizes)
+    embedder.embed_documents_array(texts[:embedder.batch_size])
+
+    results: Dict[int, float] = {}
+    for batch_size in batch_sizes:
+        embedder.batch_size = batch_size
+        start = time.perf_counter()
+        matrix = embedder.embed_documents_array(texts)
+        elapsed = time.perf_counter() - start
+        results[batch_size] = len(texts) / elapsed
+        print(f"batch_size={batch_size:>4} | {results[batch_size]:8.1f} docs/sec | shape={matrix.shape}")
+    return results
+
+
+def synthetic_images(n: int, seed: int = 0) -> list:
+    """Blocky RGB images with a little structure, for image-tower timings."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    images = []
+    for _ in range(n):
+        img = Image.new("RGB", (224, 224), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(6):
+            x, y = rng.randrange(200), rng.randrange(200)
+            draw.rectangle([x, y, x + rng.randrange(10, 80), y + rng.randrange(10, 80)],
+                           fill=tuple(rng.randrange(256) for _ in range(3)))
+        images.append(img)
+    return images
+
+
+def _cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def benchmark_clip_backends(backends: Sequence[str] = ("torch", "torch-int8", "onnx", "onnx-int8"),
+                            batch_sizes: Sequence[int] = (1, 8, 32), n_texts: int = 256, n_images: int = 64,
+                            threads: Optional[int] = None,
+                            model_name: str = "openai/clip-vit-base-patch32") -> List[dict]:
+    """
+    CPU latency/throughput of each CLIP backend, and how far its embeddings drift
+    from fp32 PyTorch (cosine per row) - check drift before switching an existing index.
+    """
+    from Clip_Backends import get_engine  # heavy import, keep it out of other benchmarks
+
+    texts = synthetic_texts(n_texts)
+    images = synthetic_images(n_images)
+    reference = get_engine("torch", model_name, "cpu", intra_op_threads=threads)
+    ref_text, ref_image = reference.text_features(texts), reference.image_features(images)
+
+    rows = []
+    for backend in backends:
+        try:
+            engine = get_engine(backend, model_name, "cpu", intra_op_threads=threads)
+        except ImportError as e:
+            print(f"⚠️ skipping {backend}: {e}")
+            continue
+        text_cos = _cosine_rows(engine.text_features(texts), ref_text)
+        image_cos = _cosine_rows(engine.image_features(images), ref_image)
+        row = {
+            "backend": backend,
+            "text_cos_mean": round(float(text_cos.mean()), 5),
+            "text_cos_min": round(float(text_cos.min()), 5),
+            "image_cos_mean": round(float(image_cos.mean()), 5),
+            "image_cos_min": round(float(image_cos.min()), 5),
+        }
+        for batch_size in batch_sizes:
+            for kind, items, embed in (("text", texts, engine.text_features), ("image", images, engine.image_features)):
+                latencies = []
+                start = time.perf_counter()
+                for lo in range(0, len(items), batch_size):
+                    t0 = time.perf_counter()
+                    embed(items[lo:lo + batch_size])
+                    latencies.append(time.perf_counter() - t0)
+                elapsed = time.perf_counter() - start
+                row[f"{kind}_b{batch_size}_p50_ms"] = round(percentile_ms(latencies, 50), 2)
+                row[f"{kind}_b{batch_size}_p99_ms"] = round(percentile_ms(latencies, 99), 2)
+                row[f"{kind}_b{batch_size}_docs_per_s"] = round(len(items) / elapsed, 1)
+        rows.append(row)
+        print(f"{backend:>10} | text cos {row['text_cos_mean']:.4f} (min {row['text_cos_min']:.4f}) | "
+              f"image cos {row['image_cos_mean']:.4f} (min {row['image_cos_min']:.4f}) | "
+              + " | ".join(f"b{b}: {row[f'text_b{b}_docs_per_s']:.0f} texts/s" for b in batch_sizes))
+    return rows
+
+
+# ---------------- Vector Backends ----------------
+def _vector_backend_worker(backend: str, n_vectors: int, dim: int, n_queries: int, k: int,
+                           workdir: str, results) -> None:
+    """Runs in a fresh process so RSS reflects one backend only."""
+    embedder = RandomEmbeddings(dim=dim)
+    types = ["text", "pdf", "ocr", "image"]
+    batch = 5000  # below Chroma's max batch size
+    rss_before = current_rss_mb()
+
+    start = time.perf_counter()
+    if backend == "mmap":
+        from Vector_Index import MmapVectorStore
+        store = MmapVectorStore(persist_directory=workdir, embedding_function=embedder)
+        for lo in range(0, n_vectors, batch):
+            hi = min(lo + batch, n_vectors)
+            docs = [Document(page_content=f"doc-{i}", metadata={"type": types[i % 4]}) for i in range(lo, hi)]
+            store.add_embeddings(embedder.embed_documents_array(docs), docs)
+    else:
+        from langchain_chroma import Chroma
+        store = Chroma(persist_directory=workdir, embedding_function=embedder)
+        for lo in range(0, n_vectors, batch):
+            hi = min(lo + batch, n_vectors)
+            store.add_texts([f"doc-{i}" for i in range(lo, hi)],
+                            metadatas=[{"type": types[i % 4]} for i in range(lo, hi)])
+    build_s = time.perf_counter() - start
+
+    queries = embedder.embed_documents_array(range(n_queries))
+    latencies, filtered = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        store.similarity_search_by_vector(q.tolist(), k=k)
+        latencies.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        store.similarity_search_by_vector(q.tolist(), k=k, filter={"type": "image"})
+        filtered.append(time.perf_counter() - t0)
+
+    results.put({
+        "backend": backend,
+        "n_vectors": n_vectors,
+        "build_s": round(build_s, 2),
+        "p50_ms": round(percentile_ms(latencies, 50), 2),
+        "p99_ms": round(percentile_ms(latencies, 99), 2),
+        "p50_filtered_ms": round(percentile_ms(filtered, 50), 2),
+        "rss_delta_mb": round(current_rss_mb() - rss_before, 1),
+    })
+
+
+def benchmark_vector_backends(sizes: Sequence[int] = (100_000, 1_000_000),
+                              backends: Sequence[str] = ("mmap", "chroma"),
+                              dim: int = 512, n_queries: int = 100, k: int = 5) -> List[dict]:
+    """Query latency and RSS of each vector backend at each corpus size."""
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for n_vectors in sizes:
+        for backend in backends:
+            workdir = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+            results = ctx.Queue()
+            proc = ctx.Process(target=_vector_backend_worker,
+                               args=(backend, n_vectors, dim, n_queries, k, workdir, results))
+            proc.start()
+            row = results.get()
+            proc.join()
+            shutil.rmtree(workdir, ignore_errors=True)
+            rows.append(row)
+            print(row)
+    return rows
+
+
+# ---------------- Quantization Recall ----------------
+def clustered_vectors(n: int, dim: int, n_clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Unit vectors around random centres; closer to real CLIP data than pure noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_clusters, dim), dtype=np.float32)
+    vectors = centres[rng.integers(0, n_clusters, n)] + 0.5 * rng.standard_normal((n, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def benchmark_quantization(n_vectors: int = 100_000, dim: int = 512, n_queries: int = 200, k: int = 10,
+                           modes: Sequence[str] = ("none", "int8", "pq")) -> List[dict]:
+    """recall@k of each storage mode against the exact float32 index, with and without re-ranking."""
+    from Vector_Index import MmapVectorStore
+
+    vectors = clustered_vectors(n_vectors + n_queries, dim)
+    corpus, queries = vectors[:n_vectors], vectors[n_vectors:]
+    docs = [Document(page_content=f"doc-{i}", metadata={"type": "text"}) for i in range(n_vectors)]
+
+    rows = []
+    truth = None
+    for mode in modes:
+        workdir = tempfile.mkdtemp(prefix=f"bench_quant_{mode}_")
+        store = MmapVectorStore(persist_directory=workdir, embedding_function=RandomEmbeddings(dim),
+                                quantization=mode)
+        start = time.perf_counter()
+        store.add_embeddings(corpus, docs)
+        build_s = time.perf_counter() - start
+
+        if truth is None:
+            truth = [set(store.search_rows(q, k, mode="exact")[0].tolist()) for q in queries]
+
+        row = {"mode": mode, "bytes_per_vector": store.bytes_per_vector(), "build_s": round(build_s, 2)}
+        search_modes = ("exact",) if mode == "none" else ("approx", "auto")
+        for search_mode in search_modes:
+            latencies, hits = [], 0
+            for q, expected in zip(queries, truth):
+                t0 = time.perf_counter()
+                found = store.search_rows(q, k, mode=search_mode)[0]
+                latencies.append(time.perf_counter() - t0)
+                hits += len(expected.intersection(found.tolist()))
+            label = "rerank" if search_mode == "auto" else search_mode
+            row[f"recall@{k}_{label}"] = round(hits / (k * len(queries)), 4)
+            row[f"p50_ms_{label}"] = round(percentile_ms(latencies, 50), 2)
+        store.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+        rows.append(row)
+        print(row)
+    return rows
+
+
+# ---------------- Retrieval Quality ----------------
+def evaluate_retrieval(handler, labelled_queries: Sequence[tuple], k: int = 5,
+                       modes: Sequence[str] = ("vector", "bm25", "hybrid")) -> List[dict]:
+    """
+    Offline harness: labelled_queries is [(query, {relevant source paths}), ...].
+    Reports recall@k (share of relevant sources retrieved) and latency per mode.
+    The handler must be built with hybrid=True and already indexed.
+    """
+    rows = []
+    for mode in modes:
+        retriever = handler.get_hybrid_retriever(k=k, mode=mode)
+        latencies, recalls = [], []
+        for query, relevant in labelled_queries:
+            t0 = time.perf_counter()
+            docs = retriever.invoke(query)
+            latencies.append(time.perf_counter() - t0)
+            found = {d.metadata.get("source") for d in docs}
+            recalls.append(len(found & set(relevant)) / max(len(relevant), 1))
+        row = {
+            "mode": mode,
+            f"recall@{k}": round(float(np.mean(recalls)), 4) if recalls else 0.0,
+            "p50_ms": round(percentile_ms(latencies, 50), 2) if latencies else 0.0,
+            "p95_ms": round(percentile_ms(latencies, 95), 2) if latencies else 0.0,
+        }
+        rows.append(row)
+        print(row)
+    return rows
+
+
+# ---------------- Offline Stand-Ins ----------------
+class FakeChatModel:
+    """
+    Gemini stand-in for offline runs: a fixed reply of `tokens` words, the first after
+    `first_token_s`, the rest every `per_token_s`. Supports invoke/stream and their async forms.
+    """
+    def __init__(self, first_token_s: float = 0.3, per_token_s: float = 0.01, tokens: int = 60,
+                 reply: Optional[str] = None):
+        self.first_token_s = first_token_s
+        self.per_token_s = per_token_s
+        words = (reply or " ".join(synthetic_texts(1, tokens)[0].split()[:tokens])).split()
+        self.tokens = [w if i == 0 else " " + w for i, w in enumerate(words)]
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs) -> AIMessage:
+        self.calls += 1
+        time.sleep(self.first_token_s + self.per_token_s * max(len(self.tokens) - 1, 0))
+        return AIMessage(content="".join(self.tokens))
+
+    __call__ = invoke
+
+    def stream(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.first_token_s)
+        for i, token in enumerate(self.tokens):
+            if i:
+                time.sleep(self.per_token_s)
+            yield AIMessageChunk(content=token)
+
+    async def ainvoke(self, messages, **kwargs) -> AIMessage:
+        self.calls += 1
+        await asyncio.sleep(self.first_token_s + self.per_token_s * max(len(self.tokens) - 1, 0))
+        return AIMessage(content="".join(self.tokens))
+
+    async def astream(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.first_token_s)
+        for i, token in enumerate(self.tokens):
+            if i:
+                await asyncio.sleep(self.per_token_s)
+            yield AIMessageChunk(content=token)
+
+
+# ---------------- Synthetic Knowledge Base ----------------
+TOPICS = ["retrievers", "embeddings", "chunking", "reranking", "ocr", "vector stores", "prompting",
+          "evaluation", "caching", "streaming", "agents", "memory", "tokenizers", "quantization"]
+
+
+def _paragraphs(rng: random.Random, topic: str, n_words: int) -> str:
+    vocab = synthetic_texts(1, 200)[0].split() + topic.split()
+    words = [rng.choice(vocab) for _ in range(n_words)]
+    for i in range(0, n_words, 40):  # the topic recurs so queries can find it
+        words[i] = topic
+    lines = [" ".join(words[i:i + 12]) for i in range(0, n_words, 12)]
+    return f"Notes on {topic}\n" + "\n".join(lines)
+
+
+def make_knowledge_base(folder: str, n_text: int = 20, n_pdf: int = 10, n_images: int = 10,
+                        words_per_doc: int = 400, seed: int = 0, n_image_copies: int = 0) -> dict:
+    """
+    Write a deterministic knowledge base of .txt files, multi-page PDFs and
+    text-bearing PNGs (so OCR has something to read). Returns counts and sample queries.
+    n_image_copies adds that many near-identical screenshots (rescaled JPEG re-saves).
+    """
+    import fitz
+    from PIL import Image, ImageDraw
+
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    for i in range(n_text):
+        topic = TOPICS[i % len(TOPICS)]
+        with open(os.path.join(folder, f"text_{i:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write(_paragraphs(rng, topic, words_per_doc))
+
+    for i in range(n_pdf):
+        topic = TOPICS[(i + 3) % len(TOPICS)]
+        lines = _paragraphs(rng, topic, words_per_doc).split("\n")
+        figure = Image.new("RGB", (320, 200), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        ImageDraw.Draw(figure).text((20, 90), f"Figure: {topic}", fill=(0, 0, 0))
+        buffer = io.BytesIO()
+        figure.save(buffer, format="PNG")
+        pdf = fitz.open()
+        for lo in range(0, len(lines), 40):
+            page = pdf.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 550, 600), "\n".join(lines[lo:lo + 40]), fontsize=10)
+            if lo == 0:  # one embedded figure per PDF for page-level image extraction
+                page.insert_image(fitz.Rect(50, 610, 370, 810), stream=buffer.getvalue())
+        pdf.save(os.path.join(folder, f"pdf_{i:04d}.pdf"))
+        pdf.close()
+
+    for i in range(n_images):
+        topic = TOPICS[(i + 7) % len(TOPICS)]
+        img = Image.new("RGB", (800, 450), (255, 255, 255))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle((20, 20, 780, 430), outline=(rng.randrange(256), rng.randrange(256), rng.randrange(256)), width=6)
+        for row, line in enumerate(_paragraphs(rng, topic, 60).split("\n")[:8]):
+            draw.text((40, 40 + row * 45), line, fill=(0, 0, 0))
+        img.save(os.path.join(folder, f"image_{i:04d}.png"))
+        for c in range(n_image_copies):
+            img.resize((800 - 8 * (c + 1), 450 - 4 * (c + 1))).save(
+                os.path.join(folder, f"image_{i:04d}_copy{c}.jpg"), quality=85 - 5 * c)
+
+    return {
+        "text_files": n_text, "pdf_files": n_pdf, "image_files": n_images * (1 + n_image_copies),
+        "words_per_doc": words_per_doc,
+        "queries": [f"what do the notes say about {topic}" for topic in TOPICS],
+    }
+
+
+# ---------------- End-to-End: Ingest ----------------
+def benchmark_ingest(folder: str, persist_dir: str, loader_workers: int = os.cpu_count() or 1,
+                     chunk_size: int = 1000, chunk_overlap: int = 100, pdf_mode: str = "document") -> dict:
+    """Throughput of each ingest stage: Loader, split_documents, store_documents (CLIP + vector store)."""
+    from Loader import Loader
+    from Text_splitter import split_documents
+    from Store_And_Retrive import CLIPVectorStoreHandler
+
+    pdf_image_dir = os.path.join(persist_dir, "pdf_images") if pdf_mode == "page" else None
+    loader = Loader(workers=loader_workers, pdf_mode=pdf_mode, pdf_image_dir=pdf_image_dir)
+    start = time.perf_counter()
+    documents = loader.load_directory(folder)
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = split_documents(documents, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    split_s = time.perf_counter() - start
+
+    handler = CLIPVectorStoreHandler(persist_directory=persist_dir)
+    start = time.perf_counter()
+    handler.store_documents(chunks)
+    store_s = time.perf_counter() - start
+    handler.unload_vectorstore()
+
+    n_files = len(loader.list_files(folder))
+    row = {
+        "pdf_mode": pdf_mode,
+        "files": n_files,
+        "documents": len(documents),
+        "chunks": len(chunks),
+        "load_failures": len(loader.failures),
+        "load_s": round(load_s, 3),
+        "split_s": round(split_s, 3),
+        "store_s": round(store_s, 3),
+        "files_per_s": round(n_files / max(load_s, 1e-9), 2),
+        "chunks_per_s_split": round(len(chunks) / max(split_s, 1e-9), 2),
+        "chunks_per_s_store": round(len(chunks) / max(store_s, 1e-9), 2),
+    }
+    print(row)
+    return row
+
+
+# ---------------- End-to-End: Queries ----------------
+def benchmark_queries(folder: str, persist_dir: str, queries: Sequence[str], n_queries: int = 50,
+                      llm=None, k: int = 2, retrieval_mode: str = "vector", pdf_mode: str = "document") -> dict:
+    """Index build (cold) plus per-query TTFT and total latency through get_rag_pipeline."""
+    from Main import get_rag_pipeline
+
+    llm = llm or FakeChatModel()
+    start = time.perf_counter()
+    pipeline = get_rag_pipeline(folder_path=folder, persist_dir=persist_dir, k=k, llm=llm,
+                                retrieval_mode=retrieval_mode, pdf_mode=pdf_mode)
+    build_s = time.perf_counter() - start
+
+    ttft, total = [], []
+    for i in range(n_queries):
+        with contextlib.redirect_stdout(io.StringIO()):  # retrieve() logs every hit
+            for _ in pipeline.stream(queries[i % len(queries)]):
+                pass
+        ttft.append(pipeline.last_metrics["ttft_s"])
+        total.append(pipeline.last_metrics["total_s"])
+    pipeline.handler.unload_vectorstore()
+
+    row = {
+        "retrieval_mode": retrieval_mode,
+        "queries": n_queries,
+        "pipeline_build_s": round(build_s, 3),
+        "llm_first_token_s": getattr(llm, "first_token_s", None),
+    }
+    for name, samples in (("ttft", ttft), ("total", total)):
+        for q in (50, 95, 99):
+            row[f"{name}_p{q}_ms"] = round(percentile_ms(samples, q), 2)
+    print(row)
+    return row
+
+
+# ---------------- Results File ----------------
+def benchmark_dedup(n_images: int = 10, n_image_copies: int = 3, n_text: int = 10, loader_workers: int = 1) -> List[dict]:
+    """Incremental sync of a screenshot-heavy folder with and without near-duplicate collapsing."""
+    from Loader import Loader
+    from Store_And_Retrive import CLIPVectorStoreHandler
+
+    workdir = tempfile.mkdtemp(prefix="bench_dedup_")
+    rows = []
+    try:
+        folder = os.path.join(workdir, "kb")
+        make_knowledge_base(folder, n_text=n_text, n_pdf=0, n_images=n_images, n_image_copies=n_image_copies)
+        for dedup in (False, True):
+            handler = CLIPVectorStoreHandler(persist_directory=os.path.join(workdir, f"db_{dedup}"), dedup=dedup)
+            start = time.perf_counter()
+            stats = handler.sync_directory(folder, Loader(workers=loader_workers))
+            elapsed = time.perf_counter() - start
+            rows.append({"dedup": dedup, "sync_s": round(elapsed, 2), "indexed_chunks": handler._store_count(),
+                         "files_skipped": stats["duplicate_files"], "collapsed": stats["duplicates"]})
+            handler.unload_vectorstore()
+            print(f"dedup={dedup!s:>5} | {elapsed:6.2f}s | {rows[-1]['indexed_chunks']} chunks | "
+                  f"{stats['duplicate_files']} duplicate files skipped before OCR, "
+                  f"{stats['duplicates']} duplicates collapsed in total")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def benchmark_session_store(n_turns: int = 20000, checkpoints: Sequence[int] = (100, 1000, 10000, 20000),
+                            turn_chars: int = 400) -> List[dict]:
+    """Per-turn cost (append + packed history read) as one conversation grows, memory vs sqlite tier."""
+    from Context_Packer import ContextPacker
+    from Session_Store import SessionStore
+
+    packer = ContextPacker(token_counter=len, history_tokens=1000)
+    turn = "User: question\nAssistant: " + "x" * turn_chars
+    workdir = tempfile.mkdtemp(prefix="bench_sessions_")
+    rows = []
+    try:
+        for tier, path in (("memory", None), ("sqlite", os.path.join(workdir, "sessions.sqlite"))):
+            store = SessionStore(path)
+            window = []
+            for i in range(1, n_turns + 1):
+                t0 = time.perf_counter()
+                store.append("bench", turn)
+                packer.pack_history(store.history("bench"))
+                window.append(time.perf_counter() - t0)
+                if i in checkpoints:
+                    rows.append({"tier": tier, "turns": i, "p50_ms": round(percentile_ms(window, 50), 3),
+                                 "p99_ms": round(percentile_ms(window, 99), 3), "rss_mb": round(current_rss_mb(), 1)})
+                    print(f"{tier:>6} | {i:>6} turns | p50 {rows[-1]['p50_ms']:.3f} ms | p99 {rows[-1]['p99_ms']:.3f} ms")
+                    window = []
+            store.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def tracer_summary() -> dict:
+    """TRACER timers/counters in a JSON-friendly shape."""
+    from Instrumentation import TRACER
+
+    snapshot = TRACER.snapshot()
+    counters = {
+        name + "".join(f"[{k}={v}]" for k, v in labels): value
+        for (name, labels), value in snapshot["counters"].items()
+    }
+    timers = {name: {"count": t["count"], "mean_ms": round(1000 * t["sum"] / max(t["count"], 1), 3),
+                     "max_ms": round(1000 * t["max"], 3)} for name, t in snapshot["timers"].items()}
+    return {"timers": timers, "counters": counters}
+
+
+def write_results(results: dict, path: str) -> str:
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        **results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
+    return path
+
+
+# Lower is better; every other number in a section is a count or a setting
+LATENCY_KEYS = {
+    "ingest": ("load_s", "split_s", "store_s"),
+    "query": ("pipeline_build_s",) + tuple(f"{name}_p{q}_ms" for name in ("ttft", "total") for q in (50, 95, 99)),
+}
+# Runs are only comparable when these match
+SETTING_KEYS = {"ingest": ("pdf_mode",), "query": ("retrieval_mode", "llm_first_token_s")}
+
+
+def compare_results(baseline_path: str, current_path: str, tolerance: float = 0.10) -> List[str]:
+    """
+    List metrics more than `tolerance` worse than the baseline: latencies (LATENCY_KEYS)
+    that grew and throughputs (*_per_s*) that shrank. Raises ValueError when the two
+    runs used different settings (pdf_mode, retrieval_mode, ...).
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(current_path, encoding="utf-8") as f:
+        current = json.load(f)
+
+    mismatched = [
+        f"{section}.{key}: {baseline.get(section, {}).get(key)!r} vs {current.get(section, {}).get(key)!r}"
+        for section, keys in SETTING_KEYS.items() for key in keys
+        if baseline.get(section, {}).get(key) != current.get(section, {}).get(key)
+    ]
+    if mismatched:
+        raise ValueError("Benchmark runs are not comparable: " + "; ".join(mismatched))
+
+    regressions = []
+    for section in ("ingest", "query"):
+        old, new = baseline.get(section, {}), current.get(section, {})
+        for key, value in new.items():
+            if not isinstance(old.get(key), (int, float)) or not isinstance(value, (int, float)) or old[key] <= 0:
+                continue
+            if key in LATENCY_KEYS[section]:
+                worse = value > old[key] * (1 + tolerance)
+            elif "_per_s" in key:
+                worse = value < old[key] * (1 - tolerance)
+            else:
+                continue
+            if worse:
+                regressions.append(f"{section}.{key}: {old[key]} -> {value}")
+    for line in regressions:
+        print(f"⚠️ regression {line}")
+    return regressions
+
+
+def run_end_to_end(output: str = "benchmark_results.json", n_text: int = 20, n_pdf: int = 10,
+                   n_images: int = 10, words_per_doc: int = 400, n_queries: int = 50,
+                   llm_first_token_s: float = 0.3, llm_per_token_s: float = 0.01,
+                   retrieval_mode: str = "vector", pdf_mode: str = "document") -> dict:
+    """Synthetic KB -> ingest throughput -> query latency, written to `output` as JSON."""
+    from Instrumentation import TRACER
+
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    try:
+        folder = os.path.join(workdir, "Knowledge_Base")
+        kb = make_knowledge_base(folder, n_text=n_text, n_pdf=n_pdf, n_images=n_images, words_per_doc=words_per_doc)
+        TRACER.reset()
+        ingest = benchmark_ingest(folder, os.path.join(workdir, "ingest_db"), pdf_mode=pdf_mode)
+        query = benchmark_queries(folder, os.path.join(workdir, "query_db"), kb["queries"], n_queries=n_queries,
+                                  llm=FakeChatModel(llm_first_token_s, llm_per_token_s),
+                                  retrieval_mode=retrieval_mode, pdf_mode=pdf_mode)
+        results = {
+            "knowledge_base": {key: value for key, value in kb.items() if key != "queries"},
+            "ingest": ingest,
+            "query": query,
+            "stages": tracer_summary(),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    write_results(results, output)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multimodal assistant benchmarks (offline, no API keys).")
+    parser.add_argument("--suite", choices=["e2e", "micro", "clip", "all"], default="e2e")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--text", type=int, default=20)
+    parser.add_argument("--pdfs", type=int, default=10)
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake LLM time to first token (s)")
+    parser.add_argument("--retrieval-mode", choices=["vector", "hybrid"], default="vector")
+    parser.add_argument("--pdf-mode", choices=["document", "page"], default="document")
+    parser.add_argument("--clip-threads", type=int, help="intra-op threads for the clip suite")
+    args = parser.parse_args()
+
+    if args.suite in ("micro", "all"):
+        benchmark_embedding_throughput()
+        benchmark_vector_backends()
+        benchmark_quantization()
+        benchmark_dedup()
+        benchmark_session_store()
+    if args.suite in ("clip", "all"):
+        write_results({"clip_backends": benchmark_clip_backends(threads=args.clip_threads)},
+                      os.path.splitext(args.output)[0] + "_clip.json")
+    if args.suite in ("e2e", "all"):
+        run_end_to_end(args.output, n_text=args.text, n_pdf=args.pdfs, n_images=args.images,
+                       words_per_doc=args.words, n_queries=args.queries,
+                       llm_first_token_s=args.llm_latency, retrieval_mode=args.retrieval_mode,
+                       pdf_mode=args.pdf_mode)
+        if args.baseline:
+            compare_results(args.baseline, args.output)
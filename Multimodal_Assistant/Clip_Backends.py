@@ -0,0 +1,178 @@
+import os
+from typing import List, Optional
+
+import numpy as np
+
+from Model_Registry import get_clip, get_shared, timed
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+def resolve_device(device: Optional[str] = None) -> str:
+    """None / "auto" -> "cuda" when available, else "cpu"."""
+    if device and device != "auto":
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def configure_torch_threads(intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None):
+    """Process-wide PyTorch CPU thread pools (inter-op can only be set before the first parallel op)."""
+    import torch
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            print(f"⚠️ inter-op threads already fixed for this process: {e}")
+
+
+# ---------------- PyTorch (fp32 / dynamic int8) ----------------
+class TorchCLIPEngine:
+    """Eager PyTorch CLIP; quantized=True swaps every nn.Linear for a dynamic int8 kernel (CPU only)."""
+    def __init__(self, model_name: str, device: str = "cpu", quantized: bool = False):
+        import torch
+        model, self.processor = get_clip(model_name, device)
+        if quantized:
+            if device != "cpu":
+                raise ValueError("Dynamic int8 quantization runs on CPU only")
+            with timed(f"quantize CLIP {model_name} (dynamic int8)"):
+                # The registry's fp32 model stays untouched for other users
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=False)
+        self.model = model
+        self.device = device
+        self.projection_dim = model.config.projection_dim
+
+    def text_features(self, texts: List[str]) -> np.ndarray:
+        import torch
+        inputs = self.processor(text=texts, return_tensors="pt", padding=True, truncation=True).to(self.device)
+        with torch.no_grad():
+            emb = self.model.get_text_features(**inputs)
+        return emb.cpu().numpy().astype(np.float32, copy=False)
+
+    def image_features(self, images: list) -> np.ndarray:
+        import torch
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            emb = self.model.get_image_features(**inputs)
+        return emb.cpu().numpy().astype(np.float32, copy=False)
+
+
+# ---------------- ONNX Runtime ----------------
+def _export_towers(model_name: str, onnx_dir: str):
+    """Export CLIP's text and image towers (projection included) to ONNX with dynamic batch/sequence axes."""
+    import torch
+
+    model, processor = get_clip(model_name, "cpu")
+
+    class TextTower(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.clip = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.clip.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+    class ImageTower(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.clip = model
+
+        def forward(self, pixel_values):
+            return self.clip.get_image_features(pixel_values=pixel_values)
+
+    text_inputs = processor(text=["a photo", "a longer example sentence"], return_tensors="pt", padding=True)
+    size = processor.image_processor.crop_size
+    pixel_values = torch.zeros(2, 3, size["height"], size["width"])
+
+    os.makedirs(onnx_dir, exist_ok=True)
+    with timed(f"export CLIP {model_name} to ONNX"), torch.no_grad():
+        for tower, args, names, axes, filename in (
+            (TextTower(), (text_inputs["input_ids"], text_inputs["attention_mask"]), ["input_ids", "attention_mask"],
+             {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"}}, "text.onnx"),
+            (ImageTower(), (pixel_values,), ["pixel_values"], {"pixel_values": {0: "batch"}}, "image.onnx"),
+        ):
+            path = os.path.join(onnx_dir, filename)
+            tmp_path = path + ".tmp"
+            torch.onnx.export(tower.eval(), args, tmp_path, input_names=names, output_names=["embeds"],
+                              dynamic_axes={**axes, "embeds": {0: "batch"}}, opset_version=17)
+            os.replace(tmp_path, path)
+
+
+def _quantize_towers(onnx_dir: str):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    with timed("quantize CLIP ONNX (dynamic int8)"):
+        for name in ("text", "image"):
+            tmp_path = os.path.join(onnx_dir, f"{name}.int8.onnx.tmp")
+            quantize_dynamic(os.path.join(onnx_dir, f"{name}.onnx"), tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, os.path.join(onnx_dir, f"{name}.int8.onnx"))
+
+
+class OnnxCLIPEngine:
+    """
+    CLIP towers exported once to `onnx_dir` and run under ONNX Runtime with full
+    graph optimization. quantized=True uses dynamically int8-quantized graphs.
+    """
+    def __init__(self, model_name: str, onnx_dir: Optional[str] = None, device: str = "cpu",
+                 quantized: bool = False, intra_op_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None):
+        import onnxruntime as ort
+        from transformers import CLIPProcessor
+
+        onnx_dir = onnx_dir or os.path.join("onnx_models", model_name.replace("/", "__"))
+        suffix = ".int8.onnx" if quantized else ".onnx"
+        if not all(os.path.exists(os.path.join(onnx_dir, f"{n}.onnx")) for n in ("text", "image")):
+            _export_towers(model_name, onnx_dir)
+        if quantized and not all(os.path.exists(os.path.join(onnx_dir, f"{n}{suffix}")) for n in ("text", "image")):
+            _quantize_towers(onnx_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        providers = ["CPUExecutionProvider"]
+        if device.startswith("cuda") and "CUDAExecutionProvider" in ort.get_available_providers():
+            providers.insert(0, "CUDAExecutionProvider")
+
+        with timed(f"load CLIP {model_name} (onnx{'-int8' if quantized else ''})"):
+            self.text_session = ort.InferenceSession(os.path.join(onnx_dir, f"text{suffix}"), options, providers=providers)
+            self.image_session = ort.InferenceSession(os.path.join(onnx_dir, f"image{suffix}"), options, providers=providers)
+            self.processor = CLIPProcessor.from_pretrained(model_name)
+        self.projection_dim = self.text_session.get_outputs()[0].shape[-1]
+
+    def text_features(self, texts: List[str]) -> np.ndarray:
+        inputs = self.processor(text=texts, return_tensors="np", padding=True, truncation=True)
+        feeds = {
+            "input_ids": inputs["input_ids"].astype(np.int64),
+            "attention_mask": inputs["attention_mask"].astype(np.int64),
+        }
+        return self.text_session.run(None, feeds)[0].astype(np.float32, copy=False)
+
+    def image_features(self, images: list) -> np.ndarray:
+        inputs = self.processor(images=images, return_tensors="np")
+        feeds = {"pixel_values": inputs["pixel_values"].astype(np.float32)}
+        return self.image_session.run(None, feeds)[0].astype(np.float32, copy=False)
+
+
+def get_engine(backend: str = "torch", model_name: str = "openai/clip-vit-base-patch32", device: Optional[str] = None,
+               intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None,
+               onnx_dir: Optional[str] = None):
+    """Shared inference engine for `backend`, built at most once per process per configuration."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown CLIP backend '{backend}', expected one of {BACKENDS}")
+    device = resolve_device(device)
+    key = ("clip-engine", backend, model_name, device, intra_op_threads, inter_op_threads, onnx_dir)
+
+    def build():
+        if backend.startswith("onnx"):
+            return OnnxCLIPEngine(model_name, onnx_dir, device, quantized=backend == "onnx-int8",
+                                  intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+        configure_torch_threads(intra_op_threads, inter_op_threads)
+        return TorchCLIPEngine(model_name, device, quantized=backend == "torch-int8")
+
+    return get_shared(key, build)
@@ -0,0 +1,148 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain.docstore.document import Document
+
+from Dedup import normalize_text, shingles
+
+
+# ---------------- Token Counting ----------------
+def default_token_counter() -> Callable[[str], int]:
+    """
+    tiktoken's cl100k encoding when installed (close to Gemini's counts for
+    English), otherwise ~4 characters per token. Pass llm.get_num_tokens for
+    exact Gemini counts at the cost of an API call per chunk.
+    """
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        return lambda text: (len(text) + 3) // 4
+
+
+# ---------------- Similarity Helpers ----------------
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _overlap(previous: str, current: str, max_overlap: int = 300, min_overlap: int = 20) -> int:
+    """Length of the longest suffix of `previous` that `current` starts with (splitter overlap)."""
+    for length in range(min(max_overlap, len(previous), len(current)), min_overlap - 1, -1):
+        if previous.endswith(current[:length]):
+            return length
+    return 0
+
+
+# ---------------- Context Packer ----------------
+class ContextPacker:
+    """
+    Fills a prompt token budget in retrieval-rank order.
+    - image docs cost `image_tokens` each, text chunks their counted tokens
+    - OCR text is taken once (page_content), not again from metadata["ocr_text"]
+    - the splitter overlap between adjacent chunks of the same source is trimmed
+    - exact and near-identical chunks (shingle Jaccard >= threshold) are dropped
+    - history keeps the newest whole turns that fit its own budget
+    """
+    def __init__(self, max_prompt_tokens: int = 2000, history_tokens: int = 400, image_tokens: int = 258,
+                 max_images: int = 4, near_duplicate_threshold: float = 0.85,
+                 token_counter: Optional[Callable[[str], int]] = None):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.history_tokens = history_tokens
+        self.image_tokens = image_tokens
+        self.max_images = max_images
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.count_tokens = token_counter or default_token_counter()
+
+    def pack_history(self, turns: Sequence[str]) -> str:
+        kept: List[str] = []
+        used = 0
+        for turn in reversed(turns):
+            cost = self.count_tokens(turn)
+            if used + cost > self.history_tokens:
+                break
+            kept.append(turn)
+            used += cost
+        return "\n".join(reversed(kept))
+
+    def _truncate(self, text: str, budget: int) -> str:
+        """Keep the head of `text` within `budget` tokens (binary search on length)."""
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.count_tokens(text[:mid]) <= budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:lo]
+
+    def pack_docs(self, docs: Sequence[Document], budget: int) -> Tuple[str, List[Document]]:
+        """Return (context text, image docs to attach) for the given token budget."""
+        texts: List[str] = []
+        images: List[Document] = []
+        seen_shingles: List[set] = []
+        seen_exact = set()
+        kept_chunks: Dict[tuple, Dict[int, str]] = {}
+        used = 0
+
+        for doc in docs:
+            meta = doc.metadata
+            if meta.get("type") == "image":
+                if len(images) < self.max_images and used + self.image_tokens <= budget:
+                    images.append(doc)
+                    used += self.image_tokens
+                continue
+
+            text = doc.page_content.strip() or meta.get("ocr_text", "").strip()
+            if not text:
+                continue
+
+            # Trim the overlap with an adjacent chunk of the same source that is already in context
+            source_key = (meta.get("source"), meta.get("type"), meta.get("page"))
+            chunk = meta.get("chunk")
+            neighbours = kept_chunks.setdefault(source_key, {})
+            if isinstance(chunk, int):
+                if chunk - 1 in neighbours:
+                    text = text[_overlap(neighbours[chunk - 1], text):].strip()
+                if chunk + 1 in neighbours:
+                    cut = _overlap(text, neighbours[chunk + 1])
+                    text = text[:len(text) - cut].strip()
+            if not text:
+                continue
+
+            normalized = normalize_text(text)
+            if normalized in seen_exact:
+                continue
+            grams = shingles(text)
+            if any(_jaccard(grams, other) >= self.near_duplicate_threshold for other in seen_shingles):
+                continue
+
+            cost = self.count_tokens(text)
+            if used + cost > budget:
+                if texts:
+                    continue  # a lower-ranked, shorter chunk may still fit
+                text = self._truncate(text, budget - used)  # never lose the top chunk entirely
+                cost = self.count_tokens(text)
+                if not text:
+                    continue
+
+            texts.append(text)
+            used += cost
+            seen_exact.add(normalized)
+            seen_shingles.append(grams)
+            if isinstance(chunk, int):
+                neighbours[chunk] = doc.page_content.strip()
+
+        return "\n\n".join(texts), images
+
+    def pack(self, docs: Sequence[Document], turns: Sequence[str], fixed_text: str = "") -> Tuple[str, str, List[Document]]:
+        """
+        Pack history and retrieved docs into one prompt budget.
+        `fixed_text` is what is always sent (template + question) and is paid first.
+        Returns (context, chat_history, image docs).
+        """
+        history = self.pack_history(turns)
+        remaining = self.max_prompt_tokens - self.count_tokens(fixed_text) - self.count_tokens(history)
+        context, images = self.pack_docs(docs, max(remaining, 0))
+        return context, history, images
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+from langchain.docstore.document import Document
+
+WORD = re.compile(r"\w+")
+PRIME = np.uint64((1 << 31) - 1)  # keeps a * x + b inside uint64
+
+
+# ---------------- Perceptual Hash (images) ----------------
+def dhash(image, hash_size: int = 8) -> int:
+    """
+    Difference hash: one bit per "is the next pixel brighter" on a tiny grayscale
+    thumbnail. Survives rescaling, recompression and small edits, so
+    near-identical screenshots land within a few bits of each other.
+    """
+    if not isinstance(image, Image.Image):
+        with Image.open(image) as img:
+            img.draft("L", ((hash_size + 1) * 4, hash_size * 4))  # JPEGs decode at reduced scale
+            return dhash(img.convert("L"), hash_size)
+    pixels = np.asarray(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+# ---------------- MinHash (OCR / text chunks) ----------------
+# Text normalization shared with Context_Packer and Response_Cache
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens."""
+    return WORD.findall(text.lower())
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(tokenize(text))
+
+
+def shingles(text: str, k: int = 5) -> Set[str]:
+    """Overlapping k-word shingles of normalized text (short texts give one shingle)."""
+    words = tokenize(text)
+    if len(words) <= k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+class MinHasher:
+    """Estimates Jaccard similarity of shingle sets with `num_perm` universal hashes."""
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, int(PRIME), num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(PRIME), num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        grams = shingles(text)
+        if not grams:
+            return None
+        x = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") & int(PRIME)
+             for g in grams),
+            dtype=np.uint64, count=len(grams),
+        )
+        return ((np.outer(x, self.a) + self.b) % PRIME).min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.mean(a == b))
+
+
+# ---------------- Duplicate Registry ----------------
+class DedupIndex:
+    """
+    Persistent registry of indexed content fingerprints, used at ingest time to
+    collapse near-duplicates into the first indexed copy.
+
+    Each entry is one kept ("canonical") piece of content:
+      {"kind": "image" | "text", "fp": hash, "source": path, "chunk_ids": [...], "duplicates": [paths]}
+    Lookups are LSH-bucketed, so they stay O(1) as the corpus grows:
+    - images: the 64-bit dHash is split into max_image_distance + 1 bands; any hash
+      within that Hamming distance shares at least one band exactly
+    - text: MinHash signatures split into `bands` bands, candidates are confirmed
+      against `text_threshold` estimated Jaccard similarity
+    """
+    def __init__(self, path: Optional[str] = None, max_image_distance: int = 4, text_threshold: float = 0.85,
+                 num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = path
+        self.max_image_distance = max_image_distance
+        self.text_threshold = text_threshold
+        self.bands = bands
+        self.minhash = MinHasher(num_perm)
+        self.entries: Dict[str, dict] = {}
+        self._image_masks = [
+            (sum(1 << int(bit) for bit in part), i)
+            for i, part in enumerate(np.array_split(np.arange(64), max_image_distance + 1))
+        ]
+        self._buckets: Dict[tuple, Set[str]] = {}
+        self._by_chunk: Dict[str, Set[str]] = {}
+        self._by_source: Dict[str, Set[str]] = {}  # canonical source and duplicate sources -> entry ids
+        self._signatures: Dict[str, np.ndarray] = {}
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for entry_id, entry in json.load(f).get("entries", {}).items():
+                    self._insert(entry_id, entry)
+
+    def exists(self) -> bool:
+        return bool(self.path) and os.path.exists(self.path)
+
+    # ---------- Fingerprints ----------
+    def fingerprint(self, doc: Document) -> Tuple[str, Optional[object]]:
+        """("image", dHash) for image docs, ("text", MinHash) otherwise; fp is None if there is nothing to compare."""
+        if doc.metadata.get("type") == "image":
+            try:
+                return "image", dhash(doc.page_content.strip())
+            except Exception as e:
+                print(f"⚠️ Could not hash image {doc.page_content}: {e}")
+                return "image", None
+        return "text", self.minhash.signature(doc.page_content)
+
+    def _bucket_keys(self, kind: str, fp) -> List[tuple]:
+        if kind == "image":
+            return [("image", i, fp & mask) for mask, i in self._image_masks]
+        rows = len(fp) // self.bands
+        return [("text", i, fp[i * rows:(i + 1) * rows].tobytes()) for i in range(self.bands)]
+
+    # ---------- Lookups ----------
+    def match(self, kind: str, fp) -> Optional[str]:
+        """Entry id of already-registered content near-identical to `fp`, or None."""
+        candidates = set()
+        for key in self._bucket_keys(kind, fp):
+            candidates |= self._buckets.get(key, set())
+        best, best_score = None, None
+        for entry_id in sorted(candidates):
+            if kind == "image":
+                score = -hamming(fp, self.entries[entry_id]["fp"])
+                ok = -score <= self.max_image_distance
+            else:
+                score = MinHasher.similarity(fp, self._signatures[entry_id])
+                ok = score >= self.text_threshold
+            if ok and (best_score is None or score > best_score):
+                best, best_score = entry_id, score
+        return best
+
+    def sources_for(self, chunk_id: str) -> List[str]:
+        """Every source path whose content is represented by this indexed chunk."""
+        sources = set()
+        for entry_id in self._by_chunk.get(chunk_id, ()):
+            entry = self.entries[entry_id]
+            sources.add(entry["source"])
+            sources.update(entry["duplicates"])
+        return sorted(sources)
+
+    # ---------- Updates ----------
+    def _insert(self, entry_id: str, entry: dict):
+        if entry["kind"] == "text":
+            fp = np.asarray(entry["fp"], dtype=np.uint32)
+            self._signatures[entry_id] = fp
+            entry = {**entry, "fp": fp.tolist()}
+        else:
+            fp = entry["fp"]
+        self.entries[entry_id] = entry
+        for key in self._bucket_keys(entry["kind"], fp):
+            self._buckets.setdefault(key, set()).add(entry_id)
+        for cid in entry["chunk_ids"]:
+            self._by_chunk.setdefault(cid, set()).add(entry_id)
+        for source in [entry["source"], *entry["duplicates"]]:
+            self._by_source.setdefault(source, set()).add(entry_id)
+
+    def add(self, entry_id: str, kind: str, fp, source: str, chunk_ids: List[str]):
+        self._insert(entry_id, {"kind": kind, "fp": fp, "source": source, "chunk_ids": list(chunk_ids),
+                                "duplicates": []})
+
+    def attach_chunks(self, entry_id: str, chunk_ids: List[str]):
+        """Record the chunk ids of an entry registered before its file was loaded."""
+        entry = self.entries[entry_id]
+        for cid in entry["chunk_ids"]:
+            self._by_chunk.get(cid, set()).discard(entry_id)
+        entry["chunk_ids"] = list(chunk_ids)
+        for cid in chunk_ids:
+            self._by_chunk.setdefault(cid, set()).add(entry_id)
+
+    def add_duplicate(self, entry_id: str, source: str) -> List[str]:
+        """Record `source` as a copy of the entry; returns the chunk ids whose source list changed."""
+        entry = self.entries[entry_id]
+        if source != entry["source"] and source not in entry["duplicates"]:
+            entry["duplicates"].append(source)
+            self._by_source.setdefault(source, set()).add(entry_id)
+        return list(entry["chunk_ids"])
+
+    def forget(self, source: str) -> Tuple[List[str], Set[str]]:
+        """
+        Drop everything `source` contributed (it was removed or is being re-ingested).
+        Returns (orphans, touched): sources that were collapsed into content owned by
+        `source` and must be ingested again, and kept chunk ids whose source list shrank.
+        """
+        orphans: Set[str] = set()
+        touched: Set[str] = set()
+        for entry_id in self._by_source.pop(source, set()):
+            entry = self.entries.get(entry_id)
+            if entry is None:
+                continue
+            if entry["source"] != source:
+                entry["duplicates"].remove(source)
+                touched.update(entry["chunk_ids"])
+                continue
+            del self.entries[entry_id]
+            self._signatures.pop(entry_id, None)
+            fp = entry["fp"] if entry["kind"] == "image" else np.asarray(entry["fp"], dtype=np.uint32)
+            for key in self._bucket_keys(entry["kind"], fp):
+                self._buckets.get(key, set()).discard(entry_id)
+            for cid in entry["chunk_ids"]:
+                self._by_chunk.get(cid, set()).discard(entry_id)
+            for duplicate in entry["duplicates"]:
+                self._by_source.get(duplicate, set()).discard(entry_id)
+                orphans.add(duplicate)
+        orphans.discard(source)
+        return sorted(orphans), touched
+
+    def stats(self) -> dict:
+        duplicates = sum(len(e["duplicates"]) for e in self.entries.values())
+        return {"entries": len(self.entries), "collapsed_sources": duplicates}
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
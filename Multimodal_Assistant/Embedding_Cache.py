@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from Index_Manifest import file_sha256
+
+
+# ---------------- Query Embedding Cache ----------------
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache for query embeddings with an optional sqlite tier.
+    Keys are normalized query text or the hash of an image file's bytes, prefixed
+    with a namespace naming the model / backend that produced the vector, so one
+    cache file can be shared by differently configured embedders.
+    The sqlite tier keeps at most `max_disk_entries` rows (least recently used are
+    pruned) and commits every COMMIT_EVERY writes or COMMIT_INTERVAL_S seconds.
+    """
+    COMMIT_EVERY = 64
+    COMMIT_INTERVAL_S = 5.0
+
+    def __init__(self, max_entries: int = 1024, persist_path: Optional[str] = None,
+                 max_disk_entries: int = 100_000):
+        self.max_entries = max(1, max_entries)
+        self.max_disk_entries = max(1, max_disk_entries)
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        if persist_path:
+            os.makedirs(os.path.dirname(persist_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(query_embeddings)")}
+            if "last_used" not in columns:  # files written before the disk tier was bounded
+                self._db.execute("ALTER TABLE query_embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS query_embeddings_last_used ON query_embeddings (last_used)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def text_key(text: str, namespace: str = "") -> str:
+        # CLIP's tokenizer lowercases and collapses whitespace anyway
+        return f"{namespace}|text:" + " ".join(text.split()).lower()
+
+    @staticmethod
+    def image_key(path: str, namespace: str = "") -> str:
+        return f"{namespace}|image:" + file_sha256(path)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self._db.execute("UPDATE query_embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._wrote()
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, vector) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    (key, vector.tobytes(), time.time()),
+                )
+                self._wrote()
+
+    def _wrote(self) -> None:
+        """Commit (and prune the disk tier) in batches instead of once per write. Caller holds the lock."""
+        self._pending += 1
+        if self._pending < self.COMMIT_EVERY and time.monotonic() - self._last_commit < self.COMMIT_INTERVAL_S:
+            return
+        self._flush()
+
+    def _flush(self) -> None:
+        excess = self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0] - self.max_disk_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM query_embeddings WHERE key IN "
+                "(SELECT key FROM query_embeddings ORDER BY last_used LIMIT ?)", (excess,)
+            )
+        self._db.commit()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._flush()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._flush()
+                self._db.close()
+                self._db = None
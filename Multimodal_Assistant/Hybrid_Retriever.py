@@ -0,0 +1,173 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from Index_Manifest import chunk_id
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+TEXT_TYPES = ("text", "pdf", "ocr")  # image docs only hold a path, nothing to match
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+# ----------- BM25 Inverted Index -----------
+class BM25Index:
+    """
+    On-disk (sqlite) inverted index over text/pdf/ocr chunks.
+    Postings are added and removed per chunk id, so ingest can update it incrementally.
+    """
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, length INTEGER, doc_type TEXT,
+                                             page_content TEXT, metadata TEXT);
+            CREATE TABLE IF NOT EXISTS postings (term TEXT, doc_id TEXT, tf INTEGER);
+            CREATE INDEX IF NOT EXISTS postings_term ON postings (term);
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self._db.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    @property
+    def backfilled(self) -> bool:
+        """True once every chunk already in the vector store has been indexed here."""
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM meta WHERE key = 'backfilled'").fetchone() is not None
+
+    def mark_backfilled(self):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('backfilled', '1')")
+            self._db.commit()
+
+    def add(self, ids: Iterable[str], documents: Iterable[Document]):
+        with self._lock:
+            for doc_id, doc in zip(ids, documents):
+                doc_type = doc.metadata.get("type", "text")
+                if doc_type not in TEXT_TYPES:
+                    continue
+                terms = Counter(tokenize(doc.page_content))
+                self._db.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?, ?)",
+                    (doc_id, sum(terms.values()), doc_type, doc.page_content, json.dumps(doc.metadata)),
+                )
+                self._db.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?)",
+                    [(term, doc_id, tf) for term, tf in terms.items()],
+                )
+            self._db.commit()
+
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            rows = [(doc_id,) for doc_id in ids]
+            self._db.executemany("DELETE FROM postings WHERE doc_id = ?", rows)
+            self._db.executemany("DELETE FROM docs WHERE id = ?", rows)
+            self._db.commit()
+
+    def reset(self):
+        with self._lock:
+            self._db.execute("DELETE FROM postings")
+            self._db.execute("DELETE FROM docs")
+            self._db.commit()
+
+    def search(self, query: str, k: int = 4, filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        wanted = (filter or {}).get("type")
+        if isinstance(wanted, dict):
+            wanted = wanted.get("$in", wanted.get("$eq"))
+        if isinstance(wanted, str):
+            wanted = [wanted]
+
+        with self._lock:
+            n_docs, total_length = self._db.execute("SELECT COUNT(*), SUM(length) FROM docs").fetchone()
+            if not n_docs:
+                return []
+            avg_length = (total_length or 0) / n_docs
+
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._db.execute(
+                    "SELECT p.doc_id, p.tf, d.length, d.doc_type FROM postings p JOIN docs d ON d.id = p.doc_id "
+                    "WHERE p.term = ?", (term,)
+                ).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf, length, doc_type in postings:
+                    if wanted and doc_type not in wanted:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / max(avg_length, 1e-9))
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            results = []
+            for doc_id, score in top:
+                page_content, metadata = self._db.execute(
+                    "SELECT page_content, metadata FROM docs WHERE id = ?", (doc_id,)
+                ).fetchone()
+                results.append((Document(page_content=page_content, metadata=json.loads(metadata)), score))
+            return results
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# ----------- Reciprocal-Rank Fusion -----------
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """Fuse ranked lists: score(d) = sum 1 / (rrf_k + rank). Docs are matched by chunk id."""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = chunk_id(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    ordered = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in ordered]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    BM25 over chunk text + CLIP similarity, fused with reciprocal-rank fusion.
+    mode="bm25" or "vector" runs a single leg (used by the evaluation harness).
+    """
+    vectorstore: Any
+    bm25: Any
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    mode: str = "hybrid"
+    filter: Optional[dict] = None
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        rankings = []
+        if self.mode in ("hybrid", "vector"):
+            kwargs = {"filter": self.filter} if self.filter else {}
+            rankings.append(self.vectorstore.similarity_search(query, k=self.fetch_k, **kwargs))
+        if self.mode in ("hybrid", "bm25"):
+            rankings.append([doc for doc, _ in self.bm25.search(query, k=self.fetch_k, filter=self.filter)])
+        return reciprocal_rank_fusion(rankings, self.k, self.rrf_k)
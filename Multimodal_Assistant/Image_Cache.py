@@ -0,0 +1,105 @@
+import base64
+import json
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+
+from Index_Manifest import file_sha256
+
+
+# ---------------- Image Derivative Cache ----------------
+class ImageDerivativeCache:
+    """
+    Ingest-time cache of downscaled, already-encoded images keyed by content hash.
+    Each entry is stored as a ready-to-send data URL, so attaching an image at
+    query time is a file read (or a memory hit) with no decode / re-encode.
+    """
+    FORMATS = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+    def __init__(self, cache_dir: str, max_side: int = 768, image_format: str = "JPEG",
+                 quality: int = 85, max_memory_entries: int = 256):
+        image_format = image_format.upper()
+        if image_format not in self.FORMATS:
+            raise ValueError(f"Unsupported format '{image_format}', expected one of {list(self.FORMATS)}")
+        self.cache_dir = cache_dir
+        self.max_side = max_side
+        self.image_format = image_format
+        self.quality = quality
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # path -> {"mtime", "size", "key"} so unchanged files are not re-hashed
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._index = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                self._index = json.load(f)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.b64")
+
+    def key_for(self, path: str) -> str:
+        """Cache key: content hash plus the derivative settings."""
+        stat = os.stat(path)
+        entry = self._index.get(path)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return entry["key"]
+        settings = f"{self.max_side}-{self.image_format}-{self.quality}"
+        key = f"{file_sha256(path)[:32]}-{settings}"
+        self._index[path] = {"mtime": stat.st_mtime, "size": stat.st_size, "key": key}
+        return key
+
+    def _encode(self, path: str) -> str:
+        img = Image.open(path)
+        if self.image_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((self.max_side, self.max_side))  # keeps aspect ratio, never upscales
+        buffer = BytesIO()
+        save_kwargs = {} if self.image_format == "PNG" else {"quality": self.quality}
+        img.save(buffer, format=self.image_format, **save_kwargs)
+        b64_str = base64.b64encode(buffer.getvalue()).decode("utf-8")
+        return f"data:{self.FORMATS[self.image_format]};base64,{b64_str}"
+
+    def ensure(self, path: str) -> str:
+        """Build the derivative for `path` if missing and return its key (ingest time)."""
+        with self._lock:
+            key = self.key_for(path)
+        entry_path = self._entry_path(key)
+        if not os.path.exists(entry_path):
+            data_url = self._encode(path)
+            tmp_path = entry_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data_url)
+            os.replace(tmp_path, entry_path)
+        return key
+
+    def save_index(self):
+        with self._lock:
+            tmp_path = self._index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self._index_path)
+
+    def data_url(self, key: str) -> Optional[str]:
+        """Cached data URL for a key, or None if it was never built (query time)."""
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                return cached
+        try:
+            with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                data_url = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            self._memory[key] = data_url
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+        return data_url
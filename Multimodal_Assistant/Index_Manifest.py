@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from langchain.docstore.document import Document
+
+
+# ---------------- Hashing Helpers ----------------
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Hash a file's bytes without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(doc: Document, file_digest: str = "") -> str:
+    """
+    Stable id for a chunk: same source + position + content -> same id.
+    Image docs only carry their path, so the file digest is mixed in for them
+    (images extracted from a PDF carry their own content hash instead, so
+    editing one page does not re-embed every image of the document).
+    """
+    meta = doc.metadata
+    parts = [
+        str(meta.get("source", "")),
+        str(meta.get("type", "")),
+        str(meta.get("chunk", "")),
+        doc.page_content,
+    ]
+    if "page" in meta:  # page-level PDF docs: chunk numbers restart on every page
+        parts.append(f"page={meta['page']}")
+    if meta.get("type") == "image":
+        parts.append(meta.get("image_sha256") or file_digest)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+# ---------------- Manifest ----------------
+class IndexManifest:
+    """
+    JSON manifest of what is already embedded:
+    {source path: {"mtime", "size", "sha256", "chunk_ids": [...], "assets": [...]}}
+    plus the ingest `settings` the entries were built with. "assets" lists files
+    written while loading the source (images extracted from a PDF).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, dict] = {}
+        self.settings: Dict[str, object] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.settings = data.get("settings", {})
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def get(self, source: str) -> Optional[dict]:
+        return self.files.get(source)
+
+    def is_unchanged(self, source: str, stat: os.stat_result) -> bool:
+        """Cheap check on mtime/size before falling back to hashing."""
+        entry = self.files.get(source)
+        return bool(entry) and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size
+
+    def update(self, source: str, stat: os.stat_result, sha256: str, chunk_ids: List[str],
+               assets: Optional[List[str]] = None):
+        self.files[source] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": sha256,
+            "chunk_ids": chunk_ids,
+        }
+        if assets:
+            self.files[source]["assets"] = assets
+
+    def assets(self, source: str) -> List[str]:
+        return (self.files.get(source) or {}).get("assets", [])
+
+    def referenced_assets(self) -> set:
+        return {path for entry in self.files.values() for path in entry.get("assets", ())}
+
+    def remove(self, source: str) -> List[str]:
+        """Drop a file from the manifest and return the chunk ids it owned."""
+        entry = self.files.pop(source, None)
+        return entry["chunk_ids"] if entry else []
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "settings": self.settings}, f)
+        os.replace(tmp_path, self.path)  # never leave a half-written manifest
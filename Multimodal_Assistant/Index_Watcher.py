@@ -0,0 +1,268 @@
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from Loader import Loader
+from Instrumentation import TRACER
+
+Snapshot = Dict[str, Tuple[int, int]]
+
+# Index files a build only replaces atomically or writes once, so a new generation can
+# hardlink them from its seed. Everything else (sqlite databases, the vector store's
+# append-only and memory-mapped files) is modified in place and has to be copied.
+SHARED_FILES = ("index_manifest.json", "dedup_index.json", "quantizer.npz")
+SHARED_DIRS = ("pdf_images",)  # content-addressed page images
+
+
+def snapshot_folder(folder_path: str, loader: Optional[Loader] = None) -> Snapshot:
+    """path -> (mtime_ns, size) for every file the loader would ingest."""
+    loader = loader or Loader()
+    snapshot = {}
+    for path in loader.list_files(folder_path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue  # deleted between listing and stat
+        snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+# ---------------- Index Generations ----------------
+class IndexGenerations:
+    """
+    Immutable index directories under `<root>/generations/gen-NNNNNN`.
+    CURRENT names the one being served and is replaced atomically, so a restart
+    (or a crash mid-ingest) always reopens a complete index.
+    """
+    def __init__(self, root: str):
+        self.root = os.path.join(root, "generations")
+        self._pointer = os.path.join(self.root, "CURRENT")
+        os.makedirs(self.root, exist_ok=True)
+
+    def _names(self) -> List[str]:
+        return sorted(n for n in os.listdir(self.root) if n.startswith("gen-"))
+
+    def current(self) -> Optional[str]:
+        try:
+            with open(self._pointer, "r", encoding="utf-8") as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        path = os.path.join(self.root, name)
+        return path if name and os.path.isdir(path) else None
+
+    def create(self, seed: Optional[str] = None) -> str:
+        """
+        New generation directory seeded from `seed` so the next sync is incremental.
+        Files listed in SHARED_FILES / SHARED_DIRS are hardlinked instead of copied.
+        """
+        names = self._names()
+        number = int(names[-1][4:]) + 1 if names else 1
+        path = os.path.join(self.root, f"gen-{number:06d}")
+        if seed:
+            def link_or_copy(src: str, dst: str):
+                rel = os.path.relpath(src, seed)
+                if os.path.basename(rel) in SHARED_FILES or rel.split(os.sep)[0] in SHARED_DIRS:
+                    try:
+                        os.link(src, dst)
+                        return dst
+                    except OSError:
+                        pass  # no hardlinks on this filesystem
+                return shutil.copy2(src, dst)
+
+            shutil.copytree(seed, path, copy_function=link_or_copy)
+        else:
+            os.makedirs(path)
+        return path
+
+    def publish(self, path: str):
+        tmp_path = self._pointer + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(path))
+        os.replace(tmp_path, self._pointer)
+
+    def prune(self, keep: Tuple[str, ...] = ()):
+        """Delete every generation that is neither current nor in `keep` (retried on the next call if locked)."""
+        keep_names = {os.path.basename(p) for p in keep if p}
+        current = self.current()
+        if current:
+            keep_names.add(os.path.basename(current))
+        for name in self._names():
+            if name not in keep_names:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+
+# ---------------- Watcher ----------------
+class IndexWatcher:
+    """
+    Keeps a served index in sync with a folder without blocking queries.
+    - changes are detected by polling (woken early by watchdog's inotify/FSEvents/
+      ReadDirectoryChanges observer when it is installed) and debounced until the
+      folder has been quiet for `debounce_s`
+    - each batch of changes is ingested on this background thread into a copy of the
+      current generation; the live index is never written to
+    - the finished generation is handed to `publish` (one reference swap), then the
+      previous one is closed after `retire_after_s` so in-flight queries can finish
+    - a failed build is retried with exponential backoff (debounce_s doubling, capped
+      at `max_backoff_s`); after `max_retries` failures the watcher waits for the
+      folder to change again
+    Metrics: index.ingest_lag (first change -> swap), index.rebuild, index.swap timers
+    and index_swaps / index_rebuild_failures counters on TRACER.
+    """
+    def __init__(self, folder_path: str, generations: IndexGenerations,
+                 build: Callable[[str], object], publish: Callable[[object], None],
+                 current_handler=None, loader: Optional[Loader] = None, snapshot: Optional[Snapshot] = None,
+                 poll_interval_s: float = 2.0, debounce_s: float = 1.0, retire_after_s: float = 30.0,
+                 max_retries: int = 5, max_backoff_s: float = 300.0):
+        self.folder_path = folder_path
+        self.generations = generations
+        self.build = build
+        self.publish = publish
+        self.loader = loader or Loader()
+        self.poll_interval_s = poll_interval_s
+        self.debounce_s = debounce_s
+        self.retire_after_s = retire_after_s
+        self.max_retries = max_retries
+        self.max_backoff_s = max_backoff_s
+        self.stats = {"swaps": 0, "failures": 0, "last_ingest_lag_s": None, "last_swap_s": None}
+
+        self._handler = current_handler
+        # Pass the snapshot taken before the first build so changes made during it are not missed
+        self._snapshot = snapshot if snapshot is not None else snapshot_folder(folder_path, self.loader)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pinned: List[str] = []  # generations being built or still draining; never pruned
+        self._pin_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+
+    def start(self) -> "IndexWatcher":
+        self._observer = self._start_observer()
+        self._thread = threading.Thread(target=self._run, name="index-watcher", daemon=True)
+        self._thread.start()
+        mode = "events + polling" if self._observer else "polling"
+        print(f"Watching '{self.folder_path}' for changes ({mode}).")
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _start_observer(self):
+        """watchdog is optional; without it changes are picked up on the next poll."""
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+        wake = self._wake
+
+        class WakeHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+
+        observer = Observer()
+        observer.schedule(WakeHandler(), self.folder_path, recursive=True)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def _run(self):
+        first_change_at = None
+        last_change_at = None
+        failures = 0
+        retry_at = None
+        while not self._stop.is_set():
+            self._wake.wait(self.debounce_s if first_change_at else self.poll_interval_s)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+
+            snapshot = snapshot_folder(self.folder_path, self.loader)
+            now = time.perf_counter()
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                first_change_at = first_change_at or now
+                last_change_at = now
+                failures, retry_at = 0, None  # new content: build as soon as it settles
+                continue  # still changing: wait for a quiet period
+            if first_change_at is None or now - last_change_at < self.debounce_s:
+                continue
+            if retry_at is not None and now < retry_at:
+                continue
+
+            if self._refresh(first_change_at):
+                first_change_at, failures, retry_at = None, 0, None
+                continue
+            failures += 1
+            if failures > self.max_retries:
+                print(f"⚠️ giving up after {failures} failed builds; waiting for '{self.folder_path}' to change")
+                first_change_at, failures, retry_at = None, 0, None
+            else:
+                # keep the original change time so the lag metric covers the retry
+                delay = min(self.debounce_s * 2 ** failures, self.max_backoff_s)
+                retry_at = time.perf_counter() + delay
+
+    def _refresh(self, first_change_at: float) -> bool:
+        """Build the next generation off to the side and swap it in. False if the build failed."""
+        previous = self.generations.current()
+        path = None
+        try:
+            with TRACER.span("index.rebuild"):
+                with self._pin_lock:
+                    path = self.generations.create(seed=previous)
+                    self._pinned.append(path)
+                handler = self.build(path)
+        except Exception as e:
+            TRACER.incr("index_rebuild_failures")
+            self.stats["failures"] += 1
+            print(f"⚠️ background ingest failed, still serving the previous index: {e}")
+            if path:
+                self._unpin(path)
+                shutil.rmtree(path, ignore_errors=True)
+            return False
+
+        start = time.perf_counter()
+        self.publish(handler)
+        self.generations.publish(path)
+        swap_s = time.perf_counter() - start
+        lag_s = time.perf_counter() - first_change_at
+        TRACER.observe("index.swap", swap_s)
+        TRACER.observe("index.ingest_lag", lag_s)
+        TRACER.incr("index_swaps")
+        self.stats.update(swaps=self.stats["swaps"] + 1, last_ingest_lag_s=lag_s, last_swap_s=swap_s)
+        print(f"Swapped in index generation '{os.path.basename(path)}' (lag {lag_s:.1f}s).")
+
+        old_handler, self._handler = self._handler, handler
+        self._unpin(path)
+        self._retire(old_handler, previous)
+        return True
+
+    def _unpin(self, path: str):
+        with self._pin_lock:
+            if path in self._pinned:
+                self._pinned.remove(path)
+
+    def _retire(self, handler, path: Optional[str]):
+        """Close the replaced generation once in-flight queries have had time to finish."""
+        if path:
+            with self._pin_lock:
+                self._pinned.append(path)
+
+        def close():
+            if handler is not None:
+                handler.unload_vectorstore()
+            self._unpin(path)
+            with self._pin_lock:
+                self.generations.prune(keep=tuple(self._pinned))
+
+        timer = threading.Timer(self.retire_after_s, close)
+        timer.daemon = True
+        timer.start()
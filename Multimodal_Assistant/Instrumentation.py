@@ -0,0 +1,195 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Histogram buckets (seconds) shared by every stage timer
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start", "end",
+                 "start_wall_ns", "error")
+
+    def __init__(self, name: str, attrs: dict, trace_id: str, parent_id: Optional[str]):
+        self.name = name
+        self.attrs = attrs
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.start_wall_ns = time.time_ns()
+        self.end = None
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class _Histogram:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.buckets[bisect_left(BUCKETS, value)] += 1
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("rag_current_span", default=None)
+
+
+# ---------------- Tracer ----------------
+class Tracer:
+    """
+    Per-stage timers, counters and span export for the RAG pipeline.
+    Disabled tracing costs one attribute check per span / counter.
+    Toggle with `tracer.enabled` or the RAG_TRACING=0 environment variable.
+    """
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = os.getenv("RAG_TRACING", "1") != "0" if enabled is None else enabled
+        self.exporters: List[object] = []
+        self._lock = threading.Lock()
+        self._timers: Dict[str, _Histogram] = {}
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+        return exporter
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        span = Span(name, attrs, parent.trace_id if parent else uuid.uuid4().hex, parent.span_id if parent else None)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+            with self._lock:
+                self._timers.setdefault(name, _Histogram()).observe(span.duration)
+            for exporter in self.exporters:
+                exporter.export_span(span)
+
+    def observe(self, name: str, seconds: float):
+        """Record a duration measured elsewhere (e.g. time-to-first-token) as a stage timer."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._timers.setdefault(name, _Histogram()).observe(seconds)
+
+    def incr(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self) -> dict:
+        """Copy of current timers and counters (for exporters / tests / benchmarks)."""
+        with self._lock:
+            timers = {
+                name: {"count": h.count, "sum": h.total, "max": h.max, "buckets": list(h.buckets)}
+                for name, h in self._timers.items()
+            }
+            counters = dict(self._counters)
+        return {"timers": timers, "counters": counters}
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+
+
+# ---------------- Exporters ----------------
+class LogExporter:
+    """One log line per finished span."""
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        self.logger = logger or logging.getLogger("rag.trace")
+        self.level = level
+
+    def export_span(self, span: Span):
+        attrs = " ".join(f"{k}={v}" for k, v in span.attrs.items())
+        status = f" error={span.error}" if span.error else ""
+        self.logger.log(self.level, f"span={span.name} ms={span.duration * 1000:.2f} trace={span.trace_id} {attrs}{status}")
+
+
+class PrometheusExporter:
+    """Renders the tracer's timers and counters in the Prometheus text exposition format."""
+    def __init__(self, tracer: Tracer, prefix: str = "rag"):
+        self.tracer = tracer
+        self.prefix = prefix
+
+    def export_span(self, span: Span):
+        pass  # aggregated by the tracer itself; render() reads the aggregates
+
+    @staticmethod
+    def _metric(name: str) -> str:
+        return "".join(c if c.isalnum() else "_" for c in name)
+
+    def render(self) -> str:
+        snapshot = self.tracer.snapshot()
+        metric = f"{self.prefix}_stage_duration_seconds"
+        lines = [f"# TYPE {metric} histogram"]
+        for stage, h in sorted(snapshot["timers"].items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), h["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {h["sum"]}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {h["count"]}')
+
+        typed = set()
+        for (name, labels), value in sorted(snapshot["counters"].items()):
+            counter = f"{self.prefix}_{self._metric(name)}_total"
+            if counter not in typed:
+                lines.append(f"# TYPE {counter} counter")
+                typed.add(counter)
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{counter}{{{label_text}}} {value}" if label_text else f"{counter} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetryExporter:
+    """Re-emits finished spans through the OpenTelemetry API (opentelemetry-api must be installed)."""
+    def __init__(self, service_name: str = "multimodal-rag"):
+        from opentelemetry import trace
+        self._trace = trace
+        self._tracer = trace.get_tracer(service_name)
+
+    def export_span(self, span: Span):
+        otel_span = self._tracer.start_span(span.name, start_time=span.start_wall_ns, attributes={
+            **{k: v if isinstance(v, (str, bool, int, float)) else str(v) for k, v in span.attrs.items()},
+            "rag.trace_id": span.trace_id,
+            "rag.parent_id": span.parent_id or "",
+        })
+        if span.error:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=span.start_wall_ns + int(span.duration * 1e9))
+
+
+# Process-wide default used by the pipeline and ingest stages
+TRACER = Tracer()
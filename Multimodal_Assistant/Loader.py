@@ -1,94 +1,317 @@
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
+from langchain_community.document_loaders import TextLoader
 from langchain.schema import Document
-from typing import List
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import pytesseract
 import os
-import glob
+import sys
 import fitz  # PyMuPDF
 from PIL import Image
+from Instrumentation import TRACER
+
+# Tesseract binary: TESSERACT_CMD overrides the default install location
+pytesseract.pytesseract.tesseract_cmd = os.getenv(
+    "TESSERACT_CMD", r"C:\teseract\tesseract.exe" if os.name == "nt" else "tesseract"
+)
+
+
+# ---------------- Failure Reporting ----------------
+class LoadFailure(NamedTuple):
+    """One per-file (or per-page) problem hit during loading."""
+    path: str
+    stage: str   # "pdf", "pdf_page", "pdf_image", "ocr", "text", "worker"
+    error: str
+
+
+# The file could not be read at all; other stages only lose a page, an image or the OCR text
+FATAL_STAGES = ("pdf", "text", "worker")
+
+
+# ---------------- Extractors (module level so worker processes can pickle them) ----------------
+def _extract_pdf(file_path: str) -> Tuple[List[Document], List[LoadFailure]]:
+    failures: List[LoadFailure] = []
+    page_texts: List[str] = []
+    try:
+        pdf = fitz.open(file_path)
+        for i, page in enumerate(pdf):
+            try:
+                page_texts.append(page.get_text())
+            except Exception as e:
+                failures.append(LoadFailure(file_path, "pdf_page", f"page {i}: {e}"))
+        pdf.close()
+    except Exception as e:
+        failures.append(LoadFailure(file_path, "pdf", str(e)))
+        page_texts = []
+
+    doc = Document(page_content="".join(page_texts), metadata={"source": file_path, "type": "pdf"})
+    return [doc], failures
+
+
+def _page_images(pdf, page, file_path: str, page_number: int, image_dir: str, min_image_side: int,
+                 failures: List[LoadFailure]) -> List[Document]:
+    """Write the page's embedded raster images to `image_dir` (named by content hash) as image docs."""
+    docs = []
+    seen = set()
+    for image in page.get_images(full=True):
+        xref = image[0]
+        if xref in seen:
+            continue
+        seen.add(xref)
+        try:
+            info = pdf.extract_image(xref)
+            if not info or min(info["width"], info["height"]) < min_image_side:
+                continue  # icons, bullets, rules
+            data, ext = info["image"], info["ext"].lower()
+            if ext not in ("png", "jpeg", "jpg"):
+                # JPX / JBIG2 / CMYK etc.: let PyMuPDF convert to PNG so PIL and CLIP can open it
+                pix = fitz.Pixmap(pdf, xref)
+                if pix.n - pix.alpha >= 4:
+                    pix = fitz.Pixmap(fitz.csRGB, pix)
+                data, ext = pix.tobytes("png"), "png"
+        except Exception as e:
+            failures.append(LoadFailure(file_path, "pdf_image", f"page {page_number}: {e}"))
+            continue
+
+        digest = hashlib.sha256(data).hexdigest()
+        image_path = os.path.join(image_dir, f"{digest[:32]}.{ext}")
+        if not os.path.exists(image_path):
+            tmp_path = f"{image_path}.{os.getpid()}.tmp"  # pages may be extracted in parallel
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, image_path)
+        docs.append(Document(page_content=image_path, metadata={
+            "source": file_path, "type": "image", "page": page_number, "image_sha256": digest,
+        }))
+    return docs
+
+
+def _extract_pdf_pages(file_path: str, image_dir: Optional[str] = None, min_image_side: int = 64,
+                       start: int = 0, stop: Optional[int] = None) -> Tuple[List[Document], List[LoadFailure]]:
+    """
+    Page-level PDF extraction: one doc per page (metadata "page" is 1-based) plus one
+    image doc per embedded raster image when `image_dir` is set. start/stop select a
+    page range so large PDFs can be split across workers.
+    """
+    failures: List[LoadFailure] = []
+    docs: List[Document] = []
+    try:
+        pdf = fitz.open(file_path)
+    except Exception as e:
+        return [], [LoadFailure(file_path, "pdf", str(e))]
+    try:
+        n_pages = pdf.page_count
+        for i in range(start, min(stop if stop is not None else n_pages, n_pages)):
+            try:
+                page = pdf[i]
+                text = page.get_text()
+            except Exception as e:
+                failures.append(LoadFailure(file_path, "pdf_page", f"page {i}: {e}"))
+                continue
+            if text.strip():
+                docs.append(Document(page_content=text, metadata={
+                    "source": file_path, "type": "pdf", "page": i + 1, "pages": n_pages,
+                }))
+            if image_dir:
+                docs.extend(_page_images(pdf, page, file_path, i + 1, image_dir, min_image_side, failures))
+    finally:
+        pdf.close()
+    return docs, failures
+
+
+def _extract_image(file_path: str) -> Tuple[List[Document], List[LoadFailure]]:
+    failures: List[LoadFailure] = []
+    try:
+        img = Image.open(file_path)
+        text = pytesseract.image_to_string(img)
+    except Exception as e:
+        failures.append(LoadFailure(file_path, "ocr", str(e)))
+        text = ""
+
+    docs = [
+        # 1. OCR text doc (may be empty, still useful for retrieval)
+        Document(page_content=text, metadata={"source": file_path, "type": "ocr"}),
+        # 2. Image-only doc (raw path, ensures CLIP will embed the image)
+        Document(page_content=file_path, metadata={"source": file_path, "type": "image"}),
+    ]
+    return docs, failures
+
+
+def _extract_text(file_path: str) -> Tuple[List[Document], List[LoadFailure]]:
+    try:
+        docs = TextLoader(file_path).load()
+    except Exception as e:
+        return [], [LoadFailure(file_path, "text", str(e))]
+    for d in docs:
+        d.metadata["type"] = "text"
+    return docs, []
+
+
+_EXTRACTORS = {"pdf": _extract_pdf, "image": _extract_image, "text": _extract_text}
+
+
+def _load_path(file_path: str, kind: str) -> Tuple[List[Document], List[LoadFailure]]:
+    """Worker entry point: load one file of a known kind."""
+    return _EXTRACTORS[kind](file_path)
+
+
+def _merge(results: List[Tuple[List[Document], List[LoadFailure]]]) -> Tuple[List[Document], List[LoadFailure]]:
+    docs: List[Document] = []
+    failures: List[LoadFailure] = []
+    for part_docs, part_failures in results:
+        docs.extend(part_docs)
+        failures.extend(part_failures)
+    return docs, failures
 
-# Set local Tesseract path
-pytesseract.pytesseract.tesseract_cmd = r"C:\teseract\tesseract.exe"
 
 class Loader:
     Text_ext = ["*.txt", "*.md"]
     PDF_ext = ["*.pdf"]
     Image_ext = ["*.png", "*.jpg", "*.jpeg", "*.webp", "*.bmp", "*.tiff"]
 
+    def __init__(self, workers: int = 1, max_pending: Optional[int] = None, pdf_mode: str = "document",
+                 pdf_image_dir: Optional[str] = None, pages_per_task: int = 16, min_image_side: int = 64):
+        """
+        workers > 1 runs OCR / PDF / text extraction in a process pool.
+        max_pending bounds how many files are queued ahead of the consumer.
+        pdf_mode="page" emits one doc per PDF page and, with pdf_image_dir set, the
+        embedded images as image docs; PDFs longer than pages_per_task are split
+        into page ranges that run in parallel.
+        """
+        if pdf_mode not in ("document", "page"):
+            raise ValueError(f"Unknown pdf_mode '{pdf_mode}', expected 'document' or 'page'")
+        self.workers = max(1, workers or 1)
+        self.max_pending = max_pending or 2 * self.workers
+        self.pdf_mode = pdf_mode
+        self.pdf_image_dir = pdf_image_dir
+        self.pages_per_task = max(1, pages_per_task)
+        self.min_image_side = min_image_side
+        self.failures: List[LoadFailure] = []
+        if pdf_image_dir:
+            os.makedirs(pdf_image_dir, exist_ok=True)
+
+        self._kinds = {}
+        for kind, patterns in (("image", self.Image_ext), ("pdf", self.PDF_ext), ("text", self.Text_ext)):
+            for pattern in patterns:
+                self._kinds[pattern[1:]] = kind  # "*.png" -> ".png"
+
+    def _collect(self, result: Tuple[List[Document], List[LoadFailure]]) -> List[Document]:
+        docs, failures = result
+        self.failures.extend(failures)
+        for failure in failures:
+            TRACER.incr("ingest_load_failures", stage=failure.stage)
+        TRACER.incr("ingest_docs_loaded", len(docs))
+        return docs
+
     # Custom PDF loader
     def load_pdf_as_document(self, file_path: str) -> Document:
-        full_text = ""
-        try:
-            pdf = fitz.open(file_path)
-            for i, page in enumerate(pdf):
-                try:
-                    full_text += page.get_text()
-                except Exception as e:
-                    print(f"⚠️ Failed to extract text from page {i} in {file_path}: {e}")
-            pdf.close()
-        except Exception as e:
-            print(f"⚠️ Failed to load PDF {file_path}: {e}")
-            full_text = ""
+        return self._collect(_extract_pdf(file_path))[0]
+
+    # Page-level PDF loader → one doc per page + embedded image docs
+    def load_pdf_pages(self, file_path: str) -> List[Document]:
+        return self._collect(_extract_pdf_pages(file_path, self.pdf_image_dir, self.min_image_side))
 
-        return Document(page_content=full_text, metadata={"source": file_path, "type": "pdf"})
+    def _tasks(self, file_path: str, kind: str) -> List[tuple]:
+        """(function, args) units of work for one file; large PDFs in page mode become page ranges."""
+        if kind != "pdf" or self.pdf_mode != "page":
+            return [(_load_path, (file_path, kind))]
+        n_pages = 0
+        if self.workers > 1:
+            try:
+                with fitz.open(file_path) as pdf:
+                    n_pages = pdf.page_count
+            except Exception:
+                pass  # the worker reports the failure
+        if n_pages <= self.pages_per_task:
+            return [(_extract_pdf_pages, (file_path, self.pdf_image_dir, self.min_image_side))]
+        return [
+            (_extract_pdf_pages, (file_path, self.pdf_image_dir, self.min_image_side, start, start + self.pages_per_task))
+            for start in range(0, n_pages, self.pages_per_task)
+        ]
 
     # Custom image loader → returns BOTH OCR doc + raw image doc
     def load_image_as_documents(self, file_path: str) -> List[Document]:
-        docs = []
-        try:
-            img = Image.open(file_path)
-            text = pytesseract.image_to_string(img)
-        except Exception as e:
-            print(f"⚠️ Failed to OCR image {file_path}: {e}")
-            text = ""
+        return self._collect(_extract_image(file_path))
 
-        # 1. OCR text doc (may be empty, still useful for retrieval)
-        docs.append(Document(
-            page_content=text,
-            metadata={"source": file_path, "type": "ocr"}
-        ))
+    def file_kind(self, file_path: str) -> Optional[str]:
+        """"text", "pdf", "image" or None for unsupported files."""
+        return self._kinds.get(os.path.splitext(file_path)[1].lower())
 
-        # 2. Image-only doc (raw path, ensures CLIP will embed the image)
-        docs.append(Document(
-            page_content=file_path,
-            metadata={"source": file_path, "type": "image"}
-        ))
+    # Single-file loader (used by incremental indexing)
+    def load_file(self, file_path: str) -> List[Document]:
+        kind = self.file_kind(file_path)
+        if kind is None:
+            return []
+        return self._collect(_merge([fn(*args) for fn, args in self._tasks(file_path, kind)]))
 
-        return docs
+    # All supported files under a folder, in a stable order (one walk)
+    def list_files(self, folder_path: str) -> List[str]:
+        paths = []
+        for root, _dirs, files in os.walk(folder_path):
+            for name in files:
+                path = os.path.join(root, name)
+                if self.file_kind(path):
+                    paths.append(path)
+        return sorted(paths)
 
-    # Main directory loader
-    def load_directory(self, folder_path: str) -> List[Document]:
-        all_docs: List[Document] = []
+    def iter_files(self, paths: Iterable[str]) -> Iterator[Tuple[str, List[Document]]]:
+        """
+        Yield (path, docs) in input order. With workers > 1 extraction runs in a
+        process pool with at most `max_pending` files in flight.
+        """
+        items = [(p, self.file_kind(p)) for p in paths]
+        items = [(p, kind) for p, kind in items if kind]
+
+        if self.workers == 1:
+            for path, kind in items:
+                with TRACER.span("ingest.load_file", kind=kind):
+                    docs = self._collect(_merge([fn(*args) for fn, args in self._tasks(path, kind)]))
+                yield path, docs
+            return
 
-        # Load images individually
-        for ext in self.Image_ext:
-            for img_path in glob.glob(os.path.join(folder_path, "**", ext), recursive=True):
-                img_docs = self.load_image_as_documents(img_path)
-                all_docs.extend(img_docs)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            in_flight = 0
+            for path, kind in items:
+                futures = [pool.submit(fn, *args) for fn, args in self._tasks(path, kind)]
+                pending.append((path, futures))
+                in_flight += len(futures)
+                while pending and in_flight >= self.max_pending:
+                    in_flight -= len(pending[0][1])
+                    yield self._result(*pending.popleft())
+            while pending:
+                yield self._result(*pending.popleft())
 
-        # Load text files using DirectoryLoader
-        for ext in self.Text_ext:
-            docs = DirectoryLoader(folder_path, glob=f"**/{ext}", loader_cls=TextLoader).load()
-            for d in docs:
-                d.metadata["type"] = "text"
-            all_docs.extend(docs)
+    def _result(self, path: str, futures) -> Tuple[str, List[Document]]:
+        try:
+            with TRACER.span("ingest.load_file_wait", workers=self.workers):  # time blocked on the pool
+                result = _merge([future.result() for future in futures])
+            return path, self._collect(result)
+        except Exception as e:  # worker crashed or result could not be unpickled
+            self.failures.append(LoadFailure(path, "worker", str(e)))
+            return path, []
 
-        # Load PDFs using custom function
-        for ext in self.PDF_ext:
-            for pdf_file in glob.glob(os.path.join(folder_path, "**", ext), recursive=True):
-                pdf_doc = self.load_pdf_as_document(pdf_file)
-                all_docs.append(pdf_doc)
+    # Streaming directory loader: one Document at a time, bounded memory
+    def iter_directory(self, folder_path: str) -> Iterator[Document]:
+        self.failures = []
+        for _path, docs in self.iter_files(self.list_files(folder_path)):
+            yield from docs
 
-        return all_docs
+    # Main directory loader
+    def load_directory(self, folder_path: str) -> List[Document]:
+        return list(self.iter_directory(folder_path))
 
 
 # ---------------- Test ----------------
 if __name__ == "__main__":
-    folder = r"Z:\Genai_Projects\Multimodal_Assistant\Knowledge_Base"
-    loader = Loader()
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.getenv("KNOWLEDGE_BASE_DIR", "Knowledge_Base")
+    loader = Loader(workers=os.cpu_count() or 1)
     documents = loader.load_directory(folder)
 
     print(f"Total documents loaded: {len(documents)}\n")
+    for failure in loader.failures:
+        print(f"⚠️ {failure.stage} failed for {failure.path}: {failure.error}")
 
     # Preview first 5 documents
     for i, doc in enumerate(documents[:5]):
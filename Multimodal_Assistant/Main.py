@@ -1,19 +1,31 @@
 # ---------------- Imports ----------------
+import json
 import os
+import sys
+import time
 from io import BytesIO
 import base64
 from PIL import Image
-from typing import List
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple
 
 from langchain_core.prompts import PromptTemplate
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain.schema import Document
 from langchain.schema.runnable import RunnableLambda
 
 from Loader import Loader
-from Text_splitter import split_documents
+from Text_splitter import iter_split_documents
 from Store_And_Retrive import CLIPVectorStoreHandler
+from Embedding_Cache import QueryEmbeddingCache
+from Image_Cache import ImageDerivativeCache
+from Context_Packer import ContextPacker
+from Response_Cache import SemanticResponseCache
+from Index_Manifest import chunk_id
+from Index_Watcher import IndexGenerations, IndexWatcher, snapshot_folder
+from Instrumentation import TRACER
 from Setup import MultimodalWrapper
+from Model_Registry import startup_report, timed
+from Session_Store import SessionStore
 
 # ---------------- Prompt Template ----------------
 template = """
@@ -42,61 +54,92 @@ prompt_template = PromptTemplate(
 
 # ---------------- Helper Functions ----------------
 def build_context_from_docs(retrieved_docs: List[Document], max_context_chars: int = 3000) -> str:
-    """Convert retrieved docs into a text context string."""
-    context_texts = []
-    for doc in retrieved_docs:
-        ocr_text = doc.metadata.get("ocr_text", "").strip()
-        if ocr_text:
-            context_texts.append(ocr_text)
-        if doc.page_content.strip() and doc.metadata.get("type") != "image":
-            context_texts.append(doc.page_content.strip())
-    combined_context = "\n\n".join(context_texts)
-    if len(combined_context) > max_context_chars:
-        combined_context = combined_context[-max_context_chars:]
-    return combined_context
+    """Convert retrieved docs into a text context string (rank order, deduplicated)."""
+    packer = ContextPacker(token_counter=len, image_tokens=0, max_images=0)
+    return packer.pack_docs(retrieved_docs, max_context_chars)[0]
 
 def pil_to_base64(img: Image.Image) -> str:
     """Convert PIL Image to base64 string for LLM."""
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    b64_str = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    with TRACER.span("rag.encode_image"):
+        buffer = BytesIO()
+        img.save(buffer, format="PNG")
+        b64_str = base64.b64encode(buffer.getvalue()).decode("utf-8")
     return f"data:image/png;base64,{b64_str}"
 
+def iter_tag_ocr_text(documents: Iterable[Document]) -> Iterator[Document]:
+    """Copy OCR text into metadata so it survives into the retrieved context."""
+    for doc in documents:
+        if doc.metadata.get("type") == "ocr":
+            doc.metadata["ocr_text"] = doc.page_content.strip()
+        yield doc
+
+def tag_ocr_text(documents: List[Document]):
+    """In-place variant of iter_tag_ocr_text for already-loaded lists."""
+    for _ in iter_tag_ocr_text(documents):
+        pass
+
+def iter_cache_images(documents: Iterable[Document], image_cache: ImageDerivativeCache) -> Iterator[Document]:
+    """Build the resized/encoded derivative of each image doc and record its key in metadata."""
+    for doc in documents:
+        if doc.metadata.get("type") == "image":
+            try:
+                doc.metadata["image_key"] = image_cache.ensure(doc.page_content.strip())
+            except Exception as e:
+                print(f"⚠️ Failed to cache image {doc.page_content}: {e}")
+        yield doc
+
 # ---------------- Chat History Class ----------------
 class ChatMemory:
-    """Simple in-memory chat history for conversation."""
-    def __init__(self):
-        self.history: List[str] = []
+    """Chat history of one session, kept bounded in a SessionStore (in-memory unless given a durable one)."""
+    def __init__(self, session_id: str = "default", store: Optional[SessionStore] = None):
+        self.session_id = session_id
+        self.owns_store = store is None  # a store passed in is closed by whoever created it
+        self.store = store or SessionStore()
+
+    @property
+    def history(self) -> List[str]:
+        """Running summary (if compacted) plus the most recent turns, oldest first."""
+        return self.store.history(self.session_id)
 
     def add(self, user_query: str, assistant_answer: str):
-        self.history.append(f"User: {user_query}\nAssistant: {assistant_answer}")
+        self.store.append(self.session_id, f"User: {user_query}\nAssistant: {assistant_answer}")
 
     def get_history(self, max_chars: int = 1000) -> str:
-        full_history = "\n".join(self.history)
-        if len(full_history) > max_chars:
-            return full_history[-max_chars:]
-        return full_history
+        # Newest whole turns that fit, instead of slicing mid-turn
+        return ContextPacker(token_counter=len, history_tokens=max_chars).pack_history(self.history)
 
 # ---------------- Pipeline Helper Functions ----------------
-def context_step(input_tuple, chat_memory: ChatMemory):
-    """Build context text and collect images, append chat history."""
+def context_step(input_tuple, chat_memory: ChatMemory, image_cache: Optional[ImageDerivativeCache] = None,
+                 packer: Optional[ContextPacker] = None):
+    """Pack context, images and chat history into the prompt token budget."""
     docs, query = input_tuple
-    ctx = build_context_from_docs(docs)
+    packer = packer or ContextPacker()
+    fixed_text = prompt_template.format(context="", question=query, chat_history="")
+    ctx, chat_history, image_docs = packer.pack(docs, chat_memory.history, fixed_text=fixed_text)
 
     images = []
-    for d in docs:
+    for d in image_docs:
         if d.metadata.get("type") == "image":
+            # Pre-encoded derivative from ingest: attach as-is, no decode / re-encode
+            key = d.metadata.get("image_key")
+            data_url = image_cache.data_url(key) if image_cache and key else None
+            if data_url:
+                images.append(data_url)
+                continue
+
             path = d.page_content.strip()
             if os.path.exists(path):
                 try:
-                    img = Image.open(path)
+                    with TRACER.span("rag.open_image"):
+                        img = Image.open(path)
+                        img.load()
                     images.append(img)
                 except Exception as e:
                     print(f"⚠️ Failed to open {path}: {e}")
             else:
                 print(f"⚠️ Image path not found: {path}")
 
-    return {"context": ctx, "question": query, "images": images, "chat_history": chat_memory.get_history()}
+    return {"context": ctx, "question": query, "images": images, "chat_history": chat_history}
 
 def multimodal_message(payload):
     """Convert context + images into LLM-ready HumanMessage."""
@@ -111,74 +154,354 @@ def multimodal_message(payload):
         )}]
     )
 
+    image_bytes = 0
     for img in images:
         try:
-            img_b64 = pil_to_base64(img)
+            img_b64 = img if isinstance(img, str) else pil_to_base64(img)
             message.content.append({"type": "image_url", "image_url": img_b64})
+            image_bytes += len(img_b64)
         except Exception as e:
             print(f"⚠️ Error encoding image: {e}")
 
+    TRACER.incr("prompt_chars", len(message.content[0]["text"]))
+    TRACER.incr("image_bytes_attached", image_bytes)
     return [message]
 
+# ---------------- Shared Building Blocks ----------------
+def build_index(folder_path: str, persist_dir: str = "chroma_test_db", incremental: bool = True,
+                loader_workers: int = os.cpu_count() or 1, query_cache_size: int = 1024,
+                backend: str = "chroma", hybrid: bool = False,
+                image_cache: Optional[ImageDerivativeCache] = None,
+                pdf_mode: str = "document", clip_backend: str = "torch",
+                clip_threads: Optional[int] = None,
+                query_cache: Optional[QueryEmbeddingCache] = None,
+                dedup: bool = False) -> CLIPVectorStoreHandler:
+    """
+    Bring the vector store up to date with the folder and return its handler.
+    pdf_mode="page" indexes PDFs page by page (with page numbers) and embeds their images.
+    clip_backend: "torch", "torch-int8", "onnx" or "onnx-int8" CLIP inference (keep it fixed per index).
+    query_cache: shared query-embedding cache (defaults to one persisted inside persist_dir).
+    dedup: collapse near-duplicate images and OCR/text chunks (incremental sync only).
+    """
+    def prepare(documents: Iterable[Document]) -> Iterator[Document]:
+        documents = iter_tag_ocr_text(documents)
+        if image_cache is not None:
+            documents = iter_cache_images(documents, image_cache)
+        return documents
+
+    # Vector store (repeated queries skip CLIP, also across restarts)
+    pdf_image_dir = os.path.join(persist_dir, "pdf_images") if pdf_mode == "page" else None
+    loader = Loader(workers=loader_workers, pdf_mode=pdf_mode, pdf_image_dir=pdf_image_dir)
+    if query_cache is None:
+        query_cache = QueryEmbeddingCache(
+            max_entries=query_cache_size,
+            persist_path=os.path.join(persist_dir, "query_cache.sqlite"),
+        )
+    handler = CLIPVectorStoreHandler(persist_directory=persist_dir, query_cache=query_cache, backend=backend,
+                                     hybrid=hybrid, clip_backend=clip_backend, clip_threads=clip_threads,
+                                     dedup=dedup and incremental)
+    with timed("index sync"):
+        if incremental:
+            # Only new/changed files are embedded; removed files are dropped
+            handler.sync_directory(folder_path, loader, prepare=lambda docs: list(prepare(docs)))
+        else:
+            # Stream load -> split -> store so the corpus is never held in memory at once
+            documents = prepare(loader.iter_directory(folder_path))
+            handler.store_document_stream(iter_split_documents(documents, chunk_size=1000, chunk_overlap=100))
+    if image_cache is not None:
+        image_cache.save_index()
+    return handler
+
+def load_llm(env_path: str = "myenv/.env"):
+    """Gemini chat model used to answer."""
+    wrapper = MultimodalWrapper(env_path=env_path)
+    return wrapper.llm
+
+def retrieve(retriever, query):
+    """Run retrieval and log previews; returns the (docs, query) tuple context_step expects."""
+    docs = retriever.invoke(query)
+    print("\n--- Retrieved Docs ---")
+    for d in docs:
+        page = f" p.{d.metadata['page']}" if "page" in d.metadata else ""
+        copies = len(json.loads(d.metadata["duplicate_sources"])) - 1 if "duplicate_sources" in d.metadata else 0
+        copies = f" (+{copies} near-duplicates)" if copies > 0 else ""
+        print(f"Source: {d.metadata.get('source')}{page}{copies} | Preview: {d.page_content[:120]}...")
+    return (docs, query)
+
+def chunk_text(chunk) -> str:
+    """Text of a streamed LLM chunk (content may be a string or a list of parts)."""
+    content = chunk.content if hasattr(chunk, "content") else chunk
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return str(content)
+
+
+# ---------------- Turn Steps ----------------
+# Shared by RAGPipeline and Serving.RAGSession so both trace, key and time a turn the same way.
+def prepare_turn(query: str, retriever, chat_memory: ChatMemory,
+                 image_cache: Optional[ImageDerivativeCache] = None,
+                 packer: Optional[ContextPacker] = None) -> dict:
+    """Everything before the LLM: retrieval -> context -> message."""
+    with TRACER.span("rag.retrieve") as span:
+        retrieved = retrieve(retriever, query)
+        if span is not None:
+            span.set(docs=len(retrieved[0]))
+    TRACER.incr("docs_retrieved", len(retrieved[0]))
+    with TRACER.span("rag.context"):
+        payload = context_step(retrieved, chat_memory, image_cache, packer)
+    with TRACER.span("rag.message"):
+        messages = multimodal_message(payload)
+    return {"docs": retrieved[0], "payload": payload, "messages": messages}
+
+def response_cache_args(query: str, prepared: dict, handler: CLIPVectorStoreHandler) -> dict:
+    """Key parts: query embedding (a query-cache hit after retrieval), chunk ids, packed history."""
+    return {
+        "query_vector": handler.embedder.embed_query(query),
+        "doc_ids": [chunk_id(d) for d in prepared["docs"]],
+        "chat_history": prepared["payload"]["chat_history"],
+        "index_version": handler.index_version,
+        "query_text": query,
+    }
+
+def turn_metrics(start: float, first_token_at: Optional[float] = None, cache_hit: bool = False) -> dict:
+    """Count the turn and return its latency metrics."""
+    end = time.perf_counter()
+    TRACER.incr("response_cache_hits" if cache_hit else "llm_calls")
+    metrics = {
+        "ttft_s": (first_token_at or end) - start,
+        "total_s": end - start,
+        "cache_hit": cache_hit,
+    }
+    TRACER.observe("rag.ttft", metrics["ttft_s"])
+    return metrics
+
 # ---------------- Main RAG Pipeline ----------------
-def get_rag_pipeline(folder_path: str, persist_dir: str = "chroma_test_db", k: int = 2, env_path: str = "myenv/.env"):
-    """Initialize a RAG-with-images pipeline with chat history."""
-    chat_memory = ChatMemory()
+class RAGPipeline:
+    """
+    Callable RAG-with-images pipeline with chat history.
+    Calling it returns the full answer; stream()/astream() yield text as it arrives.
+    An optional SemanticResponseCache short-circuits the LLM for repeated questions.
+    """
+    def __init__(self, retriever, llm, chat_memory: ChatMemory,
+                 image_cache: Optional[ImageDerivativeCache] = None,
+                 handler: Optional[CLIPVectorStoreHandler] = None,
+                 packer: Optional[ContextPacker] = None,
+                 response_cache: Optional[SemanticResponseCache] = None):
+        if response_cache is not None and handler is None:
+            raise ValueError("response_cache needs the handler to reuse the query embedding")
+        self.index = (handler, retriever)  # one reference, so a swap is never seen half-done
+        self.packer = packer or ContextPacker()
+        self.response_cache = response_cache
+        self.llm = llm
+        self.chat_memory = chat_memory
+        self.image_cache = image_cache
+        self.watcher: Optional[IndexWatcher] = None
+        self.last_metrics: dict = {}
 
-    # Load documents
-    loader = Loader()
-    documents = loader.load_directory(folder_path)
-    for doc in documents:
-        if doc.metadata.get("type") == "ocr":
-            doc.metadata["ocr_text"] = doc.page_content.strip()
-    split_docs = split_documents(documents, chunk_size=1000, chunk_overlap=100)
+        # Everything before the LLM: retrieval -> context -> message
+        self.prepare = RunnableLambda(self._prepare_step)
 
-    # Vector store
-    handler = CLIPVectorStoreHandler(persist_directory=persist_dir)
-    handler.store_documents(split_docs)
-    handler.load_vectorstore()
-    retriever = handler.get_retriever(k=k)
+    @property
+    def handler(self) -> Optional[CLIPVectorStoreHandler]:
+        return self.index[0]
 
-    # LLM
-    wrapper = MultimodalWrapper(env_path=env_path)
-    llm = wrapper.llm
-
-    # Retrieval step
-    def retrieval_step(query):
-        docs = retriever.get_relevant_documents(query)
-        print("\n--- Retrieved Docs ---")
-        for d in docs:
-            print(f"Source: {d.metadata.get('source')} | Preview: {d.page_content[:120]}...")
-        return (docs, query)
-
-    # Full pipeline
-    pipeline = (
-        RunnableLambda(retrieval_step) |
-        RunnableLambda(lambda tup: context_step(tup, chat_memory)) |
-        RunnableLambda(multimodal_message) |
-        llm
-    )
+    @property
+    def retriever(self):
+        return self.index[1]
+
+    def swap_index(self, handler: CLIPVectorStoreHandler, retriever):
+        """Serve from a new index generation; queries already retrieving finish on the old one."""
+        if self.handler is not None:
+            # Response-cache entries of the old generation must never match the new one
+            handler.index_version = max(handler.index_version, self.handler.index_version + 1)
+        self.index = (handler, retriever)
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.handler is not None:
+            self.handler.unload_vectorstore()
+        if self.chat_memory.owns_store:
+            self.chat_memory.store.close()
 
-    # Wrapper to update chat memory
-    def wrapped_pipeline(query: str):
-        result = pipeline.invoke(query)
-        answer_text = result.content if hasattr(result, "content") else str(result)
-        chat_memory.add(query, answer_text)
+    def _prepare_step(self, inputs):
+        query, retriever = inputs
+        return prepare_turn(query, retriever, self.chat_memory, self.image_cache, self.packer)
+
+    def _prepare(self, query: str) -> Tuple[dict, CLIPVectorStoreHandler]:
+        """Run the pre-LLM chain against one index generation, even if the watcher swaps mid-query."""
+        handler, retriever = self.index
+        return self.prepare.invoke((query, retriever)), handler
+
+    async def _aprepare(self, query: str) -> Tuple[dict, CLIPVectorStoreHandler]:
+        handler, retriever = self.index
+        return await self.prepare.ainvoke((query, retriever)), handler
+
+    def _cached_answer(self, query: str, prepared: dict, handler: CLIPVectorStoreHandler):
+        if self.response_cache is None:
+            return None, None
+        cache_args = response_cache_args(query, prepared, handler)
+        return self.response_cache.lookup(**cache_args), cache_args
+
+    def _finish(self, query: str, answer_text: str, start: float, first_token_at=None, cache_hit: bool = False):
+        """Record the answer in memory and the latency metrics for this turn."""
+        self.chat_memory.add(query, answer_text)
+        self.last_metrics = turn_metrics(start, first_token_at, cache_hit)
+
+    def __call__(self, query: str):
+        start = time.perf_counter()
+        with TRACER.span("rag.query", mode="invoke"):
+            prepared, handler = self._prepare(query)
+            result, cache_args = self._cached_answer(query, prepared, handler)
+            cache_hit = result is not None
+            if not cache_hit:
+                with TRACER.span("rag.llm"):
+                    result = self.llm.invoke(prepared["messages"])
+                if cache_args is not None:
+                    self.response_cache.store(answer=result, **cache_args)
+            answer_text = result.content if hasattr(result, "content") else str(result)
+            self._finish(query, answer_text, start, cache_hit=cache_hit)
         return result
 
-    return wrapped_pipeline
+    # Generators never hold a span across a yield: the consumer's code would run
+    # inside it (and the contextvar token would be reset from another context).
+    # The LLM stream and the whole query are timed by hand instead.
+    def stream(self, query: str) -> Iterator[str]:
+        """Yield answer text as Gemini produces it; memory is updated once the stream completes."""
+        start = time.perf_counter()
+        with TRACER.span("rag.prepare", mode="stream"):
+            prepared, handler = self._prepare(query)
+            cached, cache_args = self._cached_answer(query, prepared, handler)
+        if cached is not None:
+            text = chunk_text(cached)
+            yield text
+            self._finish(query, text, start, cache_hit=True)
+            TRACER.observe("rag.query", time.perf_counter() - start)
+            return
+
+        parts: List[str] = []
+        first_token_at = None
+        llm_start = time.perf_counter()
+        for chunk in self.llm.stream(prepared["messages"]):
+            text = chunk_text(chunk)
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(text)
+            yield text
+        TRACER.observe("rag.llm", time.perf_counter() - llm_start)
+        answer_text = "".join(parts)
+        if cache_args is not None:
+            self.response_cache.store(answer=AIMessage(content=answer_text), **cache_args)
+        self._finish(query, answer_text, start, first_token_at)
+        TRACER.observe("rag.query", time.perf_counter() - start)
+
+    async def astream(self, query: str) -> AsyncIterator[str]:
+        """Async variant of stream()."""
+        start = time.perf_counter()
+        with TRACER.span("rag.prepare", mode="astream"):
+            prepared, handler = await self._aprepare(query)
+            cached, cache_args = self._cached_answer(query, prepared, handler)
+        if cached is not None:
+            text = chunk_text(cached)
+            yield text
+            self._finish(query, text, start, cache_hit=True)
+            TRACER.observe("rag.query", time.perf_counter() - start)
+            return
+
+        parts: List[str] = []
+        first_token_at = None
+        llm_start = time.perf_counter()
+        async for chunk in self.llm.astream(prepared["messages"]):
+            text = chunk_text(chunk)
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(text)
+            yield text
+        TRACER.observe("rag.llm", time.perf_counter() - llm_start)
+        answer_text = "".join(parts)
+        if cache_args is not None:
+            self.response_cache.store(answer=AIMessage(content=answer_text), **cache_args)
+        self._finish(query, answer_text, start, first_token_at)
+        TRACER.observe("rag.query", time.perf_counter() - start)
+
+def get_rag_pipeline(folder_path: str, persist_dir: str = "chroma_test_db", k: int = 2,
+                     env_path: str = "myenv/.env", incremental: bool = True,
+                     loader_workers: int = os.cpu_count() or 1, query_cache_size: int = 1024,
+                     backend: str = "chroma", retrieval_mode: str = "vector",
+                     response_cache: Optional[SemanticResponseCache] = None, llm=None,
+                     pdf_mode: str = "document", clip_backend: str = "torch",
+                     clip_threads: Optional[int] = None, watch: bool = False,
+                     watch_interval_s: float = 2.0, dedup: bool = False,
+                     session_store: Optional[SessionStore] = None, session_id: str = "default") -> RAGPipeline:
+    """
+    Initialize a RAG-with-images pipeline with chat history.
+    retrieval_mode: "vector" (CLIP only) or "hybrid" (BM25 + CLIP, reciprocal-rank fused).
+    response_cache: optional SemanticResponseCache in front of the LLM call.
+    llm: chat model to answer with (defaults to Gemini; benchmarks pass an offline stand-in).
+    pdf_mode: "document" (one doc per PDF) or "page" (per-page docs + embedded images).
+    clip_backend / clip_threads: CLIP inference engine and its CPU thread count.
+    watch: keep ingesting folder changes in the background and hot-swap the index
+    (the index then lives in persist_dir/generations/, see Index_Watcher).
+    dedup: index near-identical images / text once, recording every source path.
+    session_store / session_id: where chat history lives (default: bounded, in-memory).
+    """
+    chat_memory = ChatMemory(session_id, session_store)
+    image_cache = ImageDerivativeCache(os.path.join(persist_dir, "image_cache"))
+    query_cache = QueryEmbeddingCache(
+        max_entries=query_cache_size,
+        persist_path=os.path.join(persist_dir, "query_cache.sqlite"),
+    )
+
+    hybrid = retrieval_mode == "hybrid"
+
+    def build(index_dir: str) -> CLIPVectorStoreHandler:
+        return build_index(folder_path, index_dir, incremental=incremental, loader_workers=loader_workers,
+                           backend=backend, hybrid=hybrid, image_cache=image_cache, pdf_mode=pdf_mode,
+                           clip_backend=clip_backend, clip_threads=clip_threads, query_cache=query_cache,
+                           dedup=dedup)
+
+    def make_retriever(handler: CLIPVectorStoreHandler):
+        return handler.get_hybrid_retriever(k=k) if hybrid else handler.get_retriever(k=k)
+
+    generations = IndexGenerations(persist_dir) if watch else None
+    index_dir = (generations.current() or generations.create()) if watch else persist_dir
+    snapshot = snapshot_folder(folder_path) if watch else None
+    handler = build(index_dir)
+    if watch:
+        generations.publish(index_dir)
+
+    # LLM
+    if llm is None:
+        llm = load_llm(env_path)
+
+    pipeline = RAGPipeline(make_retriever(handler), llm, chat_memory, image_cache=image_cache, handler=handler,
+                           response_cache=response_cache)
+    if watch:
+        pipeline.watcher = IndexWatcher(
+            folder_path, generations, build=build,
+            publish=lambda new_handler: pipeline.swap_index(new_handler, make_retriever(new_handler)),
+            current_handler=handler, snapshot=snapshot, poll_interval_s=watch_interval_s,
+        ).start()
+    return pipeline
 
 # ---------------- Example Usage ----------------
 if __name__ == "__main__":
-    folder = r"Z:\Genai_Projects\Multimodal_Assistant\Knowledge_Base"
-    rag_pipeline = get_rag_pipeline(folder_path=folder)
-    handle=CLIPVectorStoreHandler()
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.getenv("KNOWLEDGE_BASE_DIR", "Knowledge_Base")
+    # The conversation survives restarts: SESSION_ID picks which one to resume
+    session_store = SessionStore(os.path.join("chroma_test_db", "sessions.sqlite"))
+    rag_pipeline = get_rag_pipeline(folder_path=folder, watch=os.getenv("KNOWLEDGE_BASE_WATCH", "0") == "1",
+                                    dedup=os.getenv("KNOWLEDGE_BASE_DEDUP", "0") == "1",
+                                    session_store=session_store, session_id=os.getenv("SESSION_ID", "default"))
+    print(startup_report())
 
     while True:
         user_query = input("\nYou: ")
         if user_query.lower() in ["exit", "quit"]:
-            handle.unload_vectorstore()
+            rag_pipeline.close()
+            session_store.close()
             print("exiting....")
             break
-        answer = rag_pipeline(user_query)
-        print("\nAssistant:", answer.content if hasattr(answer, "content") else answer)
+        print("\nAssistant: ", end="", flush=True)
+        for token in rag_pipeline.stream(user_query):
+            print(token, end="", flush=True)
+        print(f"\n[time to first token: {rag_pipeline.last_metrics['ttft_s']:.2f}s]")
@@ -0,0 +1,73 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# ---------------- Startup Instrumentation ----------------
+STARTUP_TIMINGS: Dict[str, float] = {}
+
+
+@contextmanager
+def timed(stage: str):
+    """Accumulate wall-clock seconds spent in `stage` into STARTUP_TIMINGS."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS[stage] = STARTUP_TIMINGS.get(stage, 0.0) + time.perf_counter() - start
+
+
+def startup_report() -> str:
+    lines = [f"{stage:<40} {seconds:8.2f}s" for stage, seconds in STARTUP_TIMINGS.items()]
+    return "\n".join(["--- Startup timings ---"] + lines)
+
+
+# ---------------- Process-Wide Model Registry ----------------
+# Heavy libraries (torch, transformers, langchain_google_genai) are imported on first use only.
+_models: Dict[tuple, object] = {}
+_lock = threading.Lock()
+
+
+def get_clip(model_name: str = "openai/clip-vit-base-patch32", device: Optional[str] = "cpu") -> Tuple[object, object]:
+    """(CLIPModel, CLIPProcessor), loaded at most once per process per (name, device). device=None picks CUDA if present."""
+    if not device or device == "auto":
+        import torch
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    key = ("clip", model_name, device)
+    with _lock:
+        if key not in _models:
+            with timed(f"load CLIP {model_name} ({device})"):
+                from transformers import CLIPModel, CLIPProcessor
+                model = CLIPModel.from_pretrained(model_name).to(device)
+                model.eval()
+                processor = CLIPProcessor.from_pretrained(model_name)
+            _models[key] = (model, processor)
+        return _models[key]
+
+
+def get_llm(model: str = "gemini-1.5-flash", temperature: float = 0, env_path: str = "myenv/.env"):
+    """Shared Gemini chat model, created on first use."""
+    key = ("llm", model, temperature)
+    with _lock:
+        if key not in _models:
+            with timed(f"load LLM {model}"):
+                from dotenv import load_dotenv
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                load_dotenv(env_path)
+                _models[key] = ChatGoogleGenerativeAI(model=model, temperature=temperature)
+        return _models[key]
+
+
+def get_shared(key: tuple, factory: Callable[[], object]) -> object:
+    """Any other heavy object (e.g. a CLIP inference engine), built once per process per key."""
+    with _lock:
+        if key in _models:
+            return _models[key]
+    obj = factory()  # outside the lock: factories call get_clip themselves
+    with _lock:
+        return _models.setdefault(key, obj)
+
+
+def loaded_models() -> list:
+    with _lock:
+        return list(_models)
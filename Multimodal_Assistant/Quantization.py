@@ -0,0 +1,132 @@
+import numpy as np
+
+
+# ----------- Scalar int8 Quantizer -----------
+class Int8Quantizer:
+    """Per-dimension symmetric int8 codes: 4x smaller than float32."""
+    kind = "int8"
+
+    def __init__(self):
+        self.scale = None
+
+    @property
+    def trained(self) -> bool:
+        return self.scale is not None
+
+    def code_size(self, dim: int) -> int:
+        return dim
+
+    @property
+    def code_dtype(self):
+        return np.int8
+
+    def train(self, vectors: np.ndarray):
+        absmax = np.abs(vectors).max(axis=0)
+        self.scale = (np.maximum(absmax, 1e-8) / 127.0).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+    def prepare_query(self, query: np.ndarray) -> np.ndarray:
+        # Fold the scale into the query once instead of dequantizing every row
+        return (query * self.scale).astype(np.float32)
+
+    def scores(self, codes: np.ndarray, prepared_query: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) @ prepared_query
+
+    def state(self) -> dict:
+        return {"scale": self.scale}
+
+    def load_state(self, state):
+        self.scale = state["scale"]
+
+
+# ----------- Product Quantizer -----------
+def _kmeans(x: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        distances = (
+            (x * x).sum(axis=1)[:, None]
+            - 2.0 * (x @ centroids.T)
+            + (centroids * centroids).sum(axis=1)[None, :]
+        )
+        assign = distances.argmin(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class ProductQuantizer:
+    """
+    Splits each vector into `n_subspaces` slices and stores one uint8 centroid id
+    per slice (512-d float32 -> 64 bytes with the defaults). Scoring uses
+    asymmetric distance: a per-query lookup table of slice dot products.
+    """
+    kind = "pq"
+
+    def __init__(self, n_subspaces: int = 64, n_centroids: int = 256, iterations: int = 20,
+                 max_train_rows: int = 65536, seed: int = 0):
+        if n_centroids > 256:
+            raise ValueError("n_centroids must fit in a uint8 code (<= 256)")
+        self.n_subspaces = n_subspaces
+        self.n_centroids = n_centroids
+        self.iterations = iterations
+        self.max_train_rows = max_train_rows
+        self.seed = seed
+        self.codebooks = None  # (n_subspaces, n_centroids, sub_dim)
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    def code_size(self, dim: int) -> int:
+        return self.n_subspaces
+
+    @property
+    def code_dtype(self):
+        return np.uint8
+
+    def _slices(self, vectors: np.ndarray) -> np.ndarray:
+        n, dim = vectors.shape
+        if dim % self.n_subspaces:
+            raise ValueError(f"dim {dim} is not divisible by n_subspaces {self.n_subspaces}")
+        return vectors.reshape(n, self.n_subspaces, dim // self.n_subspaces)
+
+    def train(self, vectors: np.ndarray):
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > self.max_train_rows:
+            vectors = vectors[rng.choice(len(vectors), size=self.max_train_rows, replace=False)]
+        slices = self._slices(vectors)
+        k = min(self.n_centroids, len(vectors))
+        self.codebooks = np.stack([
+            _kmeans(slices[:, m, :], k, self.iterations, rng) for m in range(self.n_subspaces)
+        ]).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        slices = self._slices(vectors)
+        codes = np.empty((len(vectors), self.n_subspaces), dtype=np.uint8)
+        for m in range(self.n_subspaces):
+            sub, books = slices[:, m, :], self.codebooks[m]
+            distances = (books * books).sum(axis=1)[None, :] - 2.0 * (sub @ books.T)
+            codes[:, m] = distances.argmin(axis=1)
+        return codes
+
+    def prepare_query(self, query: np.ndarray) -> np.ndarray:
+        sub = query.reshape(self.n_subspaces, -1)
+        return np.einsum("mcd,md->mc", self.codebooks, sub).astype(np.float32)  # (m, centroids)
+
+    def scores(self, codes: np.ndarray, prepared_query: np.ndarray) -> np.ndarray:
+        return prepared_query[np.arange(self.n_subspaces)[None, :], codes].sum(axis=1)
+
+    def state(self) -> dict:
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, state):
+        self.codebooks = state["codebooks"]
+        self.n_subspaces, self.n_centroids = self.codebooks.shape[:2]
+
+
+QUANTIZERS = {"int8": Int8Quantizer, "pq": ProductQuantizer}
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+from Dedup import normalize_text
+
+
+class _Entry(NamedTuple):
+    exact_key: str
+    query_text: str
+    vector: np.ndarray
+    answer: Any
+    created: float
+
+
+# ---------------- Semantic Response Cache ----------------
+class SemanticResponseCache:
+    """
+    Answer cache placed in front of the LLM call.
+
+    An entry is reused only when the retrieved chunk ids and the conversation
+    history sent to the LLM are identical (exact key) AND the query embedding
+    is within `similarity_threshold` cosine of the cached one. CLIP's text tower
+    puts questions that differ in one number or a "not" above 0.95, hence the
+    high default; require_same_text=True also demands the same normalized query
+    text (case, spacing and punctuation ignored). Entries expire after
+    `ttl_seconds`, the oldest are evicted past `max_entries`, and everything is
+    dropped when the index version changes.
+    """
+    def __init__(self, similarity_threshold: float = 0.98, ttl_seconds: float = 3600.0,
+                 max_entries: int = 1000, require_same_text: bool = False):
+        self.similarity_threshold = similarity_threshold
+        self.require_same_text = require_same_text
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._by_key: Dict[str, List[int]] = {}
+        self._next_id = 0
+        self._index_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def exact_key(doc_ids: Iterable[str], chat_history: str) -> str:
+        digest = hashlib.sha256()
+        for doc_id in sorted(doc_ids):
+            digest.update(doc_id.encode("utf-8") + b"\x1f")
+        digest.update(b"\x1e" + chat_history.encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _check_version(self, index_version):
+        if index_version != self._index_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._by_key.clear()
+            self._index_version = index_version
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        ids = self._by_key.get(entry.exact_key, [])
+        if entry_id in ids:
+            ids.remove(entry_id)
+        if not ids:
+            self._by_key.pop(entry.exact_key, None)
+
+    def lookup(self, query_vector, doc_ids: Iterable[str], chat_history: str, index_version=0,
+               query_text: str = "") -> Optional[Any]:
+        key = self.exact_key(doc_ids, chat_history)
+        query = self._normalize(query_vector)
+        text = normalize_text(query_text)
+        now = time.time()
+        with self._lock:
+            self._check_version(index_version)
+            best_id, best_score = None, self.similarity_threshold
+            for entry_id in list(self._by_key.get(key, [])):
+                entry = self._entries[entry_id]
+                if now - entry.created > self.ttl_seconds:
+                    self._drop(entry_id)
+                    self.evictions += 1
+                    continue
+                if self.require_same_text and entry.query_text != text:
+                    continue
+                score = float(entry.vector @ query)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id].answer
+
+    def store(self, query_vector, doc_ids: Iterable[str], chat_history: str, answer: Any, index_version=0,
+              query_text: str = ""):
+        key = self.exact_key(doc_ids, chat_history)
+        with self._lock:
+            self._check_version(index_version)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(key, normalize_text(query_text), self._normalize(query_vector),
+                                             answer, time.time())
+            self._by_key.setdefault(key, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_key.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,227 @@
+import asyncio
+import contextvars
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional
+
+from langchain_core.messages import AIMessage
+
+from Context_Packer import ContextPacker
+from Embedding_Cache import QueryEmbeddingCache
+from Index_Watcher import IndexGenerations, IndexWatcher, snapshot_folder
+from Instrumentation import TRACER
+from Response_Cache import SemanticResponseCache
+from Image_Cache import ImageDerivativeCache
+from Main import (ChatMemory, build_index, chunk_text, load_llm, prepare_turn, response_cache_args,
+                  turn_metrics)
+from Session_Store import SessionStore, llm_summarizer
+
+
+# ---------------- Per-Session Pipeline ----------------
+class RAGSession:
+    """One user's conversation: isolated memory, shared index / models."""
+    def __init__(self, service: "RAGService", session_id: str):
+        self.service = service
+        self.session_id = session_id
+        self.chat_memory = ChatMemory(session_id, service.session_store)
+        self.last_metrics: dict = {}
+
+    async def _messages(self, query: str):
+        service = self.service
+        loop = asyncio.get_running_loop()
+
+        # One index generation per query, even if the watcher swaps mid-request
+        handler, retriever = service.index
+
+        # CLIP query embedding + vector search and image loading are blocking: run them off the loop.
+        # The copied context keeps the step spans under this query's span.
+        prepared = await loop.run_in_executor(service.executor, contextvars.copy_context().run, prepare_turn,
+                                              query, retriever, self.chat_memory, service.image_cache,
+                                              service.packer)
+
+        cached, cache_args = None, None
+        if service.response_cache is not None:
+            # Query embedding is a query-cache hit here: retrieval just computed it
+            cache_args = await loop.run_in_executor(service.executor, response_cache_args, query, prepared, handler)
+            cached = service.response_cache.lookup(**cache_args)
+        return prepared["messages"], cached, cache_args
+
+    async def astream(self, query: str) -> AsyncIterator[str]:
+        """Yield answer text as it arrives; records time-to-first-token in last_metrics."""
+        # No span may stay open across a yield, so the LLM stream is timed by hand
+        start = time.perf_counter()
+        messages, cached, cache_args = await self._messages(query)
+        if cached is not None:
+            parts = [chunk_text(cached)]
+            first_token_at = time.perf_counter()
+            yield parts[0]
+        else:
+            parts = []
+            first_token_at = None
+            async with self.service.llm_slots:
+                llm_start = time.perf_counter()
+                async for chunk in self.service.llm.astream(messages):
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    text = chunk_text(chunk)
+                    parts.append(text)
+                    yield text
+                TRACER.observe("rag.llm", time.perf_counter() - llm_start)
+            if cache_args is not None:
+                self.service.response_cache.store(answer=AIMessage(content="".join(parts)), **cache_args)
+        # sqlite write (and maybe a compaction hand-off): keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(self.service.executor, self.chat_memory.add,
+                                                         query, "".join(parts))
+        self.last_metrics = turn_metrics(start, first_token_at, cached is not None)
+        TRACER.observe("rag.query", time.perf_counter() - start)
+
+    async def ask(self, query: str):
+        service = self.service
+        start = time.perf_counter()
+        with TRACER.span("rag.query", mode="serve"):
+            messages, result, cache_args = await self._messages(query)
+            cache_hit = result is not None
+
+            if not cache_hit:
+                async with service.llm_slots:
+                    with TRACER.span("rag.llm"):
+                        result = await service.llm.ainvoke(messages)
+                if cache_args is not None:
+                    service.response_cache.store(answer=result, **cache_args)
+
+            answer_text = result.content if hasattr(result, "content") else str(result)
+            await asyncio.get_running_loop().run_in_executor(service.executor, self.chat_memory.add,
+                                                             query, answer_text)
+            self.last_metrics = turn_metrics(start, cache_hit=cache_hit)
+        return result
+
+
+# ---------------- Service ----------------
+class RAGService:
+    """
+    Builds the index, CLIP model and LLM once and serves many sessions concurrently.
+    LLM calls are capped by `max_concurrent_llm`; blocking work runs on a thread pool.
+    watch=True keeps ingesting folder changes in the background and hot-swaps the index.
+    Chat history lives in `session_store` (default: sqlite in persist_dir, TTL-evicted,
+    older turns summarized by the LLM when compact_history=True), so it survives restarts.
+    """
+    def __init__(self, folder_path: str, persist_dir: str = "chroma_test_db", k: int = 2,
+                 env_path: str = "myenv/.env", max_concurrent_llm: int = 8,
+                 max_workers: Optional[int] = None,
+                 response_cache: Optional[SemanticResponseCache] = None, watch: bool = False,
+                 watch_interval_s: float = 2.0, session_store: Optional[SessionStore] = None,
+                 compact_history: bool = False, max_sessions: int = 10000, **index_kwargs):
+        self.folder_path = folder_path
+        self.persist_dir = persist_dir
+        self.k = k
+        self.env_path = env_path
+        self.index_kwargs = index_kwargs
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or min(32, (os.cpu_count() or 1) + 4))
+        self.llm_slots = asyncio.Semaphore(max_concurrent_llm)
+        self.sessions: "OrderedDict[str, RAGSession]" = OrderedDict()
+        self.max_sessions = max_sessions
+        self._owns_session_store = session_store is None
+        self.session_store = session_store or SessionStore(
+            os.path.join(persist_dir, "sessions.sqlite"), max_sessions=max_sessions,
+            summarize=self._summarize if compact_history else None,
+        )
+        self.image_cache = ImageDerivativeCache(os.path.join(persist_dir, "image_cache"))
+        self.packer = ContextPacker()
+        self.response_cache = response_cache  # shared: its key includes each session's history
+        self.query_cache = QueryEmbeddingCache(max_entries=index_kwargs.get("query_cache_size", 1024),
+                                               persist_path=os.path.join(persist_dir, "query_cache.sqlite"))
+        self.watch = watch
+        self.watch_interval_s = watch_interval_s
+        self.watcher: Optional[IndexWatcher] = None
+        self.index = (None, None)  # (handler, retriever), swapped as one reference
+        self.llm = None
+
+    def _build(self, index_dir: str):
+        return build_index(self.folder_path, index_dir, image_cache=self.image_cache,
+                           query_cache=self.query_cache, **self.index_kwargs)
+
+    def _make_retriever(self, handler):
+        if handler.bm25 is not None:
+            return handler.get_hybrid_retriever(k=self.k)
+        return handler.get_retriever(k=self.k)
+
+    def swap_index(self, handler):
+        """Serve from a new index generation; requests already running finish on the old one."""
+        retriever = self._make_retriever(handler)
+        if self.handler is not None:
+            handler.index_version = max(handler.index_version, self.handler.index_version + 1)
+        self.index = (handler, retriever)
+
+    @property
+    def handler(self):
+        return self.index[0]
+
+    @property
+    def retriever(self):
+        return self.index[1]
+
+    async def start(self):
+        """Sync the index and load models once, without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        generations = IndexGenerations(self.persist_dir) if self.watch else None
+        index_dir = (generations.current() or generations.create()) if self.watch else self.persist_dir
+        snapshot = await loop.run_in_executor(self.executor, snapshot_folder, self.folder_path) if self.watch else None
+        handler = await loop.run_in_executor(self.executor, self._build, index_dir)
+        self.swap_index(handler)
+        if self.watch:
+            generations.publish(index_dir)
+            # Ingest runs on the watcher's own thread, never on the request executor
+            self.watcher = IndexWatcher(self.folder_path, generations, build=self._build, publish=self.swap_index,
+                                        current_handler=handler, snapshot=snapshot,
+                                        poll_interval_s=self.watch_interval_s).start()
+        self.llm = await loop.run_in_executor(self.executor, load_llm, self.env_path)
+        return self
+
+    def _summarize(self, previous: str, turns):
+        return llm_summarizer(self.llm)(previous, turns)
+
+    def session(self, session_id: str) -> RAGSession:
+        """Session handle; its history is reloaded from the store, so handles can be dropped freely."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = RAGSession(self, session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        self.sessions.move_to_end(session_id)
+        return session
+
+    def end_session(self, session_id: str):
+        """Forget the conversation in every tier."""
+        self.sessions.pop(session_id, None)
+        self.session_store.drop(session_id)
+
+    async def ask(self, session_id: str, query: str):
+        return await self.session(session_id).ask(query)
+
+    async def close(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.handler is not None:
+            self.handler.unload_vectorstore()
+        if self._owns_session_store:
+            self.session_store.close()
+        self.executor.shutdown(wait=False)
+
+
+# ---------------- Example Usage ----------------
+async def _demo(folder: str):
+    service = await RAGService(folder_path=folder).start()
+    questions = ["what are the types of retrievers", "who is chris", "summarize the knowledge base"]
+    answers = await asyncio.gather(*(
+        service.ask(f"user-{i}", q) for i, q in enumerate(questions)
+    ))
+    for q, a in zip(questions, answers):
+        print(f"\nQ: {q}\nA: {a.content if hasattr(a, 'content') else a}")
+    await service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_demo(sys.argv[1] if len(sys.argv) > 1 else os.getenv("KNOWLEDGE_BASE_DIR", "Knowledge_Base")))
@@ -0,0 +1,238 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+# summarize(previous_summary, old_turns) -> new summary
+Summarizer = Callable[[str, List[str]], str]
+
+
+class _Session:
+    __slots__ = ("turns", "summary", "pending", "next_seq", "last_active", "compacting")
+
+    def __init__(self, max_turns: int, summary: str = "", next_seq: int = 0, last_active: float = 0.0):
+        self.turns: "deque[Tuple[int, str]]" = deque(maxlen=max_turns)
+        self.summary = summary
+        self.pending: List[Tuple[int, str]] = []  # turns pushed out of the ring, waiting for compaction
+        self.next_seq = next_seq
+        self.last_active = last_active
+        self.compacting = False
+
+
+# ---------------- Session Store ----------------
+class SessionStore:
+    """
+    Bounded chat history per session id.
+    - memory tier: a ring buffer of the last `max_turns` turns per session, so appends
+      and history reads cost O(max_turns) however long the conversation runs; at most
+      `max_sessions` sessions stay in memory (least recently written are dropped)
+    - durable tier (when `path` is set): sqlite rows keyed by (session id, seq);
+      sessions reload lazily after a restart and only their tail is kept on disk
+    - sessions with no new turn for `ttl_seconds` are evicted from both tiers
+    - with `summarize`, turns leaving the ring are folded into a running summary on
+      a background thread every `compact_every` turns; the summary leads the history
+    """
+    SWEEP_EVERY = 100  # appends between TTL sweeps
+
+    def __init__(self, path: Optional[str] = None, max_turns: int = 20, ttl_seconds: float = 7 * 24 * 3600,
+                 max_sessions: int = 10000, summarize: Optional[Summarizer] = None, compact_every: int = 10):
+        self.max_turns = max(1, max_turns)
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max(1, max_sessions)
+        self.summarize = summarize
+        self.compact_every = max(1, compact_every)
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._appends = 0
+        self.evictions = 0
+        self.compactions = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-compact") if summarize else None
+
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY, summary TEXT NOT NULL DEFAULT '',
+                    next_seq INTEGER NOT NULL DEFAULT 0, last_active REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active);
+                CREATE TABLE IF NOT EXISTS turns (
+                    session_id TEXT NOT NULL, seq INTEGER NOT NULL, text TEXT NOT NULL,
+                    PRIMARY KEY (session_id, seq));
+            """)
+            self._db.commit()
+
+    # ---------- Memory tier ----------
+    def _load(self, session_id: str, now: float) -> Optional[_Session]:
+        """Session from memory, else from sqlite (None if unknown or expired). Caller holds the lock."""
+        session = self._sessions.get(session_id)
+        if session is not None or self._db is None:
+            return session
+        row = self._db.execute(
+            "SELECT summary, next_seq, last_active FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None or now - row[2] > self.ttl_seconds:
+            return None
+        session = _Session(self.max_turns, summary=row[0], next_seq=row[1], last_active=row[2])
+        rows = self._db.execute(
+            "SELECT seq, text FROM turns WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        split = max(0, len(rows) - self.max_turns)
+        session.pending = [tuple(r) for r in rows[:split]] if self.summarize else []
+        session.turns.extend(tuple(r) for r in rows[split:])
+        self._remember(session_id, session)
+        return session
+
+    def _remember(self, session_id: str, session: _Session):
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)  # still on disk when durable
+            self.evictions += 1
+
+    # ---------- API ----------
+    def append(self, session_id: str, text: str):
+        now = time.time()
+        batch = None
+        with self._lock:
+            session = self._load(session_id, now) or _Session(self.max_turns)
+            seq = session.next_seq
+            session.next_seq += 1
+            if len(session.turns) == self.max_turns and self.summarize:
+                session.pending.append(session.turns[0])
+            session.turns.append((seq, text))
+            session.last_active = now
+            self._remember(session_id, session)
+
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO turns (session_id, seq, text) VALUES (?, ?, ?)",
+                                 (session_id, seq, text))
+                self._db.execute(
+                    "INSERT INTO sessions (id, summary, next_seq, last_active) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET next_seq = excluded.next_seq, last_active = excluded.last_active",
+                    (session_id, session.summary, session.next_seq, now),
+                )
+                if not self.summarize:
+                    # Nothing will read turns that left the ring: keep disk bounded too
+                    self._db.execute("DELETE FROM turns WHERE session_id = ? AND seq <= ?",
+                                     (session_id, seq - self.max_turns))
+                self._db.commit()
+
+            if self.summarize and len(session.pending) >= self.compact_every and not session.compacting:
+                session.compacting = True
+                batch = list(session.pending)
+
+            self._appends += 1
+            if self._appends % self.SWEEP_EVERY == 0:
+                self._expire(now)
+
+        if batch:
+            self._executor.submit(self._compact, session_id, batch)
+
+    def history(self, session_id: str) -> List[str]:
+        """Summary of compacted turns (if any) followed by the turns in the ring, oldest first."""
+        with self._lock:
+            session = self._load(session_id, time.time())
+            if session is None:
+                return []
+            turns = [text for _seq, text in session.turns]
+            summary = session.summary
+        return ([f"Summary of earlier conversation: {summary}"] if summary else []) + turns
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+                self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self._db.commit()
+
+    # ---------- Eviction / compaction ----------
+    def _expire(self, now: float):
+        """Drop sessions idle past the TTL. Caller holds the lock."""
+        cutoff = now - self.ttl_seconds
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_active < cutoff]:
+            del self._sessions[session_id]
+            self.evictions += 1
+        if self._db is not None:
+            expired = [r[0] for r in self._db.execute("SELECT id FROM sessions WHERE last_active < ?", (cutoff,))]
+            self._db.executemany("DELETE FROM turns WHERE session_id = ?", [(s,) for s in expired])
+            self._db.executemany("DELETE FROM sessions WHERE id = ?", [(s,) for s in expired])
+            self._db.commit()
+
+    def evict_expired(self):
+        with self._lock:
+            self._expire(time.time())
+
+    def _compact(self, session_id: str, batch: List[Tuple[int, str]]):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            previous = session.summary if session is not None else ""
+            if session is None and self._db is not None:
+                row = self._db.execute("SELECT summary FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                previous = row[0] if row else ""
+        try:
+            summary = self.summarize(previous, [text for _seq, text in batch])
+        except Exception as e:
+            print(f"⚠️ Session compaction failed for '{session_id}': {e}")
+            with self._lock:
+                if session is not None:
+                    session.compacting = False
+            return
+
+        last_seq = batch[-1][0]
+        backlog = None
+        with self._lock:
+            if session is not None:
+                session.summary = summary
+                session.pending = [t for t in session.pending if t[0] > last_seq]
+                if len(session.pending) >= self.compact_every:
+                    backlog = list(session.pending)  # turns that arrived while summarizing
+                else:
+                    session.compacting = False
+            if self._db is not None:
+                self._db.execute("UPDATE sessions SET summary = ? WHERE id = ?", (summary, session_id))
+                self._db.execute("DELETE FROM turns WHERE session_id = ? AND seq <= ?", (session_id, last_seq))
+                self._db.commit()
+            self.compactions += 1
+        if backlog:
+            try:
+                self._executor.submit(self._compact, session_id, backlog)
+            except RuntimeError:  # store closing; the turns stay pending on disk
+                session.compacting = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions_in_memory": len(self._sessions),
+                "turns_in_memory": sum(len(s.turns) + len(s.pending) for s in self._sessions.values()),
+                "evictions": self.evictions,
+                "compactions": self.compactions,
+            }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def llm_summarizer(llm, max_words: int = 120) -> Summarizer:
+    """Summarizer that asks a chat model to fold old turns into the running summary."""
+    def summarize(previous: str, turns: List[str]) -> str:
+        prompt = (
+            f"Update the summary of a conversation between a user and an assistant in at most {max_words} words. "
+            "Keep names, facts and open questions.\n\n"
+            f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n" + "\n".join(turns) + "\n\nUpdated summary:"
+        )
+        result = llm.invoke(prompt)
+        return (result.content if hasattr(result, "content") else str(result)).strip()
+    return summarize
@@ -1,6 +1,4 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from dotenv import load_dotenv
-from transformers import CLIPProcessor, CLIPModel
+from Model_Registry import get_clip, get_llm
 
 
 class MultimodalWrapper:
@@ -9,17 +7,21 @@ class MultimodalWrapper:
                  clip_model="openai/clip-vit-base-patch32"):
         """
         Wrapper for Gemini (LLM) and CLIP (embedder).
+        Both come from the shared model registry and load on first access.
         """
-        # Load environment variables
-        load_dotenv(env_path)
+        self.env_path = env_path
+        self.llm_model = llm_model
+        self.clip_model_name = clip_model
 
-        # Initialize Gemini LLM
-        self.llm = ChatGoogleGenerativeAI(
-            model=llm_model,
-            temperature=0
-        )
+    @property
+    def llm(self):
+        # Initialize Gemini LLM (loads environment variables first)
+        return get_llm(self.llm_model, temperature=0, env_path=self.env_path)
 
-        # Initialize CLIP model + processor
-        self.clip_model = CLIPModel.from_pretrained(clip_model)
-        self.clip_processor = CLIPProcessor.from_pretrained(clip_model)
+    @property
+    def clip_model(self):
+        return get_clip(self.clip_model_name)[0]
 
+    @property
+    def clip_processor(self):
+        return get_clip(self.clip_model_name)[1]
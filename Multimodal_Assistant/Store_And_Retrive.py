@@ -1,25 +1,91 @@
 from langchain_chroma import Chroma
 from langchain.docstore.document import Document
 from langchain_core.embeddings import Embeddings
-from typing import List
-import torch
-from transformers import CLIPProcessor, CLIPModel
-from Loader import Loader
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from itertools import islice
+import json
+import numpy as np
+from Loader import FATAL_STAGES, Loader
 from Text_splitter import split_documents
+from Index_Manifest import IndexManifest, chunk_id, file_sha256
+from Embedding_Cache import QueryEmbeddingCache
+from Vector_Index import MmapVectorStore
+from Clip_Backends import BACKENDS as CLIP_BACKENDS, get_engine, resolve_device
+from Hybrid_Retriever import BM25Index, HybridRetriever
+from Dedup import DedupIndex, dhash
+from Instrumentation import TRACER
 from PIL import Image
 import os
+import sys
 
 
 # ----------- Custom CLIP Embeddings Wrapper -----------
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".webp")
+
+
 class CLIPEmbeddings(Embeddings):
-    def __init__(self, model_name="openai/clip-vit-base-patch32", device="cpu"):
-        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = CLIPModel.from_pretrained(model_name).to(self.device)
-        self.processor = CLIPProcessor.from_pretrained(model_name)
+    def __init__(self, model_name="openai/clip-vit-base-patch32", device: Optional[str] = None, batch_size: int = 32,
+                 query_cache: Optional[QueryEmbeddingCache] = None, backend: str = "torch",
+                 intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None,
+                 onnx_dir: Optional[str] = None):
+        """
+        device: None picks CUDA when available, else CPU (resolved on first use).
+        backend: "torch" (fp32), "torch-int8" (dynamic int8), "onnx" or "onnx-int8" (ONNX Runtime).
+        Vector spaces differ slightly between backends: sync_directory re-embeds an index
+        built with another one (see the drift report in Benchmarks for how much).
+        """
+        if backend not in CLIP_BACKENDS:
+            raise ValueError(f"Unknown CLIP backend '{backend}', expected one of {CLIP_BACKENDS}")
+        self._device = device
+        self.model_name = model_name
+        self.batch_size = max(1, int(batch_size))
+        self.query_cache = query_cache
+        self.backend = backend
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.onnx_dir = onnx_dir
 
-    def embed_documents(self, docs):
-        embeddings = []
-        for doc in docs:
+    @property
+    def cache_namespace(self) -> str:
+        """Query-cache key prefix: vectors from another model or backend must never be reused."""
+        return f"{self.model_name}@{self.backend}"
+
+    @property
+    def device(self) -> str:
+        return resolve_device(self._device)
+
+    # The engine is built from the shared registry on first use, so an unchanged index never loads CLIP
+    @property
+    def engine(self):
+        return get_engine(self.backend, self.model_name, self._device, self.intra_op_threads,
+                          self.inter_op_threads, self.onnx_dir)
+
+    @staticmethod
+    def _image_path(content: str, source: str) -> Optional[str]:
+        """Return the image file a doc refers to, or None for text."""
+        if source.lower().endswith(IMAGE_EXTENSIONS):
+            return source
+        # Chroma hands us page_content strings only; image docs carry their path there
+        candidate = content.strip()
+        if candidate.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(candidate):
+            return candidate
+        return None
+
+    def _text_features(self, texts: List[str]) -> np.ndarray:
+        return self.engine.text_features(texts)
+
+    def _image_features(self, paths: List[str]) -> np.ndarray:
+        images = [Image.open(p).convert("RGB") for p in paths]
+        return self.engine.image_features(images)
+
+    def embed_documents_array(self, docs) -> np.ndarray:
+        """
+        Embed texts and images in batches of `batch_size`.
+        Returns a contiguous (len(docs), dim) float32 matrix in input order.
+        """
+        text_rows, texts = [], []
+        image_rows, image_paths = [], []
+        for row, doc in enumerate(docs):
             # Determine if doc is a Document or string
             if isinstance(doc, Document):
                 content = doc.page_content
@@ -28,91 +94,483 @@ class CLIPEmbeddings(Embeddings):
                 content = doc
                 source = ""
 
-            if source.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".webp")):
-                image = Image.open(source).convert("RGB")
-                inputs = self.processor(images=image, return_tensors="pt").to(self.device)
-                with torch.no_grad():
-                    emb = self.model.get_image_features(**inputs)
-                embeddings.append(emb.cpu().numpy()[0].tolist())
+            image_path = self._image_path(content, source)
+            if image_path:
+                image_rows.append(row)
+                image_paths.append(image_path)
             else:
-                inputs = self.processor(
-                    text=[content], return_tensors="pt", padding=True, truncation=True
-                ).to(self.device)
-                with torch.no_grad():
-                    emb = self.model.get_text_features(**inputs)
-                embeddings.append(emb.cpu().numpy()[0].tolist())
+                text_rows.append(row)
+                texts.append(content)
+
+        with TRACER.span("clip.embed_documents", texts=len(texts), images=len(image_paths)):
+            dim = self.engine.projection_dim
+            out = np.empty((len(text_rows) + len(image_rows), dim), dtype=np.float32)
+
+            for start in range(0, len(texts), self.batch_size):
+                stop = start + self.batch_size
+                out[text_rows[start:stop]] = self._text_features(texts[start:stop])
+            for start in range(0, len(image_paths), self.batch_size):
+                stop = start + self.batch_size
+                out[image_rows[start:stop]] = self._image_features(image_paths[start:stop])
 
-        return embeddings
+        return out
 
+    def embed_documents(self, docs):
+        # Chroma expects lists; convert the whole matrix in one call
+        return self.embed_documents_array(docs).tolist()
 
     def embed_query(self, query: str):
         """
         Embed a query for retrieval. Handles both text and image paths.
         """
-        if os.path.exists(query) and query.lower().endswith(
-            (".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".webp")
-        ):
-            # Handle image input
-            image = Image.open(query).convert("RGB")
-            inputs = self.processor(images=image, return_tensors="pt").to(self.device)
-            with torch.no_grad():
-                embeddings = self.model.get_image_features(**inputs)
-            return embeddings.cpu().numpy()[0].tolist()
-        else:
-            # Handle text input
-            inputs = self.processor(
-                text=[query], return_tensors="pt", padding=True, truncation=True
-            ).to(self.device)
-            with torch.no_grad():
-                embeddings = self.model.get_text_features(**inputs)
-            return embeddings.cpu().numpy()[0].tolist()
+        # Only touch the filesystem when the query looks like an image path
+        is_image = query.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(query)
+
+        key = None
+        if self.query_cache is not None:
+            if is_image:
+                key = self.query_cache.image_key(query, self.cache_namespace)
+            else:
+                key = self.query_cache.text_key(query, self.cache_namespace)
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                TRACER.incr("query_embedding_cache_hits")
+                return cached.tolist()
+
+        with TRACER.span("clip.embed_query", image=is_image):
+            if is_image:
+                # Handle image input
+                vector = self._image_features([query])[0]
+            else:
+                # Handle text input
+                vector = self._text_features([query])[0]
+
+        if key is not None:
+            self.query_cache.put(key, vector)
+        return vector.tolist()
 
 
 # ----------- Vector Store Handler -----------
 class CLIPVectorStoreHandler:
-    def __init__(self, persist_directory: str = "chroma_db", model_name="openai/clip-vit-base-patch32"):
+    BACKENDS = ("chroma", "mmap")
+
+    def __init__(self, persist_directory: str = "chroma_db", model_name="openai/clip-vit-base-patch32",
+                 query_cache: Optional[QueryEmbeddingCache] = None, backend: str = "chroma",
+                 vector_dtype: str = "float32", quantization: str = "none", hybrid: bool = False,
+                 clip_backend: str = "torch", clip_threads: Optional[int] = None, dedup: bool = False):
         """
         Initialize the vector store handler with CLIP embeddings.
+        backend: "chroma" (default) or "mmap" (local memory-mapped NumPy index).
+        quantization: "none", "int8" or "pq" compressed codes (mmap backend only).
+        hybrid: also maintain an on-disk BM25 index for get_hybrid_retriever.
+        clip_backend / clip_threads: CLIP inference engine and its intra-op thread count.
+        dedup: collapse near-duplicate images / OCR / text chunks at sync time (see Dedup.py).
         """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {self.BACKENDS}")
+        if quantization != "none" and backend != "mmap":
+            raise ValueError("Quantized storage is only available with backend='mmap'")
         self.persist_directory = persist_directory
-        self.embedder = CLIPEmbeddings(model_name=model_name)  # embedder lives here
+        self.backend = backend
+        self.vector_dtype = vector_dtype
+        self.quantization = quantization
+        self.embedder = CLIPEmbeddings(model_name=model_name, query_cache=query_cache, backend=clip_backend,
+                                       intra_op_threads=clip_threads)  # embedder lives here
         self.vectorstore = None
+        self.index_version = 0  # bumped on every write so dependent caches can invalidate
+        self.bm25 = BM25Index(os.path.join(persist_directory, "bm25.sqlite")) if hybrid else None
+        self._dedup_path = os.path.join(persist_directory, "dedup_index.json")
+        self.dedup = DedupIndex(self._dedup_path) if dedup else None
+
+    def _open_store(self):
+        """Open (or create) the persisted store for the configured backend."""
+        if self.backend == "mmap":
+            return MmapVectorStore(
+                persist_directory=self.persist_directory,
+                embedding_function=self.embedder,
+                dtype=self.vector_dtype,
+                quantization=self.quantization,
+            )
+        return Chroma(
+            persist_directory=self.persist_directory,
+            embedding_function=self.embedder,
+        )
+
+    def _reset_store(self):
+        self.index_version += 1
+        if self.bm25 is not None:
+            self.bm25.reset()
+        if self.backend == "mmap":
+            self.vectorstore.reset()
+        else:
+            self.vectorstore.delete_collection()
+            self.vectorstore = self._open_store()
+
+    def _store_count(self) -> int:
+        if self.backend == "mmap":
+            return self.vectorstore.count()
+        return self.vectorstore._collection.count()
+
+    def _existing_ids(self, ids: List[str]) -> Set[str]:
+        if self.backend == "mmap":
+            return self.vectorstore.existing_ids(ids)
+        return set(self.vectorstore.get(ids=ids, include=[])["ids"])
+
+    @staticmethod
+    def _stored_id(doc: Document) -> str:
+        """chunk_id as sync_directory computes it: a standalone image's id covers its bytes, not just its path."""
+        meta = doc.metadata
+        if meta.get("type") == "image" and not meta.get("image_sha256"):
+            return chunk_id(doc, file_sha256(doc.page_content))
+        return chunk_id(doc)
+
+    def _new_only(self, documents: List[Document]) -> Tuple[List[Document], List[str]]:
+        """Drop chunks whose id is already stored (or repeated in the batch) before they reach CLIP."""
+        ids = [self._stored_id(doc) for doc in documents]
+        existing = self._existing_ids(ids)
+        kept, kept_ids = [], []
+        for doc, cid in zip(documents, ids):
+            if cid not in existing:
+                existing.add(cid)
+                kept.append(doc)
+                kept_ids.append(cid)
+        return kept, kept_ids
+
+    def _ensure_bm25_backfilled(self):
+        """Index chunks stored before hybrid mode was switched on (once; recorded in the BM25 DB)."""
+        if self.bm25 is None or self.bm25.backfilled:
+            return
+        if self._store_count() > 0:
+            self._backfill_bm25()
+        self.bm25.mark_backfilled()
 
     def store_documents(self, documents: List[Document]):
         """
-        Store documents in Chroma using CLIP embeddings.
+        Store documents in the vector store using CLIP embeddings.
         """
-        self.vectorstore = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embedder,
-            persist_directory=self.persist_directory,
-        )
-        print(f"Stored {len(documents)} documents in vector store at '{self.persist_directory}'.")
+        self.vectorstore = self._open_store()
+        self._ensure_bm25_backfilled()
+        documents, ids = self._new_only(documents)
+        with TRACER.span("ingest.store_batch", size=len(documents)):
+            if documents:
+                self.vectorstore.add_documents(documents, ids=ids)
+            if self.bm25 is not None:
+                self.bm25.add(ids, documents)
+        self.index_version += 1
+        print(f"Stored {len(documents)} new documents in vector store at '{self.persist_directory}'.")
+
+    def store_document_stream(self, documents: Iterable[Document], batch_size: int = 256) -> int:
+        """
+        Store an iterator of documents in fixed-size batches so memory stays
+        bounded by `batch_size` docs regardless of corpus size.
+        """
+        if self.vectorstore is None:
+            self.vectorstore = self._open_store()
+        self._ensure_bm25_backfilled()
+        iterator = iter(documents)
+        total = 0
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                break
+            batch, ids = self._new_only(batch)
+            if not batch:
+                continue
+            with TRACER.span("ingest.store_batch", size=len(batch)):
+                self.vectorstore.add_documents(batch, ids=ids)
+                if self.bm25 is not None:
+                    self.bm25.add(ids, batch)
+            total += len(batch)
+            self.index_version += 1
+        print(f"Streamed {total} new documents into vector store at '{self.persist_directory}'.")
+        return total
+
+    def sync_directory(self, folder_path: str, loader: Optional[Loader] = None,
+                       prepare: Optional[Callable[[List[Document]], None]] = None,
+                       chunk_size: int = 1000, chunk_overlap: int = 100) -> dict:
+        """
+        Incrementally index a folder: only new/changed chunks are embedded,
+        vectors of removed files or dropped chunks are deleted.
+        `prepare` can tweak loaded docs (e.g. metadata) before splitting.
+        """
+        loader = loader or Loader()
+        manifest = IndexManifest(os.path.join(self.persist_directory, "index_manifest.json"))
+        self.vectorstore = self._open_store()
+        if not manifest.exists() and self._store_count() > 0:
+            # Vectors written by a full rebuild have random ids we cannot track
+            self._reset_store()
+
+        dropped_assets: Set[str] = set()  # extracted PDF images that may no longer be referenced
+        # Vectors from another CLIP model / backend live in a different space: re-embed everything
+        embedding = {"clip_model": self.embedder.model_name, "clip_backend": self.embedder.backend}
+        previous = {**embedding, **manifest.settings}
+        if manifest.exists() and any(previous[key] != value for key, value in embedding.items()):
+            print(f"⚠️ Index was embedded with {previous['clip_model']} ({previous['clip_backend']}), "
+                  f"re-embedding with {embedding['clip_model']} ({embedding['clip_backend']})")
+            dropped_assets.update(manifest.referenced_assets())
+            self._reset_store()
+            manifest.files.clear()
+            if self.dedup is not None:
+                if os.path.exists(self._dedup_path):
+                    os.remove(self._dedup_path)
+                self.dedup = DedupIndex(self._dedup_path)
+        self._ensure_bm25_backfilled()  # before the deltas below, which assume BM25 mirrors the store
+
+        # Switching dedup on or off changes which chunks a file owns: pass every file through once
+        recheck_all = manifest.exists() and (self.dedup is not None) != os.path.exists(self._dedup_path)
+        if recheck_all and self.dedup is None:
+            os.remove(self._dedup_path)
+        # Page vs document mode (and image extraction) changes what every PDF yields
+        pdf_settings = {"pdf_mode": loader.pdf_mode, "pdf_images": bool(loader.pdf_image_dir)}
+        previous = {"pdf_mode": "document", "pdf_images": False, **manifest.settings}
+        recheck_pdfs = manifest.exists() and any(previous[key] != value for key, value in pdf_settings.items())
+
+        # duplicates: image files skipped before OCR (duplicate_files) plus chunks collapsed after splitting
+        stats = {"unchanged": 0, "changed": 0, "removed": 0, "failed": 0, "partial": 0,
+                 "duplicates": 0, "duplicate_files": 0, "added_chunks": 0, "deleted_chunks": 0}
+        current_files = loader.list_files(folder_path)
+
+        stale_ids: List[str] = []
+        removed = set(manifest.files) - set(current_files)
+        for source in removed:
+            dropped_assets.update(manifest.assets(source))
+            stale_ids.extend(manifest.remove(source))
+            stats["removed"] += 1
+
+        changed = {}
+        for source in current_files:
+            stat = os.stat(source)
+            recheck = recheck_all or (recheck_pdfs and loader.file_kind(source) == "pdf")
+            if manifest.is_unchanged(source, stat) and not recheck:
+                stats["unchanged"] += 1
+                continue
+            digest = file_sha256(source)
+            entry = manifest.get(source)
+            if entry and entry["sha256"] == digest and not recheck:
+                # Touched but not modified: refresh mtime only
+                manifest.update(source, stat, digest, entry["chunk_ids"])
+                stats["unchanged"] += 1
+                continue
+            changed[source] = (stat, digest)
+
+        touched: Set[str] = set()  # kept chunks whose duplicate_sources changed
+        if self.dedup is not None:
+            touched = self._dedup_before_load(loader, manifest, removed, changed, stale_ids, stats)
+
+        loader.failures = []
+        new_docs: List[Document] = []
+        new_ids: List[str] = []
+        for source, docs in loader.iter_files(changed):
+            stages = {f.stage for f in loader.failures if f.path == source}
+            if not docs or stages & set(FATAL_STAGES):
+                # Unreadable file: keep the old entry so it is retried next sync
+                stats["failed"] += 1
+                if self.dedup is not None:
+                    self._unregister_failed(source, manifest)
+                continue
+            if stages:
+                stats["partial"] += 1  # a page / image / OCR pass failed: index what was extracted
+            stat, digest = changed[source]
+            entry = manifest.get(source)
+            dropped_assets.update(manifest.assets(source))
+            dropped_assets.update(d.page_content for d in docs if d.metadata.get("image_sha256"))
+            if prepare:
+                prepare(docs)
+            chunks = split_documents(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            ids = [chunk_id(c, digest) for c in chunks]
+            if self.dedup is not None:
+                n_chunks = len(chunks)
+                chunks, ids = self._collapse_duplicates(source, chunks, ids, touched)
+                stats["duplicates"] += n_chunks - len(chunks)
+
+            old_ids = set(entry["chunk_ids"]) if entry else set()
+            stale_ids.extend(old_ids - set(ids))
+            for c, cid in zip(chunks, ids):
+                if cid not in old_ids:
+                    new_docs.append(c)
+                    new_ids.append(cid)
+            assets = sorted({c.page_content for c in chunks if c.metadata.get("image_sha256")})
+            manifest.update(source, stat, digest, ids, assets)
+            stats["changed"] += 1
+
+        for failure in loader.failures:
+            print(f"⚠️ {failure.stage} failed for {failure.path}: {failure.error}")
+
+        if self.dedup is not None:
+            for doc, cid in zip(new_docs, new_ids):
+                sources = self.dedup.sources_for(cid)
+                if len(sources) > 1:
+                    doc.metadata["duplicate_sources"] = json.dumps(sources)
+            touched -= set(new_ids) | set(stale_ids)
+
+        if stale_ids or new_docs:
+            self.index_version += 1
+        with TRACER.span("ingest.store_batch", size=len(new_docs), deleted=len(stale_ids)):
+            if stale_ids:
+                self.vectorstore.delete(ids=stale_ids)
+            if new_docs:
+                self.vectorstore.add_documents(new_docs, ids=new_ids)
+            if touched:
+                self._update_duplicate_sources(sorted(touched))
+        if self.bm25 is not None:
+            self.bm25.delete(stale_ids)
+            self.bm25.add(new_ids, new_docs)
+        manifest.settings.update(pdf_settings, **embedding)
+        manifest.save()
+        if self.dedup is not None:
+            self.dedup.save()
+        for path in dropped_assets - manifest.referenced_assets():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        stats["added_chunks"] = len(new_ids)
+        stats["deleted_chunks"] = len(stale_ids)
+        print(f"Synced '{folder_path}' -> '{self.persist_directory}': {stats}")
+        return stats
+
+    # ---------- Deduplication ----------
+    def _dedup_before_load(self, loader: Loader, manifest: IndexManifest, removed: Set[str],
+                           changed: Dict[str, tuple], stale_ids: List[str], stats: dict) -> Set[str]:
+        """
+        Forget what removed/changed files contributed (re-queueing files that had been
+        collapsed into them), then drop image files that are near-copies of an indexed
+        image before they reach OCR and CLIP.
+        """
+        touched: Set[str] = set()
+        pending = sorted(removed) + sorted(changed)
+        while pending:
+            orphans, ids = self.dedup.forget(pending.pop())
+            touched |= ids
+            for orphan in orphans:
+                if orphan not in changed and os.path.exists(orphan):
+                    changed[orphan] = (os.stat(orphan), file_sha256(orphan))
+                    pending.append(orphan)
+
+        for source in sorted(changed):
+            if loader.file_kind(source) != "image":
+                continue
+            try:
+                fp = dhash(source)
+            except Exception:
+                continue  # unreadable: the loader reports it
+            entry_id = self.dedup.match("image", fp)
+            if entry_id is None:
+                # Registered now so later copies in this same sync also skip OCR
+                self.dedup.add(f"file:{source}", "image", fp, source, [])
+                continue
+            touched.update(self.dedup.add_duplicate(entry_id, source))
+            stat, digest = changed.pop(source)
+            entry = manifest.get(source)
+            stale_ids.extend(entry["chunk_ids"] if entry else [])
+            manifest.update(source, stat, digest, [])
+            stats["duplicates"] += 1
+            stats["duplicate_files"] += 1
+        return touched
+
+    def _unregister_failed(self, source: str, manifest: IndexManifest):
+        """
+        Undo the pre-OCR registration of an image that then failed to load. Copies
+        collapsed into it this sync leave the manifest so the next sync ingests them.
+        """
+        orphans, _ids = self.dedup.forget(source)
+        for orphan in orphans:
+            manifest.remove(orphan)
+
+    def _collapse_duplicates(self, source: str, chunks: List[Document], ids: List[str], touched: Set[str]):
+        """Keep chunks with new content; near-duplicates only add `source` to the kept copy."""
+        file_entry = f"file:{source}"  # image file registered before OCR
+        kept, kept_ids = [], []
+        for chunk, cid in zip(chunks, ids):
+            if chunk.metadata.get("type") == "image" and file_entry in self.dedup.entries:
+                kept.append(chunk)
+                kept_ids.append(cid)
+                continue
+            kind, fp = self.dedup.fingerprint(chunk)
+            entry_id = self.dedup.match(kind, fp) if fp is not None else None
+            if entry_id is None or entry_id == cid:
+                if fp is not None and entry_id is None:
+                    self.dedup.add(cid, kind, fp, source, [cid])
+                kept.append(chunk)
+                kept_ids.append(cid)
+            else:
+                touched.update(self.dedup.add_duplicate(entry_id, source))
+        if file_entry in self.dedup.entries:
+            self.dedup.attach_chunks(file_entry, kept_ids)
+        return kept, kept_ids
+
+    def _update_duplicate_sources(self, ids: List[str]):
+        """Rewrite duplicate_sources on already-indexed chunks (metadata only, no re-embedding)."""
+        metadatas = [{"duplicate_sources": json.dumps(self.dedup.sources_for(cid))} for cid in ids]
+        if self.backend == "mmap":
+            self.vectorstore.update_metadata(ids, metadatas)
+        else:
+            self.vectorstore._collection.update(ids=ids, metadatas=metadatas)
+
+    def _backfill_bm25(self, page_size: int = 1000):
+        """Build the BM25 index from documents already in the vector store."""
+        if self.backend == "mmap":
+            batch_ids, batch_docs = [], []
+            for doc_id, doc in self.vectorstore.iter_documents():
+                batch_ids.append(doc_id)
+                batch_docs.append(doc)
+                if len(batch_ids) >= page_size:
+                    self.bm25.add(batch_ids, batch_docs)
+                    batch_ids, batch_docs = [], []
+            self.bm25.add(batch_ids, batch_docs)
+        else:
+            offset = 0
+            while True:
+                page = self.vectorstore.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+                if not page["ids"]:
+                    break
+                docs = [Document(page_content=text or "", metadata=meta or {})
+                        for text, meta in zip(page["documents"], page["metadatas"])]
+                self.bm25.add(page["ids"], docs)
+                offset += len(page["ids"])
+        print(f"Backfilled BM25 index with {self.bm25.count()} text chunks.")
 
     def load_vectorstore(self):
         """
-        Load persisted Chroma vectorstore.
+        Load persisted vectorstore.
         """
         if os.path.exists(self.persist_directory):
-            self.vectorstore = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embedder,
-            )
+            self.vectorstore = self._open_store()
             print(f"Loaded vector store from '{self.persist_directory}'.")
 
-    def get_retriever(self, k: int = 5):
+    def get_retriever(self, k: int = 5, filter: Optional[dict] = None):
         """
-        Get retriever interface.
+        Get retriever interface. `filter` narrows by metadata, e.g. {"type": "image"}.
         """
         if self.vectorstore is None:
             self.load_vectorstore()
-        return self.vectorstore.as_retriever(type="similarity",search_kwargs={"k": k})
+        search_kwargs = {"k": k}
+        if filter:
+            search_kwargs["filter"] = filter
+        return self.vectorstore.as_retriever(type="similarity",search_kwargs=search_kwargs)
     
+    def get_hybrid_retriever(self, k: int = 5, filter: Optional[dict] = None, mode: str = "hybrid",
+                             fetch_k: Optional[int] = None):
+        """
+        BM25 + CLIP retriever fused with reciprocal-rank fusion (requires hybrid=True).
+        mode: "hybrid", "bm25" or "vector".
+        """
+        if self.bm25 is None:
+            raise ValueError("Hybrid retrieval needs CLIPVectorStoreHandler(hybrid=True)")
+        if self.vectorstore is None:
+            self.load_vectorstore()
+        return HybridRetriever(vectorstore=self.vectorstore, bm25=self.bm25, k=k,
+                               fetch_k=fetch_k or max(4 * k, 20), mode=mode, filter=filter)
+
     def unload_vectorstore(self):
         """Gracefully unload / close the vectorstore."""
         if self.vectorstore:
             try:
-                self.vectorstore._client.close()   # Close DB connection (Chroma)
+                if self.backend == "mmap":
+                    self.vectorstore.close()   # Release memory maps / file handles
+                else:
+                    self.vectorstore._client.close()   # Close DB connection (Chroma)
             except Exception as e:
                 print(f"Warning: could not fully close vectorstore: {e}")
             finally:
@@ -122,7 +580,7 @@ class CLIPVectorStoreHandler:
 
 # ---------------- TESTING ----------------
 if __name__ == "__main__":
-    folder = r"Z:\Genai_Projects\Multimodal_Assistant\Knowledge_Base"
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.getenv("KNOWLEDGE_BASE_DIR", "Knowledge_Base")
     loader = Loader()
     documents = loader.load_directory(folder)
     split_docs = split_documents(documents, chunk_size=1000, chunk_overlap=100)
@@ -1,42 +1,48 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
-from typing import List
+from typing import Iterable, Iterator, List
+import os
+import sys
+from Instrumentation import TRACER
 
-def split_documents(documents: List[Document], chunk_size: int = 1000, chunk_overlap: int = 100) -> List[Document]:
+def iter_split_documents(documents: Iterable[Document], chunk_size: int = 1000, chunk_overlap: int = 100) -> Iterator[Document]:
     """
-    Split only text-based documents. Image docs are passed through unchanged.
+    Lazily split text-based documents. Image docs are passed through unchanged.
+    Accepts any iterable (e.g. Loader.iter_directory) and never holds more than one source doc.
     """
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap
     )
-    
-    split_docs: List[Document] = []
-    
+
     for doc in documents:
         doc_type = doc.metadata.get("type", "text")  # default to text
-        
+
         if doc_type == "image":
             # Keep image docs as they are (no splitting)
-            split_docs.append(doc)
+            yield doc
         else:
             # Split text/pdf/ocr docs
-            chunks = text_splitter.split_text(doc.page_content)
+            with TRACER.span("ingest.split", type=doc_type):
+                chunks = text_splitter.split_text(doc.page_content)
+            TRACER.incr("ingest_chunks", len(chunks))
             for i, chunk in enumerate(chunks):
-                split_docs.append(
-                    Document(
-                        page_content=chunk,
-                        metadata={**doc.metadata, "chunk": i}
-                    )
+                yield Document(
+                    page_content=chunk,
+                    metadata={**doc.metadata, "chunk": i}
                 )
-    
-    return split_docs
+
+def split_documents(documents: List[Document], chunk_size: int = 1000, chunk_overlap: int = 100) -> List[Document]:
+    """
+    Split only text-based documents. Image docs are passed through unchanged.
+    """
+    return list(iter_split_documents(documents, chunk_size=chunk_size, chunk_overlap=chunk_overlap))
 
 # Example usage
 if __name__ == "__main__":
     from Loader import Loader  # Assuming your Loader class is in Loader.py
 
-    folder = r"Z:\Genai_Projects\Multimodal_Assistant\Knowledge_Base"
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.getenv("KNOWLEDGE_BASE_DIR", "Knowledge_Base")
     loader = Loader()
     documents = loader.load_directory(folder)
 
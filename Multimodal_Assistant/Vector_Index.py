@@ -0,0 +1,448 @@
+import json
+import os
+import threading
+import uuid
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from Quantization import QUANTIZERS
+
+
+# Compact per-row type codes so metadata filtering is a vectorized mask
+TYPE_CODES = {"text": 1, "pdf": 2, "ocr": 3, "image": 4}
+
+
+# ----------- Memory-Mapped Vector Store -----------
+class MmapVectorStore(VectorStore):
+    """
+    Local append-only vector index for read-heavy serving.
+
+    Files in `persist_directory`:
+      vectors.bin  - L2-normalized rows (float32 or float16), memory-mapped
+      docs.jsonl   - one {"id", "page_content", "metadata"} record per row
+      offsets.bin  - uint64 byte offset of each row's record in docs.jsonl
+      types.bin    - uint8 type code per row (see TYPE_CODES)
+      alive.bin    - uint8 tombstone flag per row (deletes never rewrite vectors)
+      codes.bin    - optional compressed codes (int8 / product quantization)
+
+    With quantization the first pass scans only the compact codes; the float
+    rows in vectors.bin are read for a shortlist of `rerank_factor * k` rows
+    to re-rank exactly, so they can stay paged out. The quantizer is trained
+    once `min_train_rows` rows exist (searches scan floats until then) on a
+    sample of the whole index; train_quantizer() retrains and re-encodes.
+    """
+    SCAN_BLOCK = 65536  # rows scored per matrix product; bounds temporary memory
+
+    def __init__(self, persist_directory: str, embedding_function: Embeddings, dtype: str = "float32",
+                 quantization: str = "none", rerank_factor: int = 10, min_train_rows: int = 4096,
+                 **quantizer_kwargs: Any):
+        if quantization != "none" and quantization not in QUANTIZERS:
+            raise ValueError(f"Unknown quantization '{quantization}', expected none/{'/'.join(QUANTIZERS)}")
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.rerank_factor = max(1, rerank_factor)
+        self.min_train_rows = max(1, min_train_rows)
+        os.makedirs(persist_directory, exist_ok=True)
+
+        self._meta_path = self._path("index_meta.json")
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            self.dtype = np.dtype(meta["dtype"])
+            quantization = meta.get("quantization", "none")  # on-disk layout wins
+        else:
+            self.dim = None
+            self.dtype = np.dtype(dtype)
+
+        self.quantization = quantization
+        self._quantizer_kwargs = quantizer_kwargs
+        self.quantizer = self._new_quantizer()
+        self._finish_training_swap()
+        if self.quantizer is not None and os.path.exists(self._path("quantizer.npz")):
+            with np.load(self._path("quantizer.npz")) as state:
+                self.quantizer.load_state(dict(state))
+
+        self._docs_file = None
+        self._read_lock = threading.Lock()  # docs.jsonl handle is shared by concurrent searches
+        self._id_to_row = None  # built lazily, only deletes and re-adds need it
+        self._repair()
+        self._open()
+
+    def _new_quantizer(self):
+        if self.quantization == "none":
+            return None
+        return QUANTIZERS[self.quantization](**self._quantizer_kwargs)
+
+    # ---------- File handling ----------
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def _map(self, name: str, dtype, shape=None, mode: str = "r"):
+        path = self._path(name)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+    def _row_files(self) -> List[Tuple[str, int]]:
+        """(file, bytes per row) for every fixed-width per-row file."""
+        files = [("vectors.bin", self.dim * self.dtype.itemsize), ("offsets.bin", 8), ("types.bin", 1)]
+        if self.quantizer is not None and self.quantizer.trained:
+            code_width = self.quantizer.code_size(self.dim) * np.dtype(self.quantizer.code_dtype).itemsize
+            files.append(("codes.bin", code_width))
+        return files + [("alive.bin", 1)]
+
+    def _repair(self):
+        """
+        Truncate the per-row files to the rows all of them hold. alive.bin is written
+        last, so an append interrupted by a crash leaves no half-visible rows behind
+        (docs.jsonl may keep an unreferenced tail; offsets never point into it).
+        """
+        if self.dim is None:
+            return
+        files = self._row_files()
+        sizes = [os.path.getsize(self._path(n)) if os.path.exists(self._path(n)) else 0 for n, _ in files]
+        rows = min(size // width for size, (_, width) in zip(sizes, files))
+        for size, (name, width) in zip(sizes, files):
+            if size != rows * width:
+                print(f"⚠️ {name} holds a partial append, truncating to {rows} rows")
+                os.truncate(self._path(name), rows * width)
+
+    def _open(self):
+        self.close()
+        self._alive = self._map("alive.bin", np.uint8, mode="r+")
+        self.count_rows = 0 if self._alive is None else len(self._alive)
+        self._types = self._map("types.bin", np.uint8)
+        self._offsets = self._map("offsets.bin", np.uint64)
+        self._vectors = self._codes = None
+        if self.count_rows:
+            self._vectors = self._map("vectors.bin", self.dtype, shape=(self.count_rows, self.dim))
+            if self.quantizer is not None and self.quantizer.trained:
+                self._codes = self._map("codes.bin", self.quantizer.code_dtype,
+                                        shape=(self.count_rows, self.quantizer.code_size(self.dim)))
+            self._docs_file = open(self._path("docs.jsonl"), "rb")
+
+    def close(self):
+        if self._docs_file is not None:
+            self._docs_file.close()
+            self._docs_file = None
+        self._vectors = self._codes = self._alive = self._types = self._offsets = None
+
+    def reset(self):
+        """Drop every row (used when rebuilding from scratch)."""
+        self.close()
+        for name in ("vectors.bin", "docs.jsonl", "offsets.bin", "types.bin", "alive.bin",
+                     "codes.bin", "quantizer.npz", "codes.bin.tmp", "quantizer.npz.tmp", "index_meta.json"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self.dim = None
+        self.quantizer = self._new_quantizer()
+        self._id_to_row = None
+        self._open()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def bytes_per_vector(self) -> int:
+        """Bytes scanned per row in the first pass (codes when quantized)."""
+        if self.dim is None:
+            return 0
+        if self.quantizer is not None and self.quantizer.trained:
+            return self.quantizer.code_size(self.dim) * np.dtype(self.quantizer.code_dtype).itemsize
+        return self.dim * self.dtype.itemsize
+
+    def count(self) -> int:
+        """Number of live (non-deleted) rows."""
+        return 0 if self._alive is None else int(np.count_nonzero(self._alive))
+
+    # ---------- Writes ----------
+    def add_embeddings(self, vectors: np.ndarray, documents: List[Document],
+                       ids: Optional[List[str]] = None) -> List[str]:
+        """Append precomputed vectors (normalized here) with their documents."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            return []
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in documents]
+
+        # Re-added ids replace their old row (the last copy wins within a batch too)
+        last = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            vectors, documents, ids = vectors[keep], [documents[i] for i in keep], [ids[i] for i in keep]
+        if self.count_rows:
+            rows = self._rows_by_id()
+            self.delete([doc_id for doc_id in ids if doc_id in rows])
+
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            with open(self._meta_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype.name, "quantization": self.quantization}, f)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+
+        codes = None
+        if self.quantizer is not None and self.quantizer.trained:
+            codes = self.quantizer.encode(vectors)
+
+        docs_path = self._path("docs.jsonl")
+        start = os.path.getsize(docs_path) if os.path.exists(docs_path) else 0
+        offsets = np.empty(len(documents), dtype=np.uint64)
+        with open(docs_path, "ab") as f:
+            for i, (doc_id, doc) in enumerate(zip(ids, documents)):
+                offsets[i] = start
+                line = json.dumps({"id": doc_id, "page_content": doc.page_content,
+                                   "metadata": doc.metadata}).encode("utf-8") + b"\n"
+                f.write(line)
+                start += len(line)
+
+        types = np.array([TYPE_CODES.get(d.metadata.get("type"), 0) for d in documents], dtype=np.uint8)
+        self.close()
+        with open(self._path("vectors.bin"), "ab") as f:
+            f.write(vectors.astype(self.dtype).tobytes())
+        with open(self._path("offsets.bin"), "ab") as f:
+            f.write(offsets.tobytes())
+        with open(self._path("types.bin"), "ab") as f:
+            f.write(types.tobytes())
+        if codes is not None:
+            with open(self._path("codes.bin"), "ab") as f:
+                f.write(codes.tobytes())
+        with open(self._path("alive.bin"), "ab") as f:  # last: rows become visible only once complete
+            f.write(np.ones(len(documents), dtype=np.uint8).tobytes())
+
+        if self._id_to_row is not None:
+            for i, doc_id in enumerate(ids):
+                self._id_to_row[doc_id] = self.count_rows + i
+        self._open()
+        if self.quantizer is not None and not self.quantizer.trained and self.count_rows >= self.min_train_rows:
+            self.train_quantizer()
+        return ids
+
+    def train_quantizer(self, max_rows: int = 65536, seed: int = 0):
+        """
+        (Re)train the quantizer on a sample of live rows and re-encode every row.
+        Runs once `min_train_rows` rows exist; call it again after the corpus has
+        drifted so scales / codebooks reflect the whole index, not its first rows.
+        """
+        if self.quantizer is None:
+            raise ValueError("MmapVectorStore was created without quantization")
+        live = np.flatnonzero(self._alive) if self._alive is not None else []
+        if len(live) == 0:
+            return
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(live, size=min(max_rows, len(live)), replace=False))
+        quantizer = self._new_quantizer()
+        quantizer.train(np.asarray(self._vectors[sample], dtype=np.float32))
+
+        # Both files are complete before either replaces the live one (see _finish_training_swap)
+        with open(self._path("codes.bin.tmp"), "wb") as f:
+            for start in range(0, self.count_rows, self.SCAN_BLOCK):
+                block = np.asarray(self._vectors[start:start + self.SCAN_BLOCK], dtype=np.float32)
+                f.write(quantizer.encode(block).tobytes())
+        with open(self._path("quantizer.npz.tmp"), "wb") as f:
+            np.savez(f, **quantizer.state())
+        self.close()
+        os.replace(self._path("quantizer.npz.tmp"), self._path("quantizer.npz"))
+        os.replace(self._path("codes.bin.tmp"), self._path("codes.bin"))
+        self.quantizer = quantizer
+        self._open()
+        print(f"Trained {self.quantization} quantizer on {len(sample)} of {self.count_rows} rows.")
+
+    def _finish_training_swap(self):
+        """Roll an interrupted train_quantizer forward (codebooks already swapped) or back."""
+        codes_tmp, state_tmp = self._path("codes.bin.tmp"), self._path("quantizer.npz.tmp")
+        if os.path.exists(codes_tmp) and not os.path.exists(state_tmp):
+            os.replace(codes_tmp, self._path("codes.bin"))
+        for path in (codes_tmp, state_tmp):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        documents = [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)]
+        if hasattr(self.embedding_function, "embed_documents_array"):
+            vectors = self.embedding_function.embed_documents_array(texts)
+        else:
+            vectors = np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32)
+        return self.add_embeddings(vectors, documents, ids)
+
+    def _rows_by_id(self) -> dict:
+        """id -> row of live rows only (tombstoned ids count as absent and may be added again)."""
+        if self._id_to_row is None:
+            self._id_to_row = {}
+            for row in range(self.count_rows):
+                if self._alive[row]:
+                    self._id_to_row[self._read_record(row)["id"]] = row
+        return self._id_to_row
+
+    def existing_ids(self, ids: Iterable[str]) -> set:
+        """The subset of `ids` stored in live rows."""
+        if not self.count_rows:
+            return set()
+        rows = self._rows_by_id()
+        return {doc_id for doc_id in ids if doc_id in rows}
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Tombstone rows by id; vectors stay on disk until a rebuild."""
+        if not ids or self._alive is None:
+            return True
+        id_to_row = self._rows_by_id()
+        for doc_id in ids:
+            row = id_to_row.pop(doc_id, None)
+            if row is not None:
+                self._alive[row] = 0
+        self._alive.flush()
+        return True
+
+    def update_metadata(self, ids: List[str], metadatas: List[dict]) -> None:
+        """Merge keys into existing rows' metadata: the record is re-appended and its offset re-pointed."""
+        if not ids or self._alive is None:
+            return
+        id_to_row = self._rows_by_id()
+        docs_path = self._path("docs.jsonl")
+        start = os.path.getsize(docs_path)
+        updates = []
+        with open(docs_path, "ab") as f:
+            for doc_id, metadata in zip(ids, metadatas):
+                row = id_to_row.get(doc_id)
+                if row is None:
+                    continue
+                record = self._read_record(row)
+                record["metadata"] = {**record["metadata"], **metadata}
+                line = json.dumps(record).encode("utf-8") + b"\n"
+                f.write(line)
+                updates.append((row, start))
+                start += len(line)
+        self.close()
+        offsets = np.memmap(self._path("offsets.bin"), dtype=np.uint64, mode="r+")
+        for row, offset in updates:
+            offsets[row] = offset
+        offsets.flush()
+        del offsets
+        self._open()
+
+    # ---------- Reads ----------
+    def _read_record(self, row: int) -> dict:
+        with self._read_lock:
+            self._docs_file.seek(int(self._offsets[row]))
+            line = self._docs_file.readline()
+        return json.loads(line)
+
+    def iter_documents(self) -> Iterator[Tuple[str, Document]]:
+        """(id, Document) for every live row, in insertion order."""
+        for row in range(self.count_rows):
+            if self._alive[row]:
+                record = self._read_record(row)
+                yield record["id"], Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    def _mask(self, filter: Optional[dict]) -> np.ndarray:
+        mask = self._alive.astype(bool)
+        if not filter:
+            return mask
+        unsupported = set(filter) - {"type"}
+        if unsupported:
+            raise ValueError(f"MmapVectorStore only filters on 'type', got {sorted(unsupported)}")
+        wanted = filter["type"]
+        if isinstance(wanted, dict):  # Chroma-style {"$in": [...]} / {"$eq": ...}
+            wanted = wanted.get("$in", wanted.get("$eq"))
+        if isinstance(wanted, str):
+            wanted = [wanted]
+        codes = np.array([TYPE_CODES.get(t, 0) for t in wanted], dtype=np.uint8)
+        return mask & np.isin(self._types, codes)
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(self.count_rows, dtype=np.float32)
+        for start in range(0, self.count_rows, self.SCAN_BLOCK):
+            block = np.asarray(self._vectors[start:start + self.SCAN_BLOCK], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+        return scores
+
+    def _approx_scores(self, query: np.ndarray) -> np.ndarray:
+        prepared = self.quantizer.prepare_query(query)
+        scores = np.empty(self.count_rows, dtype=np.float32)
+        for start in range(0, self.count_rows, self.SCAN_BLOCK):
+            block = np.asarray(self._codes[start:start + self.SCAN_BLOCK])
+            scores[start:start + len(block)] = self.quantizer.scores(block, prepared)
+        return scores
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def search_rows(self, embedding, k: int = 4, filter: Optional[dict] = None,
+                    mode: str = "auto") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k row ids and scores.
+        mode: "auto" (codes + exact re-rank when quantized), "exact" (float scan),
+        "approx" (codes only, no re-rank).
+        """
+        if not self.count_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        mask = self._mask(filter)
+        k = min(k, int(np.count_nonzero(mask)))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if self.quantizer is None or not self.quantizer.trained or mode == "exact":
+            scores = self._scores(query)
+            scores[~mask] = -np.inf
+            top = self._top(scores, k)
+            return top, scores[top]
+
+        scores = self._approx_scores(query)
+        scores[~mask] = -np.inf
+        if mode == "approx":
+            top = self._top(scores, k)
+            return top, scores[top]
+
+        shortlist = self._top(scores, min(k * self.rerank_factor, int(np.count_nonzero(mask))))
+        shortlist = np.sort(shortlist)  # sequential reads from the float file
+        exact = np.asarray(self._vectors[shortlist], dtype=np.float32) @ query
+        order = np.argsort(-exact)[:k]
+        return shortlist[order], exact[order]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[dict] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        rows, scores = self.search_rows(embedding, k, filter)
+        results = []
+        for row, score in zip(rows, scores):
+            record = self._read_record(int(row))
+            results.append((Document(page_content=record["page_content"], metadata=record["metadata"]),
+                            float(score)))
+        return results
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, persist_directory: str = "mmap_db",
+                   **kwargs: Any) -> "MmapVectorStore":
+        store = cls(persist_directory=persist_directory, embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
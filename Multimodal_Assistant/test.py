@@ -1,11 +1,14 @@
+import os
+import sys
 import pytesseract
 from PIL import Image
 
-# Local Tesseract path (adjust to where you stored tesseract.exe)
-pytesseract.pytesseract.tesseract_cmd = r"Z:\Genai_Projects\teseract\tesseract.exe"
+# Local Tesseract path (TESSERACT_CMD, or tesseract on PATH)
+pytesseract.pytesseract.tesseract_cmd = os.getenv("TESSERACT_CMD", "tesseract")
 
-# Open image with raw string
-img = Image.open(r"Z:\Genai_Projects\Multimodal_Assistant\Knowledge_Base\Structured outputUsage.png")
+# Image to OCR: first argument, or the sample from the knowledge base
+img = Image.open(sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+    os.getenv("KNOWLEDGE_BASE_DIR", "Knowledge_Base"), "Structured outputUsage.png"))
 
 # Run OCR
 text = pytesseract.image_to_string(img)